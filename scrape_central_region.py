@@ -1,10 +1,21 @@
 import asyncio
+from contextlib import nullcontext
 import pandas as pd
 import logging
-import re
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+import time
+import requests
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
 from urllib.parse import urljoin
+from webscraper.webscraper.blocking import ResourceBlocker
+from webscraper.webscraper.browser_server import connect_browser_async
+from webscraper.webscraper.extraction import extract_railcar_storage
+from webscraper.webscraper.httpcache import DiskCache
+from webscraper.webscraper.profiling import add_profile_arguments, profiler_from_args
+from webscraper.webscraper.ratelimit import AdaptiveRateLimiter
+from webscraper.webscraper.readiness import PROTECTION_MARKERS, Readiness
+from webscraper.webscraper.retries import RetryPolicy
+from webscraper.webscraper.timeouts import TimeoutBudget
+from webscraper.webscraper.waterfall import NetworkWaterfall
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -29,19 +40,107 @@ HEADERS = {
     'Cache-Control': 'max-age=0',
 }
 
+# Resources aborted before they are downloaded (see webscraper/blocking.py)
+BLOCK_PROFILE = 'text-only'
+
+# Unchanged pages are served from disk; stale ones are revalidated
+CACHE = DiskCache('.httpcache', ttl=3600)
+
+# Paces attempts and backs off when the site answers 403/429/503 or a challenge
+LIMITER = AdaptiveRateLimiter(rate=0.2, burst=2)
+
+# Every attempt, over HTTP or in the browser, draws on one retry budget
+RETRIES = RetryPolicy()
+
+# The page is usable once the results list is in and the facility count is stable
+READINESS = Readiness(selectors=['.search-results-list'], markers=PROTECTION_MARKERS + ["Verify you are human"])
+
+# Navigation and readiness timeouts learned from earlier runs (30s until then)
+TIMEOUTS = TimeoutBudget('timeouts.json')
+
+# Set by --profile: samples the Python stacks and traces the browser context
+PROFILER = None
+FETCH_SECTION = f"fetch {TARGET_URL}"
+
+# Set by --waterfall: records the request timeline of every browser attempt
+WATERFALL = None
+
+def profile_section(label):
+    """Profile the block as ``label`` when --profile is on"""
+    return PROFILER.section(label) if PROFILER is not None else nullcontext()
+
+def profile_worker(label):
+    """Sample a worker thread as part of the section ``label`` when --profile is on"""
+    return PROFILER.worker(label) if PROFILER is not None else nullcontext()
+
+CF_CLEARANCE = "bj_nWJHPeUkSWDhgr.xGIFvfqWkGNVs2d1Zb28D1l78-1734926283-1.2.1.1-rdZjLFWNwA0H7SAY8V3.Yd2rnnU2K_pdCZ4jhGHJtMJYlNKem3N0H.jU11cajdMEwa8Wcj1fndLvKR2NskgjA2pv5vu5vEMzTieGkfcAs_3cnbTz_ZczbCnZJnEx2xyCEyAvqimX1iEjQTViggyJae9FmhBylGKOauQDBmHNeuYcHuFgotsbIHp3ulNM5CTHu4U82G22lju84Tze1We_PMpnPaLDpdT1ME.QVk8ExyurYB7dh5Ki4dcbHwaNpMUyWtaWZQeTvp6jeTQxWHXPSAjcKjIm1mBl_mxN9c0Q2OvKN246o8sDTAAM.JtfCn.gwo4uH9AZsIrinJv3ZoSZkF21PhDQBzvjBGjsRNzQ4nbZGtPmyj3_cp5hEbQWU6yeMLUt3XNvh2qwAd6Ly6q7RQ"
+
+def save_page_content(content):
+    """Keep a copy of the fetched page for debugging"""
+    with open('central_page_content.html', 'w', encoding='utf-8') as f:
+        f.write(content)
+    logger.info("Successfully fetched page content and saved to central_page_content.html")
+
+def fetch_static_content():
+    """Fetch the server-rendered page over plain HTTP, or None if the results list is missing"""
+    headers = dict(HEADERS, **{'Accept-Encoding': 'gzip, deflate'})
+    try:
+        with requests.Session() as session:
+            session.headers.update(headers)
+            session.cookies.set('cf_clearance', CF_CLEARANCE)
+            LIMITER.wait(TARGET_URL)
+            request_start = time.time()
+            status, content = CACHE.requests_get(session, TARGET_URL, timeout=30)
+    except requests.RequestException as e:
+        logger.info(f"HTTP tier failed: {str(e)}")
+        LIMITER.record(TARGET_URL, error=True)
+        RETRIES.record(TARGET_URL, False)
+        return None
+    LIMITER.record(TARGET_URL, status, latency=time.time() - request_start)
+    RETRIES.record(TARGET_URL, status < 500)
+    if status != 200 or "Verify you are human" in content or 'search-results-list' not in content:
+        logger.info(f"HTTP tier did not return the results list (status {status})")
+        return None
+    return content
+
+def fetch_static_in_worker():
+    """fetch_static_content for asyncio.to_thread; the profiler only samples threads it knows"""
+    with profile_worker(FETCH_SECTION):
+        return fetch_static_content()
+
 async def get_page_content(max_retries=3):
-    """Fetch the page content using Playwright with retries"""
+    """Fetch the page content over plain HTTP, falling back to Playwright with retries"""
     logger.info(f"Attempting to fetch content from {TARGET_URL}")
     
-    for attempt in range(max_retries):
+    # requests blocks, so the HTTP tier runs in a worker thread off the event loop
+    content = await asyncio.to_thread(fetch_static_in_worker)
+    if content is not None:
+        logger.info("Served page from the HTTP tier, skipping the browser")
+        logger.info(CACHE.summary())
+        save_page_content(content)
+        return content
+    
+    logger.info("Falling back to the browser tier")
+    blocker = ResourceBlocker(BLOCK_PROFILE)
+    
+    # One browser for every attempt: launched here, or the long-lived browser
+    # server named by $PLAYWRIGHT_BROWSER_ENDPOINT; each attempt gets a fresh context
+    async with async_playwright() as p:
+        browser = await connect_browser_async(
+            p.chromium,
+            headless=True,
+            args=['--no-sandbox', '--disable-setuid-sandbox']
+        )
         try:
-            logger.info(f"Attempt {attempt + 1}/{max_retries}")
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
-                
+            for attempt in range(max_retries):
+                allowed = RETRIES.allow_retry(TARGET_URL) if attempt else RETRIES.allow_request(TARGET_URL)
+                if not allowed:
+                    logger.error(f"Giving up: {RETRIES.summary()}")
+                    break
+                logger.info(f"Attempt {attempt + 1}/{max_retries}")
+                await LIMITER.wait_async(TARGET_URL)
+                context = None
+                timeline = None
                 try:
                     context = await browser.new_context(
                         viewport={'width': 1920, 'height': 1080},
@@ -52,7 +151,7 @@ async def get_page_content(max_retries=3):
                     await context.add_cookies([
                         {
                             "name": "cf_clearance",
-                            "value": "bj_nWJHPeUkSWDhgr.xGIFvfqWkGNVs2d1Zb28D1l78-1734926283-1.2.1.1-rdZjLFWNwA0H7SAY8V3.Yd2rnnU2K_pdCZ4jhGHJtMJYlNKem3N0H.jU11cajdMEwa8Wcj1fndLvKR2NskgjA2pv5vu5vEMzTieGkfcAs_3cnbTz_ZczbCnZJnEx2xyCEyAvqimX1iEjQTViggyJae9FmhBylGKOauQDBmHNeuYcHuFgotsbIHp3ulNM5CTHu4U82G22lju84Tze1We_PMpnPaLDpdT1ME.QVk8ExyurYB7dh5Ki4dcbHwaNpMUyWtaWZQeTvp6jeTQxWHXPSAjcKjIm1mBl_mxN9c0Q2OvKN246o8sDTAAM.JtfCn.gwo4uH9AZsIrinJv3ZoSZkF21PhDQBzvjBGjsRNzQ4nbZGtPmyj3_cp5hEbQWU6yeMLUt3XNvh2qwAd6Ly6q7RQ",
+                            "value": CF_CLEARANCE,
                             "domain": "commtrex.com",
                             "path": "/"
                         },
@@ -64,43 +163,79 @@ async def get_page_content(max_retries=3):
                         }
                     ])
                     
+                    await blocker.attach_async(context)
+                    await CACHE.attach_async(context)
+                    if PROFILER is not None:
+                        await context.tracing.start(screenshots=True, snapshots=True)
                     context.set_default_timeout(30000)
                     page = await context.new_page()
                     await page.set_extra_http_headers(HEADERS)
+                    if WATERFALL is not None:
+                        timeline = WATERFALL.attach(page, TARGET_URL)
                     
-                    response = await page.goto(TARGET_URL, wait_until='networkidle', timeout=30000)
+                    navigation_start = time.time()
+                    try:
+                        response = await page.goto(TARGET_URL, wait_until='commit',
+                                                   timeout=TIMEOUTS.timeout(TARGET_URL, 'navigation', 30000))
+                    except PlaywrightTimeoutError:
+                        # Count the exhausted budget so a slower host gets a longer one next time
+                        TIMEOUTS.record_timeout(TARGET_URL, 'navigation', time.time() - navigation_start)
+                        raise
+                    if response is not None:
+                        navigation_seconds = time.time() - navigation_start
+                        LIMITER.record(TARGET_URL, response.status, latency=navigation_seconds)
+                        TIMEOUTS.record(TARGET_URL, 'navigation', navigation_seconds)
                     
                     if response is None or not response.ok:
                         logger.error(f"Failed to load page: {response and response.status}")
+                        RETRIES.record(TARGET_URL, False)
                         continue
                     
-                    await page.wait_for_load_state('networkidle', timeout=30000)
-                    
+                    # Resolves once the challenge is gone and the facility count settles
+                    ready_start = time.time()
+                    ready = await READINESS.wait_async(page, TARGET_URL,
+                                                       timeout=TIMEOUTS.timeout(TARGET_URL, 'ready', 30000,
+                                                                                quantile=0.95))
                     content = await page.content()
-                    if "Verify you are human" in content:
-                        logger.warning("Cloudflare protection detected")
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(10)
-                            continue
-                        return None
-                    
-                    await page.wait_for_selector('.search-results-list', timeout=30000)
-                    logger.info("Found search results list on the page")
+                    RETRIES.record(TARGET_URL, ready)
+                    if not ready:
+                        TIMEOUTS.record_timeout(TARGET_URL, 'ready', time.time() - ready_start)
+                        if READINESS.is_protected(content):
+                            logger.warning("Cloudflare protection detected")
+                            # Count the challenge as a 503 so the next attempt waits longer
+                            LIMITER.record(TARGET_URL, 503)
+                            if attempt < max_retries - 1:
+                                continue
+                            return None
+                        logger.error("Search results list did not appear")
+                        continue
+                    logger.info(f"Found search results list on the page after {READINESS.timings[TARGET_URL]:.2f}s")
+                    if timeline is not None:
+                        timeline.mark_ready()
+                    TIMEOUTS.record(TARGET_URL, 'ready', READINESS.timings[TARGET_URL])
                     
-                    with open('central_page_content.html', 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    logger.info("Successfully fetched page content and saved to central_page_content.html")
+                    save_page_content(content)
+                    logger.info("Served page from the browser tier")
+                    logger.info(blocker.summary())
+                    logger.info(CACHE.summary())
                     
                     return content
                     
+                except Exception as e:
+                    logger.error(f"Attempt {attempt + 1} failed with error: {str(e)}")
+                    LIMITER.record(TARGET_URL, error=True)
+                    RETRIES.record(TARGET_URL, False)
                 finally:
-                    await browser.close()
-                    
-        except Exception as e:
-            logger.error(f"Attempt {attempt + 1} failed with error: {str(e)}")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(5)
-                continue
+                    if timeline is not None:
+                        timeline.finish()
+                    if context is not None:
+                        if PROFILER is not None:
+                            # Each attempt overwrites the last, so the final one is kept
+                            await context.tracing.stop(path=PROFILER.trace_path(FETCH_SECTION))
+                        await context.close()
+        finally:
+            await browser.close()
+            TIMEOUTS.save()
     
     logger.error("All attempts to fetch content failed")
     return None
@@ -109,87 +244,19 @@ async def scrape_railcar_storage():
     """Scrape railcar storage facility data from the webpage"""
     logger.info("Starting railcar storage data scraping...")
     
-    content = await get_page_content()
+    with profile_section(FETCH_SECTION):
+        content = await get_page_content()
     if content is None:
         logger.error("Failed to fetch page content")
         return pd.DataFrame()
     
-    soup = BeautifulSoup(content, 'html.parser')
-    
     try:
-        all_facility_data = []
-        
-        state_sections = soup.find_all('h2', class_='state-header')
-        logger.info(f"Found {len(state_sections)} state sections")
-        
-        for state_section in state_sections:
-            current_state = state_section.text.strip()
-            logger.info(f"Processing state section: {current_state}")
-            
-            search_results = state_section.find_next('div', class_='search-results')
-            if not search_results:
-                logger.warning(f"No search results found for state {current_state}")
-                continue
-            
-            facility_items = search_results.find_all('div', class_='list-item-container')
-            logger.info(f"Found {len(facility_items)} facilities in {current_state}")
+        with profile_section("parse and save"):
+            all_facility_data = extract_railcar_storage(content)
+            logger.info(f"Parsed {len(all_facility_data)} facilities")
             
-            for item in facility_items:
-                facility_info = {
-                    'State': '',
-                    'Facility Name': '',
-                    'Location': '',
-                    'Railroad Connections': '',
-                    'Total Spaces': None,
-                    'Hazmat Suitable': 'No'
-                }
-                
-                name_link = item.find('a', class_='list-title')
-                if name_link:
-                    facility_info['Facility Name'] = name_link.text.strip()
-                
-                list_attributes = item.find_all(['div', 'span'], class_=['list-attribute', 'facility-attribute'])
-                
-                for attr in list_attributes:
-                    icon = attr.find('i')
-                    text_div = attr.find(['div', 'span'], class_=['list-attribute-text', 'facility-attribute-text'])
-                    
-                    if not icon or not text_div:
-                        continue
-                        
-                    text = text_div.text.strip()
-                    icon_classes = icon.get('class', [])
-                    
-                    if any(marker in icon_classes for marker in ['fa-map-marker', 'fa-location-dot']):
-                        facility_info['Location'] = text
-                        if ',' in text:
-                            state_abbrev = text.split(',')[-1].strip()
-                            facility_info['State'] = state_abbrev
-                    
-                    elif 'ci-railroad' in ' '.join(icon_classes):
-                        facility_info['Railroad Connections'] = text.strip()
-                    
-                    elif 'fa-cubes' in icon_classes:
-                        try:
-                            # First remove commas from the text to handle numbers like "3,000"
-                            text_no_commas = text.replace(',', '')
-                            # Then convert to lowercase for case-insensitive matching
-                            cleaned_text = text_no_commas.lower()
-                            # Search for the number pattern
-                            spaces = re.search(r'(\d+)\s*total\s*spaces', cleaned_text)
-                            if spaces:
-                                facility_info['Total Spaces'] = int(spaces.group(1))
-                            logger.info(f"Parsed spaces from text: {text} -> {spaces.group(1) if spaces else 'None'}")
-                        except ValueError as e:
-                            logger.warning(f"Could not parse Total Spaces from text: {text}. Error: {str(e)}")
-                    
-                    elif any(warning in icon_classes for warning in ['fa-warning', 'fa-triangle-exclamation']):
-                        facility_info['Hazmat Suitable'] = 'Yes'
-                
-                all_facility_data.append(facility_info)
-        
-        df = pd.DataFrame(all_facility_data)
-        df.to_csv('central_railcar_storage_data.csv', index=False)
+            df = pd.DataFrame(all_facility_data)
+            df.to_csv('central_railcar_storage_data.csv', index=False)
         logger.info("Data successfully saved to central_railcar_storage_data.csv")
         return df
     
@@ -198,4 +265,20 @@ async def scrape_railcar_storage():
         return pd.DataFrame()
 
 if __name__ == "__main__":
-    asyncio.run(scrape_railcar_storage())
+    import argparse
+    parser = argparse.ArgumentParser(description='Scrape the railcar storage facilities of the US central region')
+    parser.add_argument('--waterfall', type=str, metavar='FILE',
+                        help='Record the request timeline of each browser attempt and report the slowest '
+                             'domains and resources to FILE')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    PROFILER = profiler_from_args(args)
+    WATERFALL = NetworkWaterfall() if args.waterfall else None
+    try:
+        asyncio.run(scrape_railcar_storage())
+    finally:
+        if PROFILER is not None:
+            PROFILER.stop()
+            PROFILER.save()
+        if WATERFALL is not None:
+            WATERFALL.save(args.waterfall)
@@ -56,10 +56,20 @@ def convert_json_to_csv(input_json, output_csv):
 
 if __name__ == '__main__':
     import argparse
+    import logging
+    from contextlib import nullcontext
+    from webscraper.profiling import add_profile_arguments, profiler_from_args
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser(description='Convert facility data from JSON to CSV')
     parser.add_argument('--input', type=str, required=True, help='Input JSON file')
     parser.add_argument('--output', type=str, required=True, help='Output CSV file')
+    add_profile_arguments(parser)
     args = parser.parse_args()
     
-    convert_json_to_csv(args.input, args.output)
+    profiler = profiler_from_args(args, trace=False)
+    with profiler.section(f"convert {args.input}") if profiler else nullcontext():
+        convert_json_to_csv(args.input, args.output)
+    if profiler is not None:
+        profiler.stop()
+        profiler.save()
     print(f"Conversion completed. Output saved to {args.output}")
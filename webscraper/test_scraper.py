@@ -3,8 +3,23 @@ import json
 import time
 import argparse
 import re
-import random
+import asyncio
+from contextlib import nullcontext
 from webscraper.scraper import WebScraper
+from webscraper.async_scraper import AsyncWebScraper
+from webscraper.blocking import BLOCK_PROFILES
+from webscraper.fetcher import TieredFetcher
+from webscraper.httpcache import DiskCache
+from webscraper.incremental import IncrementalState
+from webscraper.frontier import CrawlFrontier
+from webscraper.ratelimit import AdaptiveRateLimiter
+from webscraper.recycling import RecyclePolicy
+from webscraper.timeouts import TimeoutBudget
+from webscraper.deadline import DEADLINE_EXCEEDED, Deadline
+from webscraper.retries import RetryPolicy
+from webscraper.metrics import MetricsServer, get_metrics
+from webscraper.profiling import add_profile_arguments, profiler_from_args
+from webscraper.waterfall import NetworkWaterfall
 from convert_to_csv import convert_json_to_csv
 
 def generate_filename_from_url(url: str) -> str:
@@ -32,50 +47,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def scrape_url(scraper, url, output_base='output'):
+def save_result(result, output_base='output'):
+    """
+    Save a scrape result to JSON and CSV files and log a short summary.
+    
+    Args:
+        result (dict): Result returned by WebScraper.scrape_url or TieredFetcher.scrape_url
+        output_base (str): Base name for output files (without extension)
+    """
+    metrics = get_metrics()
+    # Save results to JSON
+    json_output = f"{output_base}.json"
+    with metrics.timer('serialization'):
+        content = json.dumps(result, indent=2)
+    with metrics.timer('write'):
+        with open(json_output, 'w', encoding='utf-8') as f:
+            f.write(content)
+        
+        # Convert to CSV
+        csv_output = f"{output_base}.csv"
+        convert_json_to_csv(json_output, csv_output)
+    
+    logger.info(f"Data saved to {json_output}")
+    logger.info(f"Data converted and saved to {csv_output}")
+    logger.info(f"Title: {result.get('title', 'N/A')}")
+    if 'tier' in result:
+        logger.info(f"Served by the {result['tier']} tier")
+    
+    facilities = result.get('facilities', [])
+    verified = [f for f in facilities if f['type'] == 'verified']
+    unverified = [f for f in facilities if f['type'] == 'unverified']
+    
+    logger.info(f"Number of verified facilities: {len(verified)}")
+    logger.info(f"Number of unverified facilities: {len(unverified)}")
+    
+    if verified:
+        logger.info("\nSample Verified Facility:")
+        logger.info(json.dumps(verified[0], indent=2))
+    if unverified:
+        logger.info("\nSample Unverified Facility:")
+        logger.info(json.dumps(unverified[0], indent=2))
+
+def save_delta(result, state, output_base='output'):
+    """
+    Record a result in the incremental state and save only what changed.
+    
+    Args:
+        result (dict): Result carrying a ``fingerprint`` from an incremental scraper
+        state (IncrementalState): Fingerprints and facilities from earlier crawls
+        output_base (str): Base name for the delta file (without extension)
+    """
+    if result.get('unchanged'):
+        logger.info(f"{result['url']} is unchanged since the last crawl, nothing to save")
+        return
+    
+    delta = state.record(result)
+    state.save()
+    delta_output = f"{output_base}_delta.json"
+    with get_metrics().timer('serialization'):
+        content = json.dumps(dict(url=result['url'], **delta), indent=2)
+    with get_metrics().timer('write'):
+        with open(delta_output, 'w', encoding='utf-8') as f:
+            f.write(content)
+    logger.info(f"Delta saved to {delta_output}: {len(delta['added'])} added, "
+                f"{len(delta['removed'])} removed, {len(delta['modified'])} modified")
+
+def handle_result(result, output_base='output', state=None):
+    """Save a full result, or only its delta in incremental mode"""
+    if state is not None:
+        save_delta(result, state, output_base)
+    else:
+        save_result(result, output_base)
+
+def scrape_url(scraper, url, output_base='output', state=None, deadline=None):
     """
     Scrape a single URL and save the results to JSON and CSV files.
     
     Args:
-        scraper (WebScraper): WebScraper instance to use
+        scraper (WebScraper or TieredFetcher): Scraper instance to use
         url (str): URL to scrape
         output_base (str): Base name for output files (without extension)
+        state (IncrementalState): Optional state; only deltas are saved when set
+        deadline (Deadline): Optional time budget for the URL, including retries
     """
     start_time = time.time()
     logger.info(f"Processing URL: {url}")
     
     try:
-        result = scraper.scrape_url(url)
+        result = scraper.scrape_url(url, deadline)
         
         if result:
-            # Save results to JSON
-            json_output = f"{output_base}.json"
-            with open(json_output, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2)
-            
-            # Convert to CSV
-            csv_output = f"{output_base}.csv"
-            convert_json_to_csv(json_output, csv_output)
-            
-            logger.info(f"Data saved to {json_output}")
-            logger.info(f"Data converted and saved to {csv_output}")
+            handle_result(result, output_base, state)
             logger.info(f"Successfully scraped data in {time.time() - start_time:.2f} seconds")
-            logger.info(f"Title: {result.get('title', 'N/A')}")
-            
-            facilities = result.get('facilities', [])
-            verified = [f for f in facilities if f['type'] == 'verified']
-            unverified = [f for f in facilities if f['type'] == 'unverified']
-            
-            logger.info(f"Number of verified facilities: {len(verified)}")
-            logger.info(f"Number of unverified facilities: {len(unverified)}")
-            
-            if verified:
-                logger.info("\nSample Verified Facility:")
-                logger.info(json.dumps(verified[0], indent=2))
-            if unverified:
-                logger.info("\nSample Unverified Facility:")
-                logger.info(json.dumps(unverified[0], indent=2))
-            
             return True
         else:
             logger.error("Failed to scrape URL")
@@ -87,25 +150,154 @@ def scrape_url(scraper, url, output_base='output'):
     finally:
         logger.info(f"Total test time: {time.time() - start_time:.2f} seconds")
 
+async def scrape_urls_concurrently(urls, concurrency, block_profile='no-media', cache=None, state=None,
+                                   frontier=None, limiter=None, recycle=None, timeouts=None, deadline=30,
+                                   retries=None, waterfall=None):
+    """
+    Scrape several URLs at once with a pooled AsyncWebScraper.
+    
+    Args:
+        urls (list): URLs to scrape
+        concurrency (int): Number of pages rendered at the same time
+        block_profile (str): Resource-blocking profile for the browser contexts
+        cache (DiskCache): Optional on-disk HTTP cache for documents
+        state (IncrementalState): Optional state; only deltas are saved when set
+        frontier (CrawlFrontier): Optional frontier recording each URL's outcome
+        limiter (AdaptiveRateLimiter): Optional per-host pacing shared with other scrapers
+        recycle (RecyclePolicy): Optional limits for replacing contexts during long runs
+        timeouts (TimeoutBudget): Optional timeouts learned from earlier runs
+        deadline (float): Seconds each URL may take, including retries
+        retries (RetryPolicy): Optional retry budget and per-host circuit breakers
+        waterfall (NetworkWaterfall): Optional recorder of every page's request timeline
+    
+    Returns:
+        int: Number of URLs scraped successfully
+    """
+    start_time = time.time()
+    success_count = 0
+    async with AsyncWebScraper(block_profile=block_profile, cache=cache, state=state, limiter=limiter,
+                               recycle=recycle, timeouts=timeouts, deadline=deadline,
+                               retries=retries, waterfall=waterfall) as scraper:
+        async for url, result in scraper.scrape_many(urls, concurrency=concurrency):
+            if result:
+                handle_result(result, generate_filename_from_url(url), state)
+                success_count += 1
+            else:
+                logger.error(f"Failed to scrape {url}")
+            if frontier is not None:
+                frontier.finish(url, bool(result))
+    logger.info(f"Total test time: {time.time() - start_time:.2f} seconds")
+    return success_count
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Web scraper with protection bypass capabilities')
-    parser.add_argument('--url', type=str, nargs='+', required=True,
+    parser.add_argument('--url', type=str, nargs='+',
                       help='One or more URLs to scrape (space separated)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                      help='Number of pages to render at once (default: 1, sequential)')
+    parser.add_argument('--block-profile', choices=sorted(BLOCK_PROFILES), default='no-media',
+                      help='Resources to block in the browser (default: no-media)')
+    parser.add_argument('--browser-only', action='store_true',
+                      help='Always render in Chromium instead of trying plain HTTP first')
+    parser.add_argument('--cache-dir', type=str, default='.httpcache',
+                      help='Directory of the on-disk HTTP cache (default: .httpcache)')
+    parser.add_argument('--cache-ttl', type=int, default=3600,
+                      help='Seconds before a cached page is revalidated (default: 3600)')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Always download pages instead of using the on-disk cache')
+    parser.add_argument('--incremental', type=str, metavar='STATE_FILE',
+                      help='Skip unchanged pages and save only facility deltas, tracked in STATE_FILE')
+    parser.add_argument('--frontier', type=str, default='crawl_frontier.sqlite3',
+                      help='SQLite file tracking the status of every URL (default: crawl_frontier.sqlite3)')
+    parser.add_argument('--resume', action='store_true',
+                      help='Continue the URLs an earlier run left pending and retry failed ones')
+    parser.add_argument('--max-attempts', type=int, default=3,
+                      help='Fetch attempts before --resume gives up on a URL (default: 3)')
+    parser.add_argument('--rate', type=float, default=0.5,
+                      help='Initial requests per second to each host; adapts to how the host responds (default: 0.5)')
+    parser.add_argument('--max-rate', type=float, default=4.0,
+                      help='Upper bound for the adaptive per-host rate (default: 4.0)')
+    parser.add_argument('--burst', type=int, default=2,
+                      help='Requests sent to a host back to back before pacing starts (default: 2)')
+    parser.add_argument('--recycle-pages', type=int, default=200,
+                      help='Replace a browser context after this many pages, 0 to never (default: 200)')
+    # Same limit as PLAYWRIGHT_RECYCLE_RSS_MB in the Scrapy settings
+    parser.add_argument('--max-rss-mb', type=int, default=2048,
+                      help='Restart the browser when Chromium uses more memory than this, 0 to never (default: 2048)')
+    parser.add_argument('--timeouts-file', type=str, default='timeouts.json',
+                      help='JSON file of per-site latency histograms used to learn timeouts (default: timeouts.json)')
+    parser.add_argument('--deadline', type=float, default=30,
+                      help='Seconds each URL may take in total, including retries; 0 for no limit (default: 30)')
+    parser.add_argument('--retry-budget', type=float, default=0.1,
+                      help='Largest share of requests that may be retries, across all URLs (default: 0.1)')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                      help='Serve per-phase latency histograms for Prometheus on this port, 0 to not (default: 0)')
+    parser.add_argument('--waterfall', type=str, metavar='FILE',
+                      help='Record the request timeline of every browser-rendered page and report the slowest '
+                           'domains and resources to FILE')
+    # With --concurrency > 1 the pages share one thread, so the whole crawl is profiled as one and not traced
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    if not args.url and not args.resume:
+        parser.error('--url is required unless --resume is given')
+    cache = None if args.no_cache else DiskCache(args.cache_dir, ttl=args.cache_ttl)
+    state = IncrementalState(args.incremental) if args.incremental else None
+    limiter = AdaptiveRateLimiter(args.rate, burst=args.burst, max_rate=args.max_rate)
+    recycle = RecyclePolicy(args.recycle_pages or None, max_rss_mb=args.max_rss_mb or None)
+    timeouts = TimeoutBudget(args.timeouts_file)
+    retries = RetryPolicy(args.retry_budget)
     
-    success_count = 0
-    scraper = WebScraper()
-    try:
-        for url in args.url:
-            output_base = generate_filename_from_url(url)
-            if scrape_url(scraper, url, output_base):
-                success_count += 1
-            # Add delay between URLs to prevent rate limiting
-            if len(args.url) > 1:  # Only sleep if there are multiple URLs
-                delay = random.randint(2, 5)
-                logger.info(f"Adding delay of {delay} seconds between URLs...")
-                time.sleep(delay)
-                logger.info("Delay completed, proceeding to next URL...")
-    finally:
-        scraper.close()
-        logger.info(f"Completed scraping {success_count}/{len(args.url)} URLs successfully")
+    frontier = CrawlFrontier(args.frontier)
+    if args.resume:
+        retried = frontier.retry_failed(args.max_attempts)
+        frontier.add(args.url or [], requeue=False)
+        logger.info(f"Resuming crawl, {retried} failed URLs queued again")
+    else:
+        frontier.clear()
+        frontier.add(args.url)
+    urls = frontier.pending()
+    metrics_server = MetricsServer(port=args.metrics_port).start() if args.metrics_port else None
+    profiler = profiler_from_args(args, trace=args.concurrency <= 1)
+    waterfall = NetworkWaterfall() if args.waterfall else None
+    
+    if args.concurrency > 1:
+        with profiler.section(f"crawl of {len(urls)} URLs") if profiler else nullcontext():
+            success_count = asyncio.run(scrape_urls_concurrently(urls, args.concurrency, args.block_profile,
+                                                                 cache, state, frontier, limiter, recycle,
+                                                                 timeouts, args.deadline or None, retries,
+                                                                 waterfall))
+        logger.info(f"Completed scraping {success_count}/{len(urls)} URLs successfully")
+        logger.info(frontier.summary())
+        frontier.close()
+    else:
+        success_count = 0
+        if args.browser_only:
+            scraper = WebScraper(block_profile=args.block_profile, cache=cache, state=state, limiter=limiter,
+                                 recycle=recycle, timeouts=timeouts, deadline=args.deadline or None,
+                                 retries=retries, profiler=profiler, waterfall=waterfall)
+        else:
+            scraper = TieredFetcher(block_profile=args.block_profile, cache=cache, state=state, limiter=limiter,
+                                    recycle=recycle, timeouts=timeouts, deadline=args.deadline or None,
+                                    retries=retries, profiler=profiler, waterfall=waterfall)
+        try:
+            for url in urls:
+                # The scraper waits for the host's token bucket before each request
+                output_base = generate_filename_from_url(url)
+                deadline = Deadline(args.deadline or None)
+                with profiler.section(url) if profiler else nullcontext():
+                    ok = scrape_url(scraper, url, output_base, state, deadline)
+                frontier.finish(url, ok, error=DEADLINE_EXCEEDED if not ok and deadline.expired else None)
+                if ok:
+                    success_count += 1
+        finally:
+            scraper.close()
+            logger.info(f"Completed scraping {success_count}/{len(urls)} URLs successfully")
+            logger.info(frontier.summary())
+            frontier.close()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if profiler is not None:
+        profiler.stop()
+        profiler.save()
+    if waterfall is not None:
+        waterfall.save(args.waterfall)
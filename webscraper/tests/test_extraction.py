@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from webscraper.extraction import extract_railcar_storage, extract_transloading, iter_railcar_storage
+from webscraper.fixtures import expected_records, railcar_storage_page, transloading_page
+
+SEEDS = [0, 1, 7]
+NOISE = [0.0, 0.3, 1.0]
+SIZES = [1, 25, 200]
+
+
+@pytest.mark.parametrize('facilities', SIZES)
+@pytest.mark.parametrize('noise', NOISE)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_transloading_matches_fixture(facilities, noise, seed):
+    page = transloading_page(facilities, seed=seed, noise=noise)
+    data = extract_transloading(page)
+    assert data['title'] == 'Transloading Facilities | Commtrex'
+    assert data['facilities'] == expected_records('transloading', facilities, seed=seed, noise=noise)
+
+
+@pytest.mark.parametrize('facilities', SIZES)
+@pytest.mark.parametrize('noise', NOISE)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_railcar_storage_matches_fixture(facilities, noise, seed):
+    page = railcar_storage_page(facilities, seed=seed, noise=noise)
+    assert extract_railcar_storage(page) == expected_records('railcar-storage', facilities, seed=seed, noise=noise)
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1024])
+def test_railcar_storage_streams_across_chunks(chunk_size):
+    # Small chunks split tags, attributes and entities between feeds
+    page = railcar_storage_page(60, seed=3, noise=0.5)
+    records = list(iter_railcar_storage(io.StringIO(page), chunk_size=chunk_size))
+    assert records == expected_records('railcar-storage', 60, seed=3, noise=0.5)
+
+
+def test_empty_pages():
+    assert extract_transloading(transloading_page(0))['facilities'] == []
+    assert extract_railcar_storage(railcar_storage_page(0)) == []
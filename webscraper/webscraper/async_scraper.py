@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from .blocking import ResourceBlocker
+from .browser_manager import get_browser_manager
+from .coalesce import request_key
+from .components import FetchComponents
+from .deadline import DEADLINE_EXCEEDED, Deadline, DeadlineExceeded
+from .pool import PagePool
+from .extraction import extract_transloading
+from .readiness import Readiness
+from .retries import CircuitOpen
+from .scraper import CONTEXT_OPTIONS
+
+
+class AsyncWebScraper(FetchComponents):
+    """asyncio counterpart of WebScraper that renders many pages in one Chromium.
+
+    The browser comes from the process-wide BrowserManager, so several
+    scrapers (or a scraper and PlaywrightMiddleware) share one Chromium.
+
+    Usage::
+
+        async with AsyncWebScraper() as scraper:
+            async for url, result in scraper.scrape_many(urls, concurrency=8):
+                ...
+    """
+
+    def __init__(self, max_contexts=2, pages_per_context=8, per_domain=None, block_profile='no-media', cache=None,
+                 state=None, limiter=None, endpoint=None, manager=None, recycle=None, timeouts=None, deadline=30, retries=None,
+                 coalescer=None, metrics=None, waterfall=None):
+        self.logger = logging.getLogger(__name__)
+        self._init_components(cache=cache, limiter=limiter, recycle=recycle, timeouts=timeouts, deadline=deadline,
+                              retries=retries, coalescer=coalescer, metrics=metrics, waterfall=waterfall)
+        self.state = state
+        # Shared browser, optionally on the browser server at ``endpoint``
+        self.manager = manager or get_browser_manager(endpoint)
+        self.blocker = ResourceBlocker(block_profile)
+        self.readiness = Readiness()
+        self.max_contexts = max_contexts
+        self.pages_per_context = pages_per_context
+        self.per_domain = per_domain
+        self._start_lock = asyncio.Lock()
+        self.browser = None
+        self.pool = None
+
+    async def start(self):
+        """Acquire the shared browser and create the page pool"""
+        async with self._start_lock:
+            if self.pool is not None:
+                return self
+            self.browser = await self.manager.acquire()
+            self.pool = PagePool(
+                self.browser,
+                max_contexts=self.max_contexts,
+                pages_per_context=self.pages_per_context,
+                context_options=CONTEXT_OPTIONS,
+                per_domain=self.per_domain,
+                context_setup=self._setup_context,
+                recycle=self.recycle
+            )
+        return self
+
+    async def _setup_context(self, context):
+        """Install resource blocking and the HTTP cache on a new context"""
+        await self.blocker.attach_async(context)
+        if self.cache is not None:
+            await self.cache.attach_async(context)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _wait_ready(self, page, url, deadline):
+        """Wait for readiness within the learned budget and learn from how long it took"""
+        ready_start = time.time()
+        with self.metrics.timer('readiness'):
+            ready = await self.readiness.wait_async(page, url, timeout=self._ready_timeout(url, deadline))
+        self._record_ready(url, ready, time.time() - ready_start, deadline)
+        return ready
+
+    async def render(self, url, domain=None, deadline=None):
+        """Load a URL in a pooled page, wait out protection and extract facilities.
+
+        Returns a dict with the response status, rendered HTML and extracted
+        data.  Every step gets the time left on ``deadline`` (by default
+        ``self.deadline`` seconds from now).  Concurrent renders of the same
+        URL share one navigation.  Errors, including DeadlineExceeded,
+        CircuitOpen and TimeoutError (gave up waiting for a shared
+        navigation), propagate to the caller.
+        """
+        deadline = deadline or Deadline(self.deadline)
+        return await self.coalescer.run_async(request_key(url), lambda: self._render(url, domain, deadline),
+                                              timeout=deadline.remaining(), cacheable=self._cacheable)
+
+    def _cacheable(self, rendered):
+        """Only clean 200 renders are reused; a retry of a 503 or challenge must load the page again"""
+        return rendered['status'] == 200 and not self.readiness.is_protected(rendered['html'])
+
+    async def _render(self, url, domain, deadline):
+        """Load and extract one URL; see render()"""
+        await self.start()
+        start_time = time.time()
+        self.logger.debug(f"Starting scrape of {url}")
+        if not self.retries.allow_request(url):
+            raise CircuitOpen(f"Circuit open for the host of {url}")
+
+        recorded = False
+        try:
+            # Wait for the host's turn before taking a page, so a slow host never holds pooled pages idle;
+            # a fresh cached document is served by page.route without reaching the host
+            from_cache = self._from_cache(url, CONTEXT_OPTIONS['extra_http_headers'])
+            if not from_cache:
+                await self.limiter.wait_async(url, deadline)
+            page_start = time.perf_counter()
+            async with self.pool.page(domain) as page:
+                # Includes waiting for a free page when the pool is busy
+                self.metrics.observe('context', time.perf_counter() - page_start)
+                # Pooled pages are reused, so the timeline stops listening when the render ends
+                timeline = self.waterfall.attach(page, url) if self.waterfall is not None else None
+                try:
+                    navigation_start = time.time()
+                    try:
+                        with self.metrics.timer('navigation'):
+                            response = await page.goto(url, wait_until='commit',
+                                                       timeout=self._navigation_timeout(url, deadline))
+                    except PlaywrightTimeoutError:
+                        self._record_timeout(url, 'navigation', time.time() - navigation_start, deadline)
+                        raise
+                    if response is None:
+                        raise ValueError(f"Failed to get response from {url}")
+                    if not from_cache:
+                        self._record_navigation(url, response.status, time.time() - navigation_start)
+
+                    # One in-page predicate waits out protection and for the listings to settle
+                    ready = await self._wait_ready(page, url, deadline)
+                    max_retries = 3
+                    for attempt in range(1, max_retries):
+                        if ready or not self.readiness.is_protected(await page.content()):
+                            break
+                        if not self._allow_reload(url):
+                            # This load's failure is recorded; do not count it again below
+                            recorded = True
+                            break
+                        self.logger.debug(f"Protection still active on {url}, attempt {attempt + 1}")
+                        await self.limiter.wait_async(url, deadline)
+                        with self.metrics.timer('navigation'):
+                            response = await page.reload(wait_until='commit', timeout=self._navigation_timeout(
+                                url, deadline, 'reload')) or response
+                        ready = await self._wait_ready(page, url, deadline)
+
+                    if ready and timeline is not None:
+                        timeline.mark_ready()
+                    html = await page.content()
+                finally:
+                    if timeline is not None:
+                        timeline.finish()
+        except Exception:
+            if not recorded:
+                self.retries.record(url, False)
+            raise
+        if not recorded:
+            self.retries.record(url, not self.readiness.is_protected(html))
+
+        rendered = {'url': url, 'status': response.status, 'html': html}
+        # In incremental mode, skip extraction when the page has not changed
+        if self.state is not None:
+            rendered['fingerprint'], unchanged = self.state.unchanged_result(url, html)
+            if unchanged is not None:
+                rendered.update(title=unchanged['title'], facilities=unchanged['facilities'], unchanged=True)
+                return rendered
+
+        deadline.check('extraction')
+        with self.metrics.timer('extraction'):
+            data = extract_transloading(html)
+
+        self.logger.debug(f"Found {len(data['facilities'])} facilities on {url} in {time.time() - start_time:.2f} seconds")
+        rendered.update(title=data.get('title', ''), facilities=data.get('facilities', []))
+        return rendered
+
+    async def scrape_url(self, url, deadline=None):
+        """Scrape a URL and return the content, or None on failure"""
+        deadline = deadline or Deadline(self.deadline)
+        try:
+            rendered = await self.render(url, deadline=deadline)
+        except Exception as e:
+            if isinstance(e, (DeadlineExceeded, TimeoutError)) or deadline.expired:
+                self.logger.warning(f"Abandoned {url}: {DEADLINE_EXCEEDED} after {deadline.elapsed():.1f}s")
+            else:
+                self.logger.error(f"Scraping {url} failed: {str(e)}")
+            return None
+        result = {
+            'url': url,
+            'title': rendered['title'],
+            'facilities': rendered['facilities']
+        }
+        for key in ('fingerprint', 'unchanged'):
+            if key in rendered:
+                result[key] = rendered[key]
+        return result
+
+    async def scrape_many(self, urls, concurrency=8):
+        """Scrape URLs concurrently, yielding (url, result) pairs as they finish.
+
+        ``concurrency`` is additionally capped by the size of the page pool;
+        requests to each host are paced by ``limiter``.
+        """
+        await self.start()
+        urls = list(urls)
+        queue = asyncio.Queue()
+        for url in urls:
+            queue.put_nowait(url)
+        results = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    url = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put((url, await self.scrape_url(url)))
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, self.pool.size)))]
+        try:
+            for _ in range(len(urls)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def close(self):
+        """Clean up resources"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            self._log_summaries(self.blocker, self.recycle, self.coalescer, self.readiness)
+        if self.browser is not None:
+            # Other users may still render pages; the manager closes the browser last
+            self.browser = None
+            await self.manager.release()
@@ -0,0 +1,421 @@
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+import psutil
+
+from .fixtures import FixtureServer, railcar_storage_page, transloading_page
+
+logger = logging.getLogger(__name__)
+
+# What each scenario measures:
+#   extract       extraction.extract_transloading on an in-memory page
+#   central       extract_railcar_storage, the scrape_central_region parser
+#   scraper       WebScraper.scrape_url against the fixture server
+#   middleware    PlaywrightMiddleware inside a Scrapy crawl of the fixture server
+SCENARIOS = ('extract', 'central', 'scraper', 'middleware')
+
+
+def percentile(values, q):
+    """Nearest-rank ``q`` quantile of ``values`` (0 for none)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class PeakRss(threading.Thread):
+    """Samples the resident memory of a process and all its children until stopped.
+
+    The children include any Chromium the process launched, so browser
+    scenarios report the memory of the whole tree.
+    """
+
+    def __init__(self, pid, interval=0.05):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stopped = threading.Event()
+
+    def sample(self):
+        total = 0
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except psutil.Error:
+            return
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        self.peak_mb = max(self.peak_mb, total / (1024 * 1024))
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.sample()
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.peak_mb
+
+
+def _run_threads(items, concurrency, work, setup=None, teardown=None):
+    """Run ``work(state, item)`` over ``items`` on ``concurrency`` threads.
+
+    Each thread calls ``setup()`` first and ``teardown(state)`` last, on
+    its own thread, so thread-bound clients such as sync Playwright work.
+    The clock starts once every thread is set up.  ``work`` returns True
+    for a correct result.  Returns (latencies in seconds, failures, elapsed).
+    """
+    pending = list(reversed(items))
+    lock = threading.Lock()
+    latencies = []
+    failures = [0]
+    errors = []
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker():
+        try:
+            state = setup() if setup else None
+        except Exception as e:
+            errors.append(e)
+            ready.abort()
+            return
+        try:
+            ready.wait()
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    item = pending.pop()
+                start_time = time.perf_counter()
+                try:
+                    ok = work(state, item)
+                except Exception as e:
+                    logger.debug(f"Benchmark request {item} failed: {str(e)}")
+                    ok = False
+                elapsed = time.perf_counter() - start_time
+                with lock:
+                    latencies.append(elapsed)
+                    failures[0] += not ok
+        except threading.BrokenBarrierError:
+            return
+        finally:
+            if teardown:
+                teardown(state)
+
+    threads = [threading.Thread(target=worker, name=f'bench-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise errors[0] if errors else RuntimeError("Benchmark workers failed to start")
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return latencies, failures[0], time.perf_counter() - start_time
+
+
+def _bench_extract(size, concurrency, requests, server_url, seed, noise):
+    from .extraction import extract_transloading
+    content = transloading_page(size, seed, noise)
+    return _run_threads(range(requests), concurrency,
+                        lambda _, i: len(extract_transloading(content)['facilities']) == size)
+
+
+def _bench_central(size, concurrency, requests, server_url, seed, noise):
+    from .extraction import extract_railcar_storage
+    content = railcar_storage_page(size, seed, noise)
+    return _run_threads(range(requests), concurrency,
+                        lambda _, i: len(extract_railcar_storage(content)) == size)
+
+
+def _bench_scraper(size, concurrency, requests, server_url, seed, noise):
+    from .coalesce import SingleFlight
+    from .ratelimit import AdaptiveRateLimiter
+    from .scraper import WebScraper
+    # The fixture server needs no pacing, and every URL is distinct so nothing is coalesced
+    limiter = AdaptiveRateLimiter(rate=10000, burst=10000, max_rate=10000)
+    page_url = f'{server_url}/transloading/{size}.html'
+
+    def setup():
+        scraper = WebScraper(limiter=limiter, coalescer=SingleFlight(ttl=0))
+        # The first page pays for the context and connection setup
+        scraper.scrape_url(f'{page_url}?warmup={threading.get_ident()}')
+        return scraper
+
+    def work(scraper, i):
+        result = scraper.scrape_url(f'{page_url}?i={i}')
+        return result is not None and len(result['facilities']) == size
+
+    return _run_threads(range(requests), concurrency, work, setup=setup, teardown=lambda scraper: scraper.close())
+
+
+class RequestTimerMiddleware:
+    """Stamps each request as it enters the downloader, before any other middleware"""
+
+    def process_request(self, request, spider):
+        request.meta.setdefault('benchmark_start', time.perf_counter())
+        return None
+
+
+def _bench_middleware(size, concurrency, requests, server_url, seed, noise):
+    import scrapy
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.settings import Settings
+    from . import settings as project_settings
+    from .extraction import extract_transloading
+
+    page_url = f'{server_url}/transloading/{size}.html'
+    results = {'latencies': [], 'failures': 0, 'rendered': 0, 'start': None, 'end': None}
+
+    class BenchmarkSpider(scrapy.Spider):
+        name = 'benchmark'
+
+        async def start(self):
+            # One page first, so the browser launch is not part of the timings
+            yield scrapy.Request(f'{page_url}?warmup=1', callback=self.warmed_up, dont_filter=True)
+
+        def warmed_up(self, response):
+            results['start'] = time.perf_counter()
+            for i in range(requests):
+                yield scrapy.Request(f'{page_url}?i={i}', callback=self.parse, errback=self.failed,
+                                     dont_filter=True)
+
+        def parse(self, response):
+            now = time.perf_counter()
+            results['latencies'].append(now - response.meta['benchmark_start'])
+            results['rendered'] += bool(response.meta.get('playwright_processed'))
+            results['failures'] += len(extract_transloading(response.text)['facilities']) != size
+            results['end'] = now
+
+        def failed(self, failure):
+            results['failures'] += 1
+            results['end'] = time.perf_counter()
+
+    settings = Settings()
+    settings.setmodule(project_settings, priority='project')
+    middlewares = {name: priority for name, priority in settings.getdict('DOWNLOADER_MIDDLEWARES').items()
+                   if not name.endswith(('DiskCacheMiddleware', 'HostRateLimitMiddleware'))}
+    middlewares[RequestTimerMiddleware] = 1
+    settings.setdict({
+        'CONCURRENT_REQUESTS': concurrency,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': concurrency,
+        'DOWNLOADER_MIDDLEWARES': middlewares,
+        'DISKCACHE_ENABLED': False,
+        'LEARNED_TIMEOUTS_FILE': None,
+        'COALESCE_TTL': 0,
+        'LOG_LEVEL': 'WARNING',
+        'TELNETCONSOLE_ENABLED': False,
+    }, priority='cmdline')
+
+    process = CrawlerProcess(settings, install_root_handler=False)
+    process.crawl(BenchmarkSpider)
+    process.start()
+    if not results['rendered']:
+        raise RuntimeError("PlaywrightMiddleware rendered none of the pages; see its errors above")
+    elapsed = (results['end'] or 0) - (results['start'] or 0)
+    return results['latencies'], results['failures'] + requests - len(results['latencies']), elapsed
+
+
+BENCHMARKS = {
+    'extract': _bench_extract,
+    'central': _bench_central,
+    'scraper': _bench_scraper,
+    'middleware': _bench_middleware,
+}
+
+
+def _child(scenario, size, concurrency, requests, server_url, seed, noise, conn):
+    """Entry point of the process running one benchmark; sends back its measurements"""
+    logging.basicConfig(level=logging.WARNING)
+    # The scrapers log every page; keep the run quiet and the timings honest
+    logging.disable(logging.INFO)
+    try:
+        latencies, failures, elapsed = BENCHMARKS[scenario](size, concurrency, requests, server_url, seed, noise)
+        conn.send({'latencies': latencies, 'failures': failures, 'seconds': elapsed})
+    except Exception as e:
+        conn.send({'error': f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"})
+    finally:
+        conn.close()
+
+
+def run_benchmark(scenario, size, concurrency, requests, server_url, seed=0, noise=0.0, timeout=600):
+    """Run one benchmark in a fresh process and return its result row.
+
+    A fresh process gives each run its own Twisted reactor and browser and
+    a peak RSS that is not inflated by earlier runs.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(scenario, size, concurrency, requests, server_url, seed, noise, sender),
+                          daemon=False)
+    process.start()
+    sender.close()
+    sampler = PeakRss(process.pid)
+    sampler.start()
+    try:
+        measured = receiver.recv() if receiver.poll(timeout) else {'error': f"timed out after {timeout}s"}
+    except EOFError:
+        measured = {'error': f"benchmark process exited with code {process.exitcode}"}
+    finally:
+        process.join(timeout=60)
+        if process.is_alive():
+            process.terminate()
+        peak_mb = sampler.stop()
+
+    row = {'scenario': scenario, 'size': size, 'concurrency': concurrency, 'requests': requests}
+    if 'error' in measured:
+        row['skipped'] = measured['error']
+        return row
+    latencies, seconds = measured['latencies'], measured['seconds']
+    row.update({
+        'failures': measured['failures'],
+        'seconds': round(seconds, 3),
+        'pages_per_second': round(len(latencies) / seconds, 2) if seconds > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(peak_mb, 1),
+    })
+    return row
+
+
+def git_commit():
+    """Short hash of the checked-out commit, with ``+dirty`` for local changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}+dirty' if dirty else commit
+
+
+def run_suite(scenarios=SCENARIOS, sizes=(10, 100, 1000), concurrency=(1, 4, 8), requests=50, seed=0, noise=0.0):
+    """Run every scenario at every size and concurrency; returns the report dict.
+
+    Once a scenario cannot run (e.g. Chromium is not installed) its
+    remaining combinations are skipped with the same reason.
+    """
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+        'noise': noise,
+        'runs': [],
+    }
+    with FixtureServer(seed=seed, noise=noise) as server:
+        for scenario in scenarios:
+            unavailable = None
+            for size in sizes:
+                for level in concurrency:
+                    if unavailable:
+                        row = {'scenario': scenario, 'size': size, 'concurrency': level, 'requests': requests,
+                               'skipped': unavailable}
+                    else:
+                        row = run_benchmark(scenario, size, level, requests, server.base_url, seed, noise)
+                        unavailable = row.get('skipped')
+                    logger.info(format_row(row))
+                    report['runs'].append(row)
+    return report
+
+
+def format_row(row):
+    """One-line description of a result row"""
+    name = f"{row['scenario']:<10} size {row['size']:>6} x{row['concurrency']:<3}"
+    if 'skipped' in row:
+        return f"{name} skipped: {row['skipped']}"
+    return (f"{name} {row['pages_per_second']:>9.1f} pages/s  p50 {row['p50_ms']:>8.1f}ms  "
+            f"p95 {row['p95_ms']:>8.1f}ms  p99 {row['p99_ms']:>8.1f}ms  peak RSS {row['peak_rss_mb']:>7.1f}MB  "
+            f"{row['failures']} failed")
+
+
+def compare(baseline, report, threshold=0.1):
+    """Compare two reports run by run; returns (lines, number of regressions).
+
+    A run regresses when its pages/s drops, or its p95 latency or peak RSS
+    grows, by more than ``threshold`` (a fraction) against the baseline.
+    """
+    previous = {(row['scenario'], row['size'], row['concurrency']): row for row in baseline['runs']}
+    lines = [f"Comparing {report['commit']} against {baseline['commit']}"]
+    if (baseline.get('seed'), baseline.get('noise')) != (report.get('seed'), report.get('noise')):
+        lines.append("Warning: the two runs used different generated pages (seed or noise differ)")
+    regressions = 0
+    for row in report['runs']:
+        old = previous.get((row['scenario'], row['size'], row['concurrency']))
+        if old is None or 'skipped' in row or 'skipped' in old:
+            continue
+        changes = {
+            'pages/s': (old['pages_per_second'], row['pages_per_second'], -1),
+            'p95': (old['p95_ms'], row['p95_ms'], 1),
+            'RSS': (old['peak_rss_mb'], row['peak_rss_mb'], 1),
+        }
+        parts = []
+        regressed = False
+        for label, (before, after, worse) in changes.items():
+            change = (after - before) / before if before else 0.0
+            parts.append(f"{label} {change:+.1%}")
+            regressed |= change * worse > threshold
+        regressions += regressed
+        name = f"{row['scenario']:<10} size {row['size']:>6} x{row['concurrency']:<3}"
+        lines.append(f"{name} {'  '.join(parts)}{'  REGRESSION' if regressed else ''}")
+    return lines, regressions
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Benchmark the scraping paths against a local fixture server')
+    parser.add_argument('--scenario', choices=SCENARIOS, nargs='+', default=list(SCENARIOS),
+                        help='Scenarios to run (default: all)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Facilities per page (default: 10 100 1000)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8],
+                        help='Pages handled at once (default: 1 4 8)')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Pages per run, after warm-up (default: 50)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generated pages; keep it fixed when comparing runs (default: 0)')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='Markup irregularities per facility in the generated pages, 0 to 1 (default: 0)')
+    parser.add_argument('--output', type=str,
+                        help='JSON file for the results (default: benchmark-<commit>.json)')
+    parser.add_argument('--compare', type=str, metavar='BASELINE',
+                        help='Earlier results to compare against; exits with 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change that counts as a regression (default: 0.1)')
+    args = parser.parse_args()
+
+    report = run_suite(args.scenario, args.sizes, args.concurrency, args.requests, args.seed, args.noise)
+    output = args.output or f"benchmark-{report['commit']}.json"
+    save_report(report, output)
+    logger.info(f"Results saved to {output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            lines, regressions = compare(json.load(f), report, args.threshold)
+        for line in lines:
+            logger.info(line)
+        sys.exit(1 if regressions else 0)
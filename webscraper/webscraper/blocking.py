@@ -0,0 +1,119 @@
+import logging
+import re
+
+# Hosts serving analytics, tag managers and ad beacons we never read
+ANALYTICS_PATTERNS = [
+    r'google-analytics\.com',
+    r'googletagmanager\.com',
+    r'doubleclick\.net',
+    r'facebook\.(net|com)/tr',
+    r'hotjar\.com',
+    r'segment\.(io|com)',
+    r'newrelic\.com|nr-data\.net',
+    r'clarity\.ms',
+]
+
+# Map tile and static map servers used by the listing pages
+MAP_TILE_PATTERNS = [
+    r'maps\.googleapis\.com',
+    r'maps\.gstatic\.com',
+    r'tile\.openstreetmap\.org',
+    r'api\.mapbox\.com',
+]
+
+# Built-in profiles: resource types to abort and URL patterns to abort
+BLOCK_PROFILES = {
+    'none': {
+        'resource_types': [],
+        'url_patterns': [],
+    },
+    'no-media': {
+        'resource_types': ['image', 'media', 'font'],
+        'url_patterns': MAP_TILE_PATTERNS,
+    },
+    'text-only': {
+        'resource_types': ['image', 'media', 'font', 'stylesheet', 'texttrack', 'manifest'],
+        'url_patterns': MAP_TILE_PATTERNS + ANALYTICS_PATTERNS,
+    },
+}
+
+# Typical transfer size per resource type. Blocked requests are never
+# downloaded, so bytes saved is an estimate built from these averages.
+ESTIMATED_SIZES = {
+    'image': 40_000,
+    'media': 250_000,
+    'font': 35_000,
+    'stylesheet': 25_000,
+    'script': 30_000,
+}
+DEFAULT_ESTIMATED_SIZE = 5_000
+
+
+class ResourceBlocker:
+    """Request interception that aborts resources the extractors never read.
+
+    Attach it to a browser context with ``attach()`` (sync API) or
+    ``attach_async()`` (async API).  ``stats`` counts blocked requests per
+    resource type and the estimated bytes saved.
+    """
+
+    def __init__(self, profile='no-media', resource_types=None, url_patterns=None):
+        if profile not in BLOCK_PROFILES:
+            raise ValueError(f"Unknown block profile: {profile}")
+        self.logger = logging.getLogger(__name__)
+        self.profile = profile
+        base = BLOCK_PROFILES[profile]
+        self.resource_types = set(base['resource_types']) | set(resource_types or [])
+        patterns = list(base['url_patterns']) + list(url_patterns or [])
+        self.url_pattern = re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None
+        self.stats = {'blocked_requests': 0, 'bytes_saved': 0, 'by_type': {}}
+
+    @property
+    def enabled(self):
+        return bool(self.resource_types or self.url_pattern)
+
+    def should_block(self, request):
+        """Return True if the request matches the profile"""
+        if request.resource_type == 'document':
+            return False
+        if request.resource_type in self.resource_types:
+            return True
+        return bool(self.url_pattern and self.url_pattern.search(request.url))
+
+    def _record(self, request):
+        resource_type = request.resource_type
+        self.stats['blocked_requests'] += 1
+        self.stats['bytes_saved'] += ESTIMATED_SIZES.get(resource_type, DEFAULT_ESTIMATED_SIZE)
+        self.stats['by_type'][resource_type] = self.stats['by_type'].get(resource_type, 0) + 1
+
+    def handle(self, route):
+        """Route handler for the sync Playwright API"""
+        if self.should_block(route.request):
+            self._record(route.request)
+            route.abort()
+        else:
+            # Let other handlers (e.g. the HTTP cache) see the request
+            route.fallback()
+
+    async def handle_async(self, route):
+        """Route handler for the async Playwright API"""
+        if self.should_block(route.request):
+            self._record(route.request)
+            await route.abort()
+        else:
+            await route.fallback()
+
+    def attach(self, context):
+        """Install the blocker on a sync BrowserContext"""
+        if self.enabled:
+            context.route('**/*', self.handle)
+
+    async def attach_async(self, context):
+        """Install the blocker on an async BrowserContext"""
+        if self.enabled:
+            await context.route('**/*', self.handle_async)
+
+    def summary(self):
+        """One-line description of what was blocked so far"""
+        return (f"Blocked {self.stats['blocked_requests']} requests "
+                f"(~{self.stats['bytes_saved'] / 1024:.0f} KiB saved) with profile '{self.profile}'")
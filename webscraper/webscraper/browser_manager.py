@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+from .browser_server import BROWSER_ARGS, browser_endpoint, connect_browser_async
+
+
+class BrowserManager:
+    """One async Chromium per process, shared by every component that renders pages.
+
+    Components call ``acquire()`` for the browser and ``release()`` when they
+    are done.  The browser is launched (or connected to the browser server)
+    by the first ``acquire()`` and closed by the last ``release()``.
+    ``context()`` leases a single context the same way.
+    """
+
+    def __init__(self, endpoint=None, headless=True, args=BROWSER_ARGS):
+        self.logger = logging.getLogger(__name__)
+        self.endpoint = endpoint
+        self.headless = headless
+        self.args = list(args)
+        self.users = 0
+        self.playwright = None
+        self.browser = None
+        self._lock = None
+
+    def _get_lock(self):
+        # Created on first use, inside the event loop that uses it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def acquire(self):
+        """Return the shared browser, starting it for the first user"""
+        async with self._get_lock():
+            if self.browser is None:
+                self.playwright = await async_playwright().start()
+                try:
+                    self.browser = await connect_browser_async(self.playwright.chromium, self.endpoint,
+                                                               headless=self.headless, args=self.args)
+                except BaseException:
+                    # E.g. Chromium is not installed: do not leave the driver running
+                    await self.playwright.stop()
+                    self.playwright = None
+                    raise
+                self.logger.info("Started shared browser")
+            self.users += 1
+            return self.browser
+
+    async def release(self):
+        """Drop one user; the last one closes the browser"""
+        async with self._get_lock():
+            if self.users <= 0:
+                self.logger.warning("Browser released without a matching acquire()")
+                return
+            self.users -= 1
+            if self.users > 0:
+                return
+            if self.browser is not None:
+                await self.browser.close()
+                self.browser = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+            self.logger.info("Closed shared browser")
+
+    @asynccontextmanager
+    async def context(self, **options):
+        """Lease a new context on the shared browser, closed again on exit"""
+        browser = await self.acquire()
+        try:
+            context = await browser.new_context(**options)
+            try:
+                yield context
+            finally:
+                await context.close()
+        finally:
+            await self.release()
+
+
+_managers = {}
+
+
+def get_browser_manager(endpoint=None):
+    """The process-wide BrowserManager for ``endpoint`` (see browser_endpoint())"""
+    endpoint = browser_endpoint(endpoint)
+    if endpoint not in _managers:
+        _managers[endpoint] = BrowserManager(endpoint)
+    return _managers[endpoint]
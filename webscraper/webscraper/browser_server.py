@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import urllib.request
+from playwright.sync_api import sync_playwright
+
+# Chromium launch flags shared by the scrapers and the browser server
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--disable-setuid-sandbox',
+    '--no-first-run',
+    '--no-zygote',
+    '--deterministic-fetch',
+    '--disable-features=IsolateOrigins',
+    '--disable-site-isolation-trials',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--enable-features=NetworkService,NetworkServiceInProcess',
+    '--force-color-profile=srgb',
+    '--disable-accelerated-2d-canvas',
+    '--disable-background-networking',
+    '--metrics-recording-only',
+    '--disable-default-apps',
+    '--mute-audio'
+]
+
+# Environment variable naming a running browser server, e.g. http://127.0.0.1:9222
+ENDPOINT_ENV = 'PLAYWRIGHT_BROWSER_ENDPOINT'
+
+logger = logging.getLogger(__name__)
+
+
+def browser_endpoint(endpoint=None):
+    """The browser server to connect to: ``endpoint`` or $PLAYWRIGHT_BROWSER_ENDPOINT, else None"""
+    return endpoint or os.environ.get(ENDPOINT_ENV) or None
+
+
+def connect_browser(chromium, endpoint=None, **launch_options):
+    """Connect a sync Playwright to the browser server, or launch Chromium if none is configured.
+
+    Closing a connected browser only disconnects and drops the contexts this
+    process created; the server keeps running for the next job.
+    """
+    endpoint = browser_endpoint(endpoint)
+    if endpoint is None:
+        return chromium.launch(**launch_options)
+    logger.debug(f"Connecting to browser server at {endpoint}")
+    return chromium.connect_over_cdp(endpoint)
+
+
+async def connect_browser_async(chromium, endpoint=None, **launch_options):
+    """Async counterpart of connect_browser()"""
+    endpoint = browser_endpoint(endpoint)
+    if endpoint is None:
+        return await chromium.launch(**launch_options)
+    logger.debug(f"Connecting to browser server at {endpoint}")
+    return await chromium.connect_over_cdp(endpoint)
+
+
+class BrowserServer:
+    """A headless Chromium listening for CDP connections on a local port.
+
+    Python Playwright has no ``launch_server()``, so the server is Playwright's
+    own Chromium started with ``--remote-debugging-port``; scrapers attach to
+    it with ``connect_over_cdp()`` and only create contexts.
+    """
+
+    def __init__(self, port=9222, headless=True, args=BROWSER_ARGS, executable_path=None):
+        self.logger = logging.getLogger(__name__)
+        self.port = port
+        self.headless = headless
+        self.args = list(args)
+        self.executable_path = executable_path
+        self.process = None
+        self.user_data_dir = None
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def _executable(self):
+        if self.executable_path:
+            return self.executable_path
+        with sync_playwright() as p:
+            return p.chromium.executable_path
+
+    def version(self):
+        """The server's /json/version document, or None if it is not answering"""
+        try:
+            with urllib.request.urlopen(f"{self.endpoint}/json/version", timeout=1) as response:
+                return json.load(response)
+        except (OSError, ValueError):
+            return None
+
+    def start(self, timeout=30):
+        """Launch Chromium and wait until its debugging endpoint answers"""
+        self.user_data_dir = tempfile.mkdtemp(prefix='browser-server-')
+        command = [
+            self._executable(),
+            f'--remote-debugging-port={self.port}',
+            '--remote-debugging-address=127.0.0.1',
+            f'--user-data-dir={self.user_data_dir}',
+            '--no-default-browser-check',
+            *self.args,
+        ]
+        if self.headless:
+            command.append('--headless=new')
+        command.append('about:blank')
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Chromium exited with code {self.process.returncode}")
+            version = self.version()
+            if version is not None:
+                self.logger.info(f"Browser server {version.get('Browser', '')} listening on {self.endpoint}")
+                return self
+            time.sleep(0.1)
+        self.stop()
+        raise TimeoutError(f"Browser server did not answer on {self.endpoint} within {timeout}s")
+
+    def stop(self):
+        """Terminate Chromium and remove its profile directory"""
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        if self.user_data_dir is not None:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Run one long-lived Chromium for all scrapers on this host')
+    parser.add_argument('--port', type=int, default=9222, help='Remote debugging port (default: 9222)')
+    parser.add_argument('--headful', action='store_true', help='Show the browser window')
+    args = parser.parse_args()
+
+    with BrowserServer(port=args.port, headless=not args.headful) as server:
+        print(f"export {ENDPOINT_ENV}={server.endpoint}")
+        try:
+            server.process.wait()
+        except KeyboardInterrupt:
+            pass
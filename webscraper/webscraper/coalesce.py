@@ -0,0 +1,160 @@
+import asyncio
+import copy
+import logging
+import math
+import threading
+import time
+from urllib.parse import urldefrag
+
+
+def request_key(url):
+    """Key under which fetches of ``url`` are coalesced; fragments never reach the server"""
+    return urldefrag(url)[0]
+
+
+def _not_none(result):
+    return result is not None
+
+
+def _finite(timeout):
+    """None for no timeout, as waits reject an infinite one"""
+    return None if timeout is None or math.isinf(timeout) else timeout
+
+
+class _Flight:
+    """One call in progress, awaited by every caller of the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.future = None
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one fetch per URL at a time and share its result with concurrent callers.
+
+    The first caller of a key runs the fetch; callers arriving while it is in
+    flight wait for it and get a copy of the same result (or exception).  A
+    successful result is kept for ``ttl`` seconds so repeat requests shortly
+    after are answered without fetching again.  Only results passing the
+    caller's ``cacheable`` predicate (by default, any but None) are kept, so a
+    503 or protection page is not handed back to the retry meant to replace
+    it; errors are never kept.  Use ``run()`` from threads and ``run_async()``
+    from coroutines.  ``stats`` counts fetches run, coalesced and served from
+    the TTL cache.
+    """
+
+    def __init__(self, ttl=30, max_entries=1000):
+        self.logger = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'fetched': 0, 'coalesced': 0, 'cache_hits': 0}
+        self._flights = {}
+        self._cache = {}  # key -> (expires at, result)
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            del self._cache[key]
+            return False, None
+        self.stats['cache_hits'] += 1
+        return True, copy.deepcopy(entry[1])
+
+    def _store(self, key, result, cacheable):
+        if not self.ttl or not cacheable(result):
+            return
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            self._cache = {k: entry for k, entry in self._cache.items() if entry[0] >= now}
+            while len(self._cache) >= self.max_entries:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now + self.ttl, result)
+
+    def run(self, key, fetch, timeout=None, cacheable=_not_none):
+        """Return ``fetch()`` for ``key``, sharing a call already in flight.
+
+        Callers that join a flight wait at most ``timeout`` seconds and then
+        raise TimeoutError; the flight itself keeps going.  The result is
+        kept for ``ttl`` seconds only if ``cacheable(result)`` is true.
+        """
+        timeout = _finite(timeout)
+        with self._lock:
+            hit, result = self._cached(key)
+            if hit:
+                return result
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['fetched'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            self.logger.debug(f"Waiting for the fetch of {key} already in flight")
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Fetch of {key} still in flight after {timeout:.1f}s")
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = fetch()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None:
+                    self._store(key, copy.deepcopy(flight.result), cacheable)
+            flight.done.set()
+
+    async def run_async(self, key, fetch, timeout=None, cacheable=_not_none):
+        """Coroutine version of ``run()``; ``fetch`` is a coroutine function"""
+        timeout = _finite(timeout)
+        with self._lock:
+            hit, result = self._cached(key)
+            if hit:
+                return result
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                flight.future = asyncio.get_running_loop().create_future()
+                self.stats['fetched'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            self.logger.debug(f"Waiting for the fetch of {key} already in flight")
+            try:
+                result = await asyncio.wait_for(asyncio.shield(flight.future), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Fetch of {key} still in flight after {timeout:.1f}s") from None
+            return copy.deepcopy(result)
+        try:
+            result = await fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._flights[key]
+            if isinstance(e, asyncio.CancelledError):
+                # Only the leader was cancelled; the callers waiting on it were not
+                flight.future.set_exception(RuntimeError(f"Fetch of {key} was cancelled"))
+            else:
+                flight.future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting for it
+            flight.future.exception()
+            raise
+        with self._lock:
+            del self._flights[key]
+            self._store(key, copy.deepcopy(result), cacheable)
+        flight.future.set_result(result)
+        return result
+
+    def summary(self):
+        """One-line description of how many fetches were saved"""
+        return (f"Coalescing: {self.stats['fetched']} fetches, {self.stats['coalesced']} joined one in flight, "
+                f"{self.stats['cache_hits']} served from the {self.ttl}s cache")
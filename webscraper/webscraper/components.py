@@ -0,0 +1,97 @@
+from .coalesce import SingleFlight
+from .metrics import get_metrics
+from .ratelimit import AdaptiveRateLimiter
+from .recycling import RecyclePolicy
+from .retries import RetryPolicy
+from .timeouts import TimeoutBudget
+
+# Budgets used until enough page loads have been timed to learn them
+DEFAULT_NAVIGATION_MS = 2000
+DEFAULT_READY_MS = 10000
+
+
+class FetchComponents:
+    """Mixin for the fetch paths: WebScraper, AsyncWebScraper and TieredFetcher.
+
+    Holds the components every path works with, each defaulting to a fresh
+    instance (metrics to the process-wide PhaseMetrics).  A path built by
+    another, like TieredFetcher's browser tier, gets the other's
+    ``components()`` so both pace, budget and learn together.  The timeout
+    and retry bookkeeping of a browser page load lives here too, so the sync
+    and async scrapers only differ in how they wait.
+    """
+
+    def _init_components(self, cache=None, limiter=None, recycle=None, timeouts=None, deadline=30, retries=None,
+                         coalescer=None, metrics=None, waterfall=None):
+        self.cache = cache
+        # Paces requests per host and slows down when the host pushes back
+        self.limiter = limiter or AdaptiveRateLimiter()
+        # Retires contexts every N pages and the browser when Chromium grows too large
+        self.recycle = recycle or RecyclePolicy()
+        # Navigation, readiness and download budgets learned from earlier loads
+        self.timeouts = timeouts or TimeoutBudget()
+        # Seconds each URL may take in total, across every wait and retry
+        self.deadline = deadline
+        # Retry budget and per-host circuit breakers
+        self.retries = retries or RetryPolicy()
+        # Shares one navigation between identical requests and caches it briefly
+        self.coalescer = coalescer or SingleFlight()
+        self.metrics = metrics or get_metrics()
+        # Records every page's request timeline when given a NetworkWaterfall
+        self.waterfall = waterfall
+
+    def components(self):
+        """Keyword arguments that make another fetch path share these components"""
+        return {'cache': self.cache, 'limiter': self.limiter, 'recycle': self.recycle, 'timeouts': self.timeouts,
+                'deadline': self.deadline, 'retries': self.retries, 'coalescer': self.coalescer,
+                'metrics': self.metrics, 'waterfall': self.waterfall}
+
+    def _from_cache(self, url, headers):
+        """True if the cache serves ``url`` without reaching the host, so no rate-limit token is needed"""
+        return self.cache is not None and self.cache.is_fresh(url, headers)
+
+    def _navigation_timeout(self, url, deadline, phase='navigation'):
+        """Milliseconds allowed for loading ``url``: the learned budget, capped by ``deadline``"""
+        return deadline.timeout_ms(phase, self.timeouts.timeout(url, 'navigation', DEFAULT_NAVIGATION_MS))
+
+    def _record_navigation(self, url, status, seconds):
+        """Feed a completed navigation to the rate controller and the learned timeouts"""
+        self.limiter.record(url, status, latency=seconds)
+        self.timeouts.record(url, 'navigation', seconds)
+
+    def _record_timeout(self, url, kind, seconds, deadline):
+        """Grow the learned ``kind`` budget after a timeout, unless the deadline cut the wait short"""
+        if not deadline.expired:
+            self.timeouts.record_timeout(url, kind, seconds)
+
+    def _ready_timeout(self, url, deadline):
+        """Milliseconds allowed for ``url`` to become ready, capped by ``deadline``"""
+        return deadline.timeout_ms('readiness', self.timeouts.timeout(url, 'ready', DEFAULT_READY_MS, quantile=0.95))
+
+    def _record_ready(self, url, ready, seconds, deadline):
+        """Learn from how long the readiness wait took, or that it timed out"""
+        if ready:
+            self.timeouts.record(url, 'ready', seconds)
+        else:
+            self._record_timeout(url, 'ready', seconds, deadline)
+
+    def _allow_reload(self, url):
+        """Account for reloading a page stuck on protection; False once the retry budget is spent.
+
+        Each reload is a retry and comes out of the shared budget.  The
+        protection page counts as a 503, so the host's rate drops and the
+        reload waits for the slower token bucket.
+        """
+        self.retries.record(url, False)
+        if not self.retries.allow_retry(url):
+            return False
+        self.limiter.record(url, 503)
+        return True
+
+    def _log_summaries(self, *components):
+        """Log the summaries of ``components`` and the shared components, then save the timeouts"""
+        for component in (*components, self.limiter, self.retries, self.timeouts, self.metrics, self.waterfall,
+                          self.cache):
+            if component is not None:
+                self.logger.info(component.summary())
+        self.timeouts.save()
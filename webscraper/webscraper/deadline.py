@@ -0,0 +1,51 @@
+import time
+
+# Status recorded for URLs abandoned because their deadline passed
+DEADLINE_EXCEEDED = 'deadline exceeded'
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a URL has no time left for its next step"""
+
+
+class Deadline:
+    """Total time budget for one URL, shared by every step that works on it.
+
+    Navigation, readiness waits, reloads, rate-limit waits and retries each
+    ask ``timeout_ms()`` for their timeout: their own budget capped by the
+    time left.  Once nothing is left, ``check()`` raises DeadlineExceeded so
+    the URL is abandoned instead of starting another wait.  ``seconds=None``
+    never expires.  Wall-clock time is used so the deadline survives being
+    pickled with a Scrapy request.
+    """
+
+    def __init__(self, seconds=30):
+        self.seconds = seconds
+        self.started = time.time()
+        self.expires_at = self.started + seconds if seconds else None
+
+    def remaining(self):
+        """Seconds left, 0 once expired"""
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def check(self, step):
+        """Raise DeadlineExceeded if no time is left for ``step``"""
+        if self.expired:
+            raise DeadlineExceeded(f"{DEADLINE_EXCEEDED} after {self.elapsed():.1f}s, before {step}")
+
+    def timeout_ms(self, step, budget_ms):
+        """``budget_ms`` capped by the time left; raises DeadlineExceeded if none is left.
+
+        Never returns 0, which Playwright would take as "no timeout".
+        """
+        self.check(step)
+        return max(1, int(min(budget_ms, self.remaining() * 1000)))
@@ -0,0 +1,46 @@
+import logging
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from .metrics import MetricsServer, get_metrics
+
+
+class PhaseMetricsExtension:
+    """Report how long each scraping phase takes, in the crawl stats and optionally to Prometheus.
+
+    PlaywrightMiddleware and PlaywrightDownloadHandler time page
+    acquisition, navigation, readiness waits and extraction into the
+    process-wide PhaseMetrics.  When the spider closes, every phase's
+    count, total seconds, p50/p95/p99 and maximum are written to the stats
+    as ``phases/<phase>/*``.  With METRICS_PORT set, the histograms are
+    also served at ``http://127.0.0.1:<port>/metrics`` while the crawl
+    runs, so long crawls can be scraped by Prometheus.
+    """
+
+    def __init__(self, stats, metrics=None, port=None):
+        self.logger = logging.getLogger(__name__)
+        self.stats = stats
+        self.metrics = metrics or get_metrics()
+        self.port = port
+        self.server = None
+
+    def spider_opened(self, spider):
+        if self.port:
+            self.server = MetricsServer(self.metrics, self.port).start()
+
+    def spider_closed(self, spider):
+        self.logger.info(self.metrics.summary())
+        self.metrics.write_stats(self.stats)
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PHASE_METRICS_ENABLED', True):
+            raise NotConfigured
+        extension = cls(crawler.stats, port=settings.getint('METRICS_PORT', 0) or None)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
@@ -0,0 +1,223 @@
+import re
+from lxml import etree, html as lxml_html
+
+
+def _class(name):
+    """XPath predicate matching elements that carry the CSS class ``name``"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Compiled once; string XPath expressions would be recompiled on every call
+FACILITY_XPATH = etree.XPath(f"//*[{_class('list-item-container')}]")
+TITLE_XPATH = etree.XPath(f".//a[{_class('list-title')}]")
+ATTRIBUTE_TEXT_XPATH = etree.XPath(f".//*[{_class('list-attribute-text')}]")
+VERIFIED_XPATH = etree.XPath(f".//*[{_class('icon-transload-verified-sm')}]")
+
+ATTRIBUTE_CLASSES = {'list-attribute', 'facility-attribute'}
+ATTRIBUTE_TEXT_CLASSES = {'list-attribute-text', 'facility-attribute-text'}
+
+TOTAL_SPACES_RE = re.compile(r'(\d+)\s*total\s*spaces')
+
+
+def _text(element):
+    return ''.join(element.itertext()).strip()
+
+
+def _classes(element):
+    return element.get('class', '').split()
+
+
+def parse_transloading_facility(container):
+    """Build a facility record from one ``.list-item-container`` element"""
+    names = TITLE_XPATH(container)
+    attributes = [_text(el) for el in ATTRIBUTE_TEXT_XPATH(container)]
+
+    # Find products (contains Bulk, Goods, etc.)
+    products = next((text for text in attributes
+                     if any(marker in text for marker in ('Bulk', 'Goods', 'Liquids', 'Oversized'))), None)
+    # Find railroads (contains CSX, NS, etc.)
+    railroads = next((text for text in attributes
+                      if any(marker in text for marker in ('CSX', 'NS', 'rail'))), None)
+    hazmat = next((text for text in attributes if 'HazMat' in text), None)
+
+    return {
+        'name': _text(names[0]) if names else '',
+        'products': [p for p in products.split(', ') if p] if products else [],
+        'railroads': [r for r in railroads.split(', ') if r != 'not served by rail'] if railroads else [],
+        'hazmat_capable': 'Capable of HazMat' in hazmat if hazmat else False,
+        'type': 'verified' if VERIFIED_XPATH(container) else 'unverified'
+    }
+
+
+def extract_transloading(content):
+    """Extract the page title and facilities from a transloading listing page.
+
+    Works on HTML from the browser tier as well as on server-rendered pages.
+    """
+    tree = lxml_html.fromstring(content)
+    title = tree.findtext('.//title') or ''
+    return {
+        'title': title.strip(),
+        'facilities': [parse_transloading_facility(c) for c in FACILITY_XPATH(tree)]
+    }
+
+
+def parse_total_spaces(text):
+    """Parse "3,000 total spaces" into 3000, or None if there is no number"""
+    # Remove commas before matching so "3,000" is not read as "000"
+    spaces = TOTAL_SPACES_RE.search(text.replace(',', '').lower())
+    return int(spaces.group(1)) if spaces else None
+
+
+def parse_railcar_facility(item):
+    """Build a railcar-storage record from one ``.list-item-container`` element"""
+    facility_info = {
+        'State': '',
+        'Facility Name': '',
+        'Location': '',
+        'Railroad Connections': '',
+        'Total Spaces': None,
+        'Hazmat Suitable': 'No'
+    }
+
+    # Walk the subtree with iter() instead of XPath; this runs once per facility
+    name_link = next((a for a in item.iter('a') if 'list-title' in _classes(a)), None)
+    if name_link is not None:
+        facility_info['Facility Name'] = _text(name_link)
+
+    for attr in item.iter('div', 'span'):
+        if not ATTRIBUTE_CLASSES.intersection(_classes(attr)):
+            continue
+        icon = next(attr.iter('i'), None)
+        text_div = next((el for el in attr.iter('div', 'span')
+                         if el is not attr and ATTRIBUTE_TEXT_CLASSES.intersection(_classes(el))), None)
+        if icon is None or text_div is None:
+            continue
+
+        text = _text(text_div)
+        icon_classes = _classes(icon)
+
+        if any(marker in icon_classes for marker in ['fa-map-marker', 'fa-location-dot']):
+            facility_info['Location'] = text
+            if ',' in text:
+                facility_info['State'] = text.split(',')[-1].strip()
+        elif 'ci-railroad' in ' '.join(icon_classes):
+            facility_info['Railroad Connections'] = text
+        elif 'fa-cubes' in icon_classes:
+            facility_info['Total Spaces'] = parse_total_spaces(text)
+        elif any(warning in icon_classes for warning in ['fa-warning', 'fa-triangle-exclamation']):
+            facility_info['Hazmat Suitable'] = 'Yes'
+
+    return facility_info
+
+
+class RailcarStorageParser:
+    """Incremental parser for railcar-storage region pages, on lxml's pull parser.
+
+    Tracks the current ``h2.state-header`` as it goes by and, once each
+    ``.list-item-container`` inside the ``div.search-results`` that follows
+    a header has been parsed, turns it into a record and clears it (with
+    anything before it) from the tree, so only one facility is held in
+    memory at a time.  Finished records accumulate in ``records`` until the
+    caller drains them.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.current_state = None
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._results_depth = 0  # open div.search-results after a state header
+        self._item_depth = 0  # open .list-item-container inside them
+
+    def feed(self, data):
+        self._parser.feed(data)
+        self._read_events()
+
+    def close(self):
+        self._parser.close()
+        self._read_events()
+
+    def _read_events(self):
+        for event, element in self._parser.read_events():
+            if element.tag == 'h2':
+                if event == 'end' and 'state-header' in _classes(element):
+                    self.current_state = _text(element)
+                continue
+            if element.tag != 'div':
+                continue
+            classes = _classes(element)
+            if self._results_depth and 'list-item-container' in classes:
+                if event == 'start':
+                    self._item_depth += 1
+                    continue
+                self._item_depth -= 1
+                if not self._item_depth:
+                    self.records.append(parse_railcar_facility(element))
+                    self._discard(element)
+            elif self.current_state is not None and 'search-results' in classes:
+                self._results_depth += 1 if event == 'start' else -1
+
+    @staticmethod
+    def _discard(element):
+        """Free a finished facility and the siblings (decoys, whitespace) parsed before it"""
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_railcar_storage(source, chunk_size=64 * 1024):
+    """Yield railcar-storage records in a single pass over a region page.
+
+    ``source`` is the page as a string or a text file object.  It is fed to
+    RailcarStorageParser in chunks and records are yielded as soon as each
+    facility closes, so runtime is linear and memory stays flat however many
+    facilities the page lists.
+    """
+    parser = RailcarStorageParser()
+    if hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), '')
+    else:
+        chunks = (source[i:i + chunk_size] for i in range(0, len(source), chunk_size))
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.records
+        parser.records.clear()
+    parser.close()
+    yield from parser.records
+
+
+def extract_railcar_storage(content):
+    """Extract facility records from a railcar-storage region page.
+
+    Each ``h2.state-header`` is followed by a ``div.search-results`` block
+    whose ``.list-item-container`` children are the facilities.
+    """
+    return list(iter_railcar_storage(content))
+
+
+EXTRACTORS = {
+    'transloading': extract_transloading,
+    'railcar-storage': extract_railcar_storage,
+}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+    import time
+    parser = argparse.ArgumentParser(description='Extract facilities from a saved listing page')
+    parser.add_argument('html', help='Saved HTML file')
+    parser.add_argument('--layout', choices=sorted(EXTRACTORS), default='transloading',
+                        help='Page layout to parse (default: transloading)')
+    args = parser.parse_args()
+
+    with open(args.html, encoding='utf-8') as f:
+        content = f.read()
+    start_time = time.perf_counter()
+    data = EXTRACTORS[args.layout](content)
+    elapsed = time.perf_counter() - start_time
+    print(json.dumps(data, indent=2))
+    print(f"Parsed in {elapsed * 1000:.1f} ms", file=sys.stderr)
@@ -0,0 +1,160 @@
+import logging
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from .components import FetchComponents
+from .deadline import DEADLINE_EXCEEDED, Deadline, DeadlineExceeded
+from .extraction import extract_transloading
+from .ratelimit import THROTTLE_STATUSES
+from .readiness import PROTECTION_MARKERS
+from .scraper import CONTEXT_OPTIONS, WebScraper
+
+# Headers for the HTTP tier; brotli is left out because requests cannot
+# decode it without an extra package
+HTTP_HEADERS = dict(CONTEXT_OPTIONS['extra_http_headers'],
+                    **{'User-Agent': CONTEXT_OPTIONS['user_agent'], 'Accept-Encoding': 'gzip, deflate'})
+
+# Statuses protected hosts answer plain HTTP clients with while still serving
+# the browser; they say nothing about the host's load, so they do not slow it
+BLOCK_STATUSES = {403}
+
+
+class TieredFetcher(FetchComponents):
+    """Try a plain keep-alive HTTP request first and render in Chromium only when needed.
+
+    Tier one fetches the server-rendered HTML and extracts facilities from it.
+    If the markup named by ``required_marker`` is missing (protection page,
+    client-side rendering, HTTP error), the URL falls back to WebScraper.
+    Every result carries a ``tier`` key and ``stats`` counts URLs per tier.
+    Both tiers share one ``deadline`` (seconds) per URL and the rate limiter,
+    learned timeouts, retry budget and metrics.
+    """
+
+    def __init__(self, scraper=None, required_marker='list-item-container', pool_size=8, timeout=15,
+                 block_profile='no-media', cache=None, state=None, limiter=None, recycle=None, timeouts=None,
+                 deadline=30, retries=None, metrics=None, profiler=None, waterfall=None):
+        self.logger = logging.getLogger(__name__)
+        self._init_components(cache=cache, limiter=limiter, recycle=recycle, timeouts=timeouts, deadline=deadline,
+                              retries=retries, metrics=metrics, waterfall=waterfall)
+        self.state = state
+        self.required_marker = required_marker
+        self.timeout = timeout
+        self.block_profile = block_profile
+        # Traces browser-tier page loads for --profile
+        self.profiler = profiler
+        self._scraper = scraper
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(HTTP_HEADERS)
+        self.stats = {'http': 0, 'browser': 0, 'failed': 0, 'deadline_exceeded': 0, 'http_seconds': 0.0,
+                      'browser_seconds': 0.0}
+
+    @property
+    def scraper(self):
+        """WebScraper for the browser tier, launched on first fallback"""
+        if self._scraper is None:
+            self._scraper = WebScraper(block_profile=self.block_profile, state=self.state, profiler=self.profiler,
+                                       **self.components())
+        return self._scraper
+
+    def fetch_static(self, url, deadline=None):
+        """Return the server-rendered HTML if it contains the required markup, else None"""
+        deadline = deadline or Deadline(None)
+        from_cache = self._from_cache(url, self.session.headers)
+        if not from_cache:
+            self.limiter.wait(url, deadline)
+        request_start = time.time()
+        timeout = deadline.timeout_ms('download', self.timeouts.timeout(url, 'download', self.timeout * 1000)) / 1000
+        try:
+            with self.metrics.timer('download'):
+                if self.cache is not None:
+                    status, content = self.cache.requests_get(self.session, url, timeout=timeout)
+                else:
+                    response = self.session.get(url, timeout=timeout)
+                    status, content = response.status_code, response.text
+        except requests.RequestException as e:
+            self.logger.debug(f"HTTP tier failed for {url}: {str(e)}")
+            if isinstance(e, requests.Timeout) and not from_cache:
+                self._record_timeout(url, 'download', time.time() - request_start, deadline)
+            self.limiter.record(url, latency=time.time() - request_start, error=True)
+            self.retries.record(url, False)
+            return None
+        if not from_cache:
+            if status in BLOCK_STATUSES:
+                self.limiter.record_latency(url, time.time() - request_start)
+            else:
+                self.limiter.record(url, status, latency=time.time() - request_start)
+            self.retries.record(url, status < 500 and status not in THROTTLE_STATUSES)
+            self.timeouts.record(url, 'download', time.time() - request_start)
+        if status != 200:
+            self.logger.debug(f"HTTP tier got status {status} for {url}")
+            return None
+        if any(text in content for text in PROTECTION_MARKERS) or self.required_marker not in content:
+            self.logger.debug(f"Static HTML for {url} lacks {self.required_marker}")
+            return None
+        return content
+
+    def scrape_url(self, url, deadline=None):
+        """Scrape a URL through the cheapest tier that yields facilities, or None on failure"""
+        start_time = time.time()
+        deadline = deadline or Deadline(self.deadline)
+        if not self.retries.allow_request(url):
+            self.logger.warning(f"Skipping {url}: circuit open for its host")
+            self.stats['failed'] += 1
+            return None
+        try:
+            content = self.fetch_static(url, deadline)
+        except DeadlineExceeded as e:
+            self.logger.warning(f"Abandoned {url}: {str(e)}")
+            self.stats['failed'] += 1
+            self.stats['deadline_exceeded'] += 1
+            return None
+        if content is not None:
+            page_fingerprint, result = None, None
+            if self.state is not None:
+                page_fingerprint, result = self.state.unchanged_result(url, content)
+            if result is None:
+                with self.metrics.timer('extraction'):
+                    data = extract_transloading(content)
+                if data['facilities']:
+                    result = {'url': url, 'title': data['title'], 'facilities': data['facilities']}
+                    if page_fingerprint is not None:
+                        result['fingerprint'] = page_fingerprint
+            if result is not None:
+                self.stats['http'] += 1
+                self.stats['http_seconds'] += time.time() - start_time
+                self.logger.info(f"Served {url} from the HTTP tier")
+                result['tier'] = 'http'
+                return result
+
+        browser_start = time.time()
+        result = self.scraper.scrape_url(url, deadline)
+        if result is None:
+            self.stats['failed'] += 1
+            if deadline.expired:
+                self.stats['deadline_exceeded'] += 1
+            return None
+        self.stats['browser'] += 1
+        self.stats['browser_seconds'] += time.time() - browser_start
+        self.logger.info(f"Served {url} from the browser tier")
+        result['tier'] = 'browser'
+        return result
+
+    def summary(self):
+        """One-line description of how many URLs each tier served"""
+        return (f"HTTP tier served {self.stats['http']} URLs ({self.stats['http_seconds']:.1f}s), "
+                f"browser tier served {self.stats['browser']} ({self.stats['browser_seconds']:.1f}s), "
+                f"{self.stats['failed']} failed ({self.stats['deadline_exceeded']} {DEADLINE_EXCEEDED})")
+
+    def close(self):
+        """Clean up resources"""
+        self.logger.info(self.summary())
+        self.session.close()
+        if self._scraper is not None:
+            # WebScraper logs (and saves) the shared components on close
+            self._scraper.close()
+        else:
+            self._log_summaries()
@@ -0,0 +1,317 @@
+import logging
+import random
+import re
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Values the generated listings are drawn from
+CITIES = {
+    'GA': ('Georgia', ['Atlanta', 'Savannah', 'Augusta']),
+    'TX': ('Texas', ['Houston', 'Dallas', 'San Antonio', 'El Paso']),
+    'IL': ('Illinois', ['Chicago', 'Joliet', 'Peoria']),
+    'MO': ('Missouri', ['Kansas City', 'St. Louis', 'Springfield']),
+    'NE': ('Nebraska', ['Omaha', 'Lincoln']),
+    'OK': ('Oklahoma', ['Tulsa', 'Oklahoma City']),
+    'TN': ('Tennessee', ['Memphis', 'Nashville']),
+    'IA': ('Iowa', ['Des Moines', 'Cedar Rapids']),
+    'KS': ('Kansas', ['Wichita', 'Topeka']),
+    'AR': ('Arkansas', ['Little Rock', 'Fort Smith']),
+}
+STATES = sorted(CITIES)
+# Every product list starts with one the transloading extractor recognises
+PRODUCTS = ['Dry Bulk', 'Liquid Bulk', 'Packaged Goods', 'Liquids', 'Oversized']
+EXTRA_PRODUCTS = ['Food Grade', 'Chemicals', 'Lumber', 'Steel']
+# Likewise for railroads: a Class I the extractor recognises, then shortlines
+RAILROADS = ['CSX', 'NS', 'BNSF']
+EXTRA_RAILROADS = ['UP', 'KCS', 'CN', 'CPKC', 'Shortline']
+OPERATORS = ['TRANSFLO', 'Savage', 'Watco', 'Kinder Morgan', 'RailAmerica', 'Genesee & Wyoming', 'Pioneer',
+             'Carload Express']
+
+VERIFIED_ICON = '<i class="icon-transload-verified-sm"></i>'
+
+LAYOUTS = ('transloading', 'railcar-storage')
+PAGE_PATH_RE = re.compile(r'^/(transloading|railcar-storage)/(\d+)\.html$')
+
+
+class _Noise:
+    """Decides, facility by facility, which irregularities to add"""
+
+    def __init__(self, rng, level):
+        self.rng = rng
+        self.level = level
+
+    def __call__(self):
+        return self.level > 0 and self.rng.random() < self.level
+
+    def gap(self):
+        """Whitespace between elements, as hand-indented templates leave it"""
+        return '\n' + ' ' * self.rng.randrange(0, 16) if self() else ''
+
+
+def _location(rng):
+    state = rng.choice(STATES)
+    return rng.choice(CITIES[state][1]), state
+
+
+def _pick(rng, first, extra):
+    """One value of ``first`` followed by up to two of ``extra``"""
+    return [rng.choice(first)] + rng.sample(extra, rng.randrange(0, 3))
+
+
+def _decoy(noise):
+    """A block that looks like a listing but is not a facility"""
+    if not noise():
+        return ''
+    return ('<div class="sponsored-listing"><a class="promo-title" href="/advertise.html">Advertise here</a>'
+            '<div class="promo-text">Reach 10,000 shippers</div></div><!-- /sponsored -->')
+
+
+def _transloading_facility(rng, noise, i):
+    """Markup and expected record of one transloading facility"""
+    city, state = _location(rng)
+    name = f'{rng.choice(OPERATORS)} - {city}, {state} #{i}'
+    products = _pick(rng, PRODUCTS, EXTRA_PRODUCTS)
+    # Values are drawn whether or not noise drops them, so noise does not shift the rest of the page
+    railroads = _pick(rng, RAILROADS, EXTRA_RAILROADS)
+    if noise():
+        railroads = []
+    hazmat = rng.random() < 0.3
+    verified = rng.random() < 0.4
+
+    classes = 'list-item-container featured' if noise() else 'list-item-container'
+    data = f' data-id="{rng.randrange(10 ** 6)}"' if noise() else ''
+    attributes = [f'{escape(city)}, {state}', ', '.join(products),
+                  ', '.join(railroads) if railroads else 'not served by rail',
+                  'Capable of HazMat' if hazmat else 'No HazMat']
+    markup = (
+        f'{_decoy(noise)}<div class="{classes}"{data}>{noise.gap()}'
+        f'<a class="list-title" href="/transloading/facility-{i}.html">{escape(name)}</a>'
+        f'{VERIFIED_ICON if verified else ""}{"<!-- listing details -->" if noise() else ""}'
+        + ''.join(f'{noise.gap()}<div class="list-attribute"><div class="list-attribute-text">{text}</div></div>'
+                  for text in attributes)
+        + f'{noise.gap()}</div>'
+    )
+    record = {
+        'name': name,
+        'products': products,
+        'railroads': railroads,
+        'hazmat_capable': hazmat,
+        'type': 'verified' if verified else 'unverified'
+    }
+    return markup, record
+
+
+def _attribute(noise, icon, text):
+    """A railcar-storage attribute row, in the old or the newer markup when noisy"""
+    if noise():
+        return (f'<span class="facility-attribute"><i class="{icon}"></i>'
+                f'<span class="facility-attribute-text">{text}</span></span>')
+    return f'<div class="list-attribute"><i class="{icon}"></i><div class="list-attribute-text">{text}</div></div>'
+
+
+def _railcar_facility(rng, noise, i, state):
+    """Markup and expected record of one railcar-storage facility in ``state``"""
+    city = rng.choice(CITIES[state][1])
+    name = f'{rng.choice(OPERATORS)} Storage #{i}'
+    railroads = ', '.join(_pick(rng, RAILROADS, EXTRA_RAILROADS))
+    spaces = int(10 ** rng.uniform(1, 5))
+    if noise():
+        spaces = None
+    hazmat = rng.random() < 0.3
+
+    marker = 'fa fa-location-dot' if noise() else 'fa fa-map-marker'
+    warning = 'fa fa-triangle-exclamation' if noise() else 'fa fa-warning'
+    rows = [_attribute(noise, marker, f'{escape(city)}, {state}'),
+            _attribute(noise, 'ci ci-railroad', railroads)]
+    if spaces is not None:
+        rows.append(_attribute(noise, 'fa fa-cubes', f'{spaces:,} total spaces'))
+    if hazmat:
+        rows.append(_attribute(noise, warning, 'Hazmat suitable'))
+    body = ''.join(noise.gap() + row for row in rows)
+    if noise():
+        # Nested layout wrapper, as the responsive template renders it
+        body = f'<div class="row"><div class="col-md-8">{body}</div></div>'
+    badge = '<span class="badge">New' if noise() else ''  # never closed, like the live site
+    markup = (f'{_decoy(noise)}<div class="list-item-container">{noise.gap()}'
+              f'<a class="list-title" href="/railcar-storage/facility-{i}.html">{escape(name)}</a>'
+              f'{badge}{body}{noise.gap()}</div>')
+    record = {
+        'State': state,
+        'Facility Name': name,
+        'Location': f'{city}, {state}',
+        'Railroad Connections': railroads,
+        'Total Spaces': spaces,
+        'Hazmat Suitable': 'Yes' if hazmat else 'No'
+    }
+    return markup, record
+
+
+def iter_listing(layout, facilities, seed=0, noise=0.0):
+    """Yield (markup, expected record) for each facility of a generated page.
+
+    The same ``layout``, ``facilities``, ``seed`` and ``noise`` always give
+    the same page.  ``noise`` (0 to 1) is the chance of each irregularity
+    per facility: whitespace, comments, extra classes and attributes, decoy
+    sponsored blocks, the alternative icon and attribute markup, missing
+    attributes, wrapper divs and unclosed tags.  Expected records are what
+    the extractors should return for the facility.
+    """
+    rng = random.Random(f'{layout}:{seed}')
+    noisy = _Noise(random.Random(f'{layout}:{seed}:noise'), noise)
+    if layout == 'transloading':
+        for i in range(facilities):
+            yield _transloading_facility(rng, noisy, i)
+        return
+    states = STATES[:max(1, min(len(STATES), facilities // 5))]
+    for i in range(facilities):
+        # Facilities come grouped by state, in contiguous blocks
+        yield _railcar_facility(rng, noisy, i, states[i * len(states) // facilities])
+
+
+def iter_page(layout, facilities, seed=0, noise=0.0, title=None):
+    """Yield a generated page in chunks, so pages of 100k facilities need not be held in memory"""
+    title = title or ('Transloading Facilities | Commtrex' if layout == 'transloading'
+                      else 'Railcar Storage - US Central Region | Commtrex')
+    yield f'<!DOCTYPE html><html><head><title>{escape(title)}</title></head><body><div class="search-results-list">'
+    if layout == 'transloading':
+        for markup, _ in iter_listing(layout, facilities, seed, noise):
+            yield markup
+    else:
+        state = None
+        for markup, record in iter_listing(layout, facilities, seed, noise):
+            if record['State'] != state:
+                if state is not None:
+                    yield '</div>'
+                state = record['State']
+                yield f'<h2 class="state-header">{CITIES[state][0]}</h2><div class="search-results">'
+            yield markup
+        if state is not None:
+            yield '</div>'
+    yield '</div></body></html>'
+
+
+def expected_records(layout, facilities, seed=0, noise=0.0):
+    """The records the extractors should return for the same generated page"""
+    return [record for _, record in iter_listing(layout, facilities, seed, noise)]
+
+
+def transloading_page(facilities, seed=0, noise=0.0):
+    """A commtrex-style transloading listing page, as ``extraction.extract_transloading`` reads it"""
+    return ''.join(iter_page('transloading', facilities, seed, noise))
+
+
+def railcar_storage_page(facilities, seed=0, noise=0.0):
+    """A commtrex-style railcar-storage region page, as ``extraction.extract_railcar_storage`` reads it"""
+    return ''.join(iter_page('railcar-storage', facilities, seed, noise))
+
+
+def write_page(path, layout, facilities, seed=0, noise=0.0):
+    """Write a generated page to ``path`` without building it in memory first"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in iter_page(layout, facilities, seed, noise):
+            f.write(chunk)
+
+
+PAGE_BUILDERS = {
+    'transloading': transloading_page,
+    'railcar-storage': railcar_storage_page,
+}
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        match = PAGE_PATH_RE.match(self.path.split('?', 1)[0])
+        if match is None:
+            self.send_error(404)
+            return
+        body = self.server.page(match.group(1), int(match.group(2)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Local HTTP server for generated listing pages, for offline runs and benchmarks.
+
+    ``/<layout>/<n>.html`` serves a page of ``n`` facilities in either
+    layout, generated with ``seed`` and ``noise``; query strings are
+    ignored, so callers can make every URL distinct.  Pages are generated
+    once per size and kept.  Use as a context manager; the server runs on
+    a background thread on an ephemeral port of 127.0.0.1.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, seed=0, noise=0.0):
+        super().__init__((host, port), _FixtureHandler)
+        self.logger = logging.getLogger(__name__)
+        self.seed = seed
+        self.noise = noise
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, layout, facilities, query=None):
+        """URL of the ``layout`` page listing ``facilities`` facilities"""
+        url = f'{self.base_url}/{layout}/{facilities}.html'
+        return f'{url}?{query}' if query else url
+
+    def page(self, layout, facilities):
+        """Encoded body of a generated page"""
+        key = (layout, facilities)
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = PAGE_BUILDERS[layout](facilities, self.seed, self.noise).encode('utf-8')
+            return self._pages[key]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        self.logger.debug(f"Serving fixture pages on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic listing page for scale and memory tests')
+    parser.add_argument('layout', choices=LAYOUTS, help='Page layout to generate')
+    parser.add_argument('facilities', type=int, help='Number of facilities on the page (10 to 100000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same page')
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help='Chance of each markup irregularity per facility, 0 to 1 (default: 0)')
+    parser.add_argument('--output', '-o', type=str, help='HTML file to write (default: <layout>-<facilities>.html)')
+    parser.add_argument('--expected', type=str, help='Also write the records the extractors should return to this JSON file')
+    args = parser.parse_args()
+
+    output = args.output or f'{args.layout}-{args.facilities}.html'
+    write_page(output, args.layout, args.facilities, args.seed, args.noise)
+    if args.expected:
+        import json
+        with open(args.expected, 'w', encoding='utf-8') as f:
+            json.dump(expected_records(args.layout, args.facilities, args.seed, args.noise), f, indent=2)
+    print(f"Wrote {args.facilities} {args.layout} facilities to {output}")
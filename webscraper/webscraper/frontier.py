@@ -0,0 +1,79 @@
+import logging
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_fetched REAL,
+    last_error TEXT,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_status ON urls (status, added_at);
+"""
+
+
+class CrawlFrontier:
+    """Durable list of URLs to crawl, stored in SQLite.
+
+    Every URL has a status (``pending``, ``done`` or ``failed``), the number
+    of fetch attempts and the time of the last one.  Each outcome is
+    committed as soon as it is recorded, so a crashed crawl resumes from the
+    URLs that were still pending.
+    """
+
+    def __init__(self, path='crawl_frontier.sqlite3'):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def add(self, urls, requeue=True):
+        """Queue URLs; with ``requeue`` URLs already crawled are queued again"""
+        now = time.time()
+        with self.db:
+            for url in urls:
+                self.db.execute('INSERT OR IGNORE INTO urls (url, host, added_at) VALUES (?, ?, ?)',
+                                (url, urlparse(url).hostname or '', now))
+                if requeue:
+                    self.db.execute("UPDATE urls SET status = 'pending', attempts = 0 WHERE url = ?", (url,))
+
+    def clear(self):
+        """Forget every URL, e.g. before starting a fresh crawl"""
+        with self.db:
+            self.db.execute('DELETE FROM urls')
+
+    def retry_failed(self, max_attempts=3):
+        """Queue failed URLs again unless they already used ``max_attempts`` fetches"""
+        with self.db:
+            cursor = self.db.execute("UPDATE urls SET status = 'pending' WHERE status = 'failed' AND attempts < ?",
+                                     (max_attempts,))
+        return cursor.rowcount
+
+    def pending(self):
+        """Pending URLs in the order they were added"""
+        rows = self.db.execute("SELECT url FROM urls WHERE status = 'pending' ORDER BY added_at, rowid")
+        return [url for url, in rows]
+
+    def finish(self, url, ok, error=None):
+        """Record the outcome of one fetch attempt"""
+        with self.db:
+            self.db.execute('UPDATE urls SET status = ?, attempts = attempts + 1, last_fetched = ?, last_error = ? '
+                            'WHERE url = ?', ('done' if ok else 'failed', time.time(), error, url))
+
+    def counts(self):
+        """Number of URLs per status"""
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM urls GROUP BY status'))
+
+    def summary(self):
+        """One-line description of the frontier"""
+        counts = self.counts()
+        return (f"Frontier {self.path}: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed, "
+                f"{counts.get('pending', 0)} pending")
+
+    def close(self):
+        self.db.close()
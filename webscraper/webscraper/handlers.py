@@ -0,0 +1,115 @@
+import logging
+import math
+from urllib.parse import urlparse
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.http import HtmlResponse
+
+from .async_scraper import AsyncWebScraper
+from .coalesce import SingleFlight
+from .httpcache import DiskCache
+from .metrics import write_render_stats
+from .ratelimit import NoRateLimiter, shared_limiter
+from .recycling import recycle_policy
+from .retries import shared_retry_policy
+from .timeouts import shared_budget
+
+logger = logging.getLogger(__name__)
+
+# Scrapy builds one handler per scheme; the http and https handlers of a
+# crawler share one scraper (and so one page pool and coalescer) through this.
+# id(crawler) -> {'scraper': AsyncWebScraper or None, 'handlers': open handlers}
+_shared = {}
+
+
+class PlaywrightDownloadHandler(HTTP11DownloadHandler):
+    """Download handler that renders ``meta={'playwright': True}`` requests in Chromium.
+
+    Pages are rendered with the async Playwright API on the asyncio loop that
+    backs TWISTED_REACTOR, so the reactor never blocks on a browser session.
+    The extracted facilities are stored in ``response.meta['playwright_data']``.
+    All other requests go through Scrapy's regular HTTP handler.
+    """
+
+    lazy = False
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        self._shared = _shared.setdefault(id(crawler), {'scraper': None, 'handlers': 0})
+        self._shared['handlers'] += 1
+
+    @property
+    def scraper(self):
+        return self._shared['scraper']
+
+    def _get_scraper(self):
+        if self.scraper is None:
+            settings = self.crawler.settings
+            max_contexts = settings.getint('PLAYWRIGHT_MAX_CONTEXTS', 2)
+            cache = None
+            if settings.getbool('DISKCACHE_ENABLED'):
+                cache = DiskCache(settings.get('DISKCACHE_DIR', '.httpcache'), ttl=settings.getint('DISKCACHE_TTL', 3600))
+            self._shared['scraper'] = AsyncWebScraper(
+                max_contexts=max_contexts,
+                pages_per_context=math.ceil(settings.getint('CONCURRENT_REQUESTS') / max_contexts),
+                per_domain=settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'),
+                block_profile=settings.get('PLAYWRIGHT_BLOCK_PROFILE', 'no-media'),
+                cache=cache,
+                # Same per-host limiter as HostRateLimitMiddleware, which leaves these requests to it;
+                # without one (HOST_RATE_LIMIT = 0) renders are not paced at all
+                limiter=shared_limiter(settings) or NoRateLimiter(),
+                endpoint=settings.get('PLAYWRIGHT_BROWSER_ENDPOINT'),
+                recycle=recycle_policy(settings),
+                timeouts=shared_budget(settings.get('LEARNED_TIMEOUTS_FILE'),
+                                       multiplier=settings.getfloat('LEARNED_TIMEOUTS_MULTIPLIER', 1.5)),
+                deadline=settings.getfloat('URL_DEADLINE', 30) or None,
+                retries=shared_retry_policy(settings),
+                coalescer=SingleFlight(ttl=settings.getfloat('COALESCE_TTL', 30))
+            )
+        return self.scraper
+
+    async def download_request(self, request):
+        if not request.meta.get('playwright'):
+            return await super().download_request(request)
+        return await self._download_playwright(request)
+
+    async def _download_playwright(self, request):
+        logger.debug(f"Rendering {request.url} with Playwright")
+        rendered = await self._get_scraper().render(request.url, urlparse(request.url).hostname,
+                                                    deadline=request.meta.get('deadline'))
+        request.meta['playwright_data'] = {
+            'url': rendered['url'],
+            'title': rendered['title'],
+            'facilities': rendered['facilities']
+        }
+        return HtmlResponse(
+            url=request.url,
+            status=rendered['status'],
+            body=rendered['html'].encode('utf-8'),
+            encoding='utf-8',
+            request=request,
+            flags=['playwright']
+        )
+
+    async def close(self):
+        self._shared['handlers'] -= 1
+        if self._shared['handlers'] == 0:
+            _shared.pop(id(self.crawler), None)
+            await self._close_scraper()
+        await super().close()
+
+    async def _close_scraper(self):
+        """Write the shared scraper's stats and close it, once the last handler using it closes"""
+        if self.scraper is not None:
+            scraper = self.scraper
+            components = {
+                'blocked': {'requests': scraper.blocker.stats['blocked_requests'],
+                            'bytes_estimate': scraper.blocker.stats['bytes_saved']},
+                'recycle': scraper.recycle.stats,
+                'readiness': scraper.readiness.stats,
+                'coalesce': scraper.coalescer.stats,
+            }
+            if scraper.cache is not None:
+                components['diskcache'] = scraper.cache.stats
+            write_render_stats(self.crawler.stats, 'handler', components)
+            self._shared['scraper'] = None
+            await scraper.close()
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+# Request headers that change the document the server returns
+VARY_HEADERS = ('Accept', 'Accept-Language')
+
+# Response headers kept with each entry
+STORED_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control')
+
+
+def _header(headers, name):
+    """Case-insensitive lookup that also decodes Scrapy's bytes headers"""
+    for key, value in (headers or {}).items():
+        if isinstance(key, bytes):
+            key = key.decode('latin-1')
+        if key.lower() == name.lower():
+            if isinstance(value, list):
+                value = value[0] if value else ''
+            if isinstance(value, bytes):
+                value = value.decode('latin-1')
+            return value
+    return None
+
+
+class CacheEntry:
+    """Metadata of one cached document; the body lives in the object store"""
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+
+    @property
+    def url(self):
+        return self.meta['url']
+
+    @property
+    def status(self):
+        return self.meta['status']
+
+    @property
+    def headers(self):
+        return self.meta['headers']
+
+    @property
+    def fresh(self):
+        return time.time() - self.meta['stored_at'] < self.cache.ttl
+
+    @property
+    def body(self):
+        return self.cache.read_object(self.meta['body_sha256'])
+
+    def conditional_headers(self):
+        """Validators for a conditional request revalidating this entry"""
+        headers = {}
+        if self.headers.get('etag'):
+            headers['If-None-Match'] = self.headers['etag']
+        if self.headers.get('last-modified'):
+            headers['If-Modified-Since'] = self.headers['last-modified']
+        return headers
+
+
+class DiskCache:
+    """Content-addressed on-disk HTTP cache with TTLs and conditional revalidation.
+
+    Entries are keyed by URL and the request headers in ``vary_headers``.
+    Bodies are stored once per SHA-256 under ``objects/``, so identical
+    documents reached through different URLs share storage.  Entries younger
+    than ``ttl`` seconds are served directly; older ones are revalidated with
+    ``If-None-Match``/``If-Modified-Since`` and refreshed on ``304``.
+    ``stats`` counts hits, misses, revalidations and stores.
+    """
+
+    def __init__(self, directory='.httpcache', ttl=3600, vary_headers=VARY_HEADERS):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.ttl = ttl
+        self.vary_headers = vary_headers
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0}
+        os.makedirs(os.path.join(directory, 'index'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+
+    def key(self, url, headers=None):
+        parts = [url] + [f"{name}:{_header(headers, name) or ''}" for name in self.vary_headers]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def _index_path(self, key):
+        return os.path.join(self.directory, 'index', key[:2], f'{key}.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def read_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return f.read()
+
+    def get(self, url, headers=None):
+        """Return the CacheEntry for a request, or None if nothing is stored"""
+        key = self.key(url, headers)
+        try:
+            with open(self._index_path(key), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._object_path(meta['body_sha256'])):
+            return None
+        return CacheEntry(self, key, meta)
+
+    def is_fresh(self, url, headers=None):
+        """True if a request for ``url`` would be served from the cache without reaching the host"""
+        entry = self.get(url, headers)
+        return entry is not None and entry.fresh
+
+    def lookup(self, url, headers=None):
+        """Like get(), but counts a hit for fresh entries and a miss otherwise"""
+        entry = self.get(url, headers)
+        if entry is not None and entry.fresh:
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+        return entry
+
+    def store(self, url, request_headers, status, response_headers, body):
+        """Store a successful response and return its CacheEntry"""
+        if status != 200 or 'no-store' in (_header(response_headers, 'cache-control') or ''):
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write_atomic(object_path, body)
+        key = self.key(url, request_headers)
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': {name: _header(response_headers, name) for name in STORED_HEADERS
+                        if _header(response_headers, name) is not None},
+            'body_sha256': digest,
+            'stored_at': time.time(),
+        }
+        self._write_atomic(self._index_path(key), json.dumps(meta).encode('utf-8'))
+        self.stats['stores'] += 1
+        return CacheEntry(self, key, meta)
+
+    def refresh(self, entry):
+        """Mark an entry fresh again after the server answered 304 Not Modified"""
+        entry.meta['stored_at'] = time.time()
+        self._write_atomic(self._index_path(entry.key), json.dumps(entry.meta).encode('utf-8'))
+        self.stats['revalidated'] += 1
+        return entry
+
+    def requests_get(self, session, url, **kwargs):
+        """GET ``url`` through a requests session, serving and revalidating from the cache.
+
+        Returns ``(status, text)``.
+        """
+        headers = dict(session.headers, **kwargs.pop('headers', {}))
+        entry = self.lookup(url, headers)
+        if entry is not None and entry.fresh:
+            return entry.status, entry.body.decode('utf-8', errors='replace')
+        request_headers = dict(headers, **(entry.conditional_headers() if entry else {}))
+        response = session.get(url, headers=request_headers, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.refresh(entry)
+            return entry.status, entry.body.decode('utf-8', errors='replace')
+        self.store(url, headers, response.status_code, response.headers, response.content)
+        return response.status_code, response.text
+
+    def _route_hit(self, request):
+        """Return (entry, conditional headers) for a document request seen by page.route"""
+        entry = self.lookup(request.url, request.headers)
+        if entry is not None and entry.fresh:
+            return entry, None
+        return entry, dict(request.headers, **(entry.conditional_headers() if entry else {}))
+
+    def handle_route(self, route):
+        """page.route handler for the sync Playwright API; only GET documents are cached"""
+        request = route.request
+        if request.resource_type != 'document' or request.method != 'GET':
+            route.fallback()
+            return
+        entry, headers = self._route_hit(request)
+        if headers is None:
+            route.fulfill(status=entry.status, headers=entry.headers, body=entry.body)
+            return
+        response = route.fetch(headers=headers)
+        if response.status == 304 and entry is not None:
+            self.refresh(entry)
+            route.fulfill(status=entry.status, headers=entry.headers, body=entry.body)
+            return
+        body = response.body()
+        self.store(request.url, request.headers, response.status, response.headers, body)
+        route.fulfill(response=response, body=body)
+
+    async def handle_route_async(self, route):
+        """page.route handler for the async Playwright API; only GET documents are cached"""
+        request = route.request
+        if request.resource_type != 'document' or request.method != 'GET':
+            await route.fallback()
+            return
+        entry, headers = self._route_hit(request)
+        if headers is None:
+            await route.fulfill(status=entry.status, headers=entry.headers, body=entry.body)
+            return
+        response = await route.fetch(headers=headers)
+        if response.status == 304 and entry is not None:
+            self.refresh(entry)
+            await route.fulfill(status=entry.status, headers=entry.headers, body=entry.body)
+            return
+        body = await response.body()
+        self.store(request.url, request.headers, response.status, response.headers, body)
+        await route.fulfill(response=response, body=body)
+
+    def attach(self, context):
+        """Serve documents for a sync BrowserContext from the cache"""
+        context.route('**/*', self.handle_route)
+
+    async def attach_async(self, context):
+        """Serve documents for an async BrowserContext from the cache"""
+        await context.route('**/*', self.handle_route_async)
+
+    def summary(self):
+        """One-line description of the cache counters"""
+        return (f"HTTP cache: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                f"{self.stats['revalidated']} revalidated, {self.stats['stores']} stored")
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+# Markup that changes on every request without changing the listings
+VOLATILE_MARKUP_RE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<input\b[^>]*>',
+                                re.IGNORECASE | re.DOTALL)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(content):
+    """Hash of a page with scripts, styles, comments and form tokens removed"""
+    normalized = WHITESPACE_RE.sub(' ', VOLATILE_MARKUP_RE.sub('', content))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def facility_key(facility):
+    """Identify a facility by name and location across crawls"""
+    if 'Facility Name' in facility:
+        return f"{facility['Facility Name']}|{facility.get('Location', '')}"
+    # Transloading names read "Name | City, ST" (see convert_to_csv.py)
+    parts = facility.get('name', '').split('|')
+    name = parts[0].strip()
+    location = parts[1].strip() if len(parts) > 1 else ''
+    return f"{name}|{location}"
+
+
+def diff_facilities(old, new):
+    """Return the facilities added, removed and modified between two crawls"""
+    before = {facility_key(f): f for f in old}
+    after = {facility_key(f): f for f in new}
+    return {
+        'added': [after[k] for k in after if k not in before],
+        'removed': [before[k] for k in before if k not in after],
+        'modified': [{'key': k, 'before': before[k], 'after': after[k]}
+                     for k in after if k in before and before[k] != after[k]],
+    }
+
+
+class IncrementalState:
+    """Per-URL content fingerprints and last-seen facilities, persisted as JSON.
+
+    Scrapers call ``unchanged_result()`` with the fetched HTML before
+    extracting; a matching fingerprint returns the stored result so the
+    extraction can be skipped.  After a changed page is extracted,
+    ``record()`` stores it and returns the facility-level delta.
+    """
+
+    def __init__(self, path='crawl_state.json'):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.pages = json.load(f)
+
+    def unchanged_result(self, url, content):
+        """Return (fingerprint, stored result or None if the page changed)"""
+        page_fingerprint = fingerprint(content)
+        page = self.pages.get(url)
+        if page is None or page['fingerprint'] != page_fingerprint:
+            return page_fingerprint, None
+        self.logger.debug(f"{url} is unchanged since {time.ctime(page['fetched_at'])}")
+        return page_fingerprint, {
+            'url': url,
+            'title': page.get('title', ''),
+            'facilities': page['facilities'],
+            'fingerprint': page_fingerprint,
+            'unchanged': True
+        }
+
+    def record(self, result):
+        """Store a freshly extracted result and return its delta against the previous crawl"""
+        url = result['url']
+        previous = self.pages.get(url, {}).get('facilities', [])
+        delta = diff_facilities(previous, result['facilities'])
+        self.pages[url] = {
+            'fingerprint': result['fingerprint'],
+            'title': result.get('title', ''),
+            'facilities': result['facilities'],
+            'fetched_at': time.time(),
+        }
+        return delta
+
+    def save(self):
+        """Write the state file atomically"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.pages, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds.  Extraction and output writes take
+# milliseconds, so these start far below the 50 ms of timeouts.BUCKETS.
+PHASE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+# Phases of one scrape, in order; 'download' is the HTTP tier's fetch
+PHASES = ('context', 'download', 'navigation', 'readiness', 'extraction', 'serialization', 'write')
+
+
+class PhaseHistogram:
+    """Count, sum, maximum and bucketed distribution of one phase's durations"""
+
+    def __init__(self, buckets=PHASE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound in seconds of the bucket holding the ``q`` quantile, never above the maximum"""
+        threshold = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= threshold:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return 0.0
+
+
+class PhaseMetrics:
+    """Latency histograms per scraping phase, for stats and a Prometheus endpoint.
+
+    Wrap each phase in ``with metrics.timer('navigation'):`` (or report a
+    measured duration with ``observe()``); phases that raise are timed too.
+    The usual phases are listed in PHASES, but any name works.
+    ``write_stats()`` copies count, total, p50/p95/p99 and maximum into a
+    Scrapy stats collector and ``prometheus()`` renders the histograms in
+    the Prometheus text format.  Safe to share between threads.
+    """
+
+    def __init__(self, buckets=PHASE_BUCKETS):
+        self.logger = logging.getLogger(__name__)
+        self.buckets = buckets
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds):
+        """Record that ``phase`` took ``seconds``"""
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = PhaseHistogram(self.buckets)
+            histogram.add(seconds)
+
+    @contextmanager
+    def timer(self, phase):
+        """Time the block as one occurrence of ``phase``"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start_time)
+
+    def _ordered(self):
+        """(phase, histogram) pairs, known phases first in scrape order"""
+        with self._lock:
+            histograms = dict(self.histograms)
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        return sorted(histograms.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+
+    def write_stats(self, stats, prefix='phases'):
+        """Copy each phase's count, total, quantiles and maximum into a Scrapy stats collector"""
+        for phase, histogram in self._ordered():
+            stats.set_value(f'{prefix}/{phase}/count', histogram.count)
+            stats.set_value(f'{prefix}/{phase}/seconds', round(histogram.sum, 3))
+            for q in (0.5, 0.95, 0.99):
+                stats.set_value(f'{prefix}/{phase}/p{int(q * 100)}', round(histogram.quantile(q), 3))
+            stats.set_value(f'{prefix}/{phase}/max', round(histogram.max, 3))
+
+    def prometheus(self):
+        """The histograms as a Prometheus text-format exposition"""
+        lines = ['# HELP webscraper_phase_seconds Time spent in each scraping phase',
+                 '# TYPE webscraper_phase_seconds histogram']
+        for phase, histogram in self._ordered():
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'webscraper_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'webscraper_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}')
+            lines.append(f'webscraper_phase_seconds_sum{{phase="{phase}"}} {histogram.sum:.6f}')
+            lines.append(f'webscraper_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One-line description of the median and p95 of each phase and its share of the total time"""
+        phases = self._ordered()
+        total = sum(histogram.sum for _, histogram in phases)
+        if not total:
+            return "Phases: nothing timed yet"
+        return "Phases: " + ", ".join(
+            f"{phase} p50 {h.quantile(0.5) * 1000:.0f}ms p95 {h.quantile(0.95) * 1000:.0f}ms "
+            f"({h.sum / total:.0%})" for phase, h in phases)
+
+
+# Render stats that are readings rather than counts; they keep the highest value
+GAUGE_STATS = {'rss_mb', 'peak_rss_mb'}
+
+
+def write_render_stats(stats, source, components, prefix='playwright'):
+    """Add each component's flat stats dict to ``<prefix>/<component>/<name>/<source>``.
+
+    PlaywrightMiddleware and PlaywrightDownloadHandler each render with their
+    own blocker, cache, recycle policy, readiness and coalescer.  The
+    ``source`` suffix keeps their counters apart under one namespace.
+    Counters are added to what is already there and gauges keep their
+    maximum, so writing twice for one source never loses a count.
+    """
+    for component, values in components.items():
+        for name, value in values.items():
+            key = f'{prefix}/{component}/{name}/{source}'
+            if name in GAUGE_STATS:
+                stats.max_value(key, value)
+            else:
+                stats.inc_value(key, value)
+
+
+_metrics = PhaseMetrics()
+
+
+def get_metrics():
+    """The process-wide PhaseMetrics, shared by every scraper so one endpoint covers them all"""
+    return _metrics
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves ``metrics`` at ``http://host:port/metrics`` from a background thread"""
+
+    daemon_threads = True
+
+    def __init__(self, metrics=None, port=9410, host='127.0.0.1'):
+        super().__init__((host, port), _MetricsHandler)
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics or get_metrics()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        host, port = self.server_address[:2]
+        self.logger.info(f"Serving phase metrics on http://{host}:{port}/metrics")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
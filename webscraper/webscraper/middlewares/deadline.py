@@ -0,0 +1,68 @@
+import logging
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+from ..deadline import DEADLINE_EXCEEDED, Deadline
+
+
+class DeadlineMiddleware:
+    """Give every URL URL_DEADLINE seconds in total, across downloads and retries.
+
+    The first time a request passes, a Deadline is stored in
+    ``request.meta['deadline']``; retries are copies of the request and keep
+    it.  HostRateLimitMiddleware bounds its wait for the host by the time
+    left, LearnedTimeoutMiddleware caps ``download_timeout`` by what remains
+    after that wait (this middleware does so itself when learned timeouts are
+    off) and PlaywrightMiddleware caps its own waits the same way.  Once the
+    deadline passes, responses and errors are marked ``dont_retry`` so
+    RetryMiddleware gives up, and requests still queued are dropped with
+    IgnoreRequest.  Abandoned URLs are counted in the ``deadline/exceeded``
+    stat.  Place it before HostRateLimitMiddleware, so time queued for the
+    host counts too.
+    """
+
+    def __init__(self, seconds, default_timeout=90, stats=None, cap_timeout=True):
+        self.logger = logging.getLogger(__name__)
+        self.seconds = seconds
+        self.default_timeout = default_timeout
+        self.stats = stats
+        # Off when LearnedTimeoutMiddleware sets (and caps) download_timeout later
+        self.cap_timeout = cap_timeout
+
+    def _abandon(self, request):
+        request.meta['dont_retry'] = True
+        self.logger.warning(f"Abandoned {request.url}: {DEADLINE_EXCEEDED} "
+                            f"after {request.meta['deadline'].elapsed():.1f}s")
+        if self.stats is not None:
+            self.stats.inc_value('deadline/exceeded')
+
+    def process_request(self, request, spider):
+        deadline = request.meta.setdefault('deadline', Deadline(self.seconds))
+        if deadline.expired:
+            self._abandon(request)
+            raise IgnoreRequest(f"{DEADLINE_EXCEEDED} for {request.url}")
+        if self.cap_timeout:
+            timeout = request.meta.get('download_timeout', self.default_timeout)
+            request.meta['download_timeout'] = min(timeout, deadline.remaining())
+        return None
+
+    def process_response(self, request, response, spider):
+        deadline = request.meta.get('deadline')
+        if deadline is not None and deadline.expired and response.status >= 400 \
+                and not request.meta.get('dont_retry'):
+            self._abandon(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        deadline = request.meta.get('deadline')
+        if deadline is not None and deadline.expired and not request.meta.get('dont_retry'):
+            self._abandon(request)
+        return None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        seconds = settings.getfloat('URL_DEADLINE', 0)
+        if seconds <= 0:
+            raise NotConfigured
+        return cls(seconds, default_timeout=settings.getfloat('DOWNLOAD_TIMEOUT', 180), stats=crawler.stats,
+                   cap_timeout=not settings.getbool('LEARNED_TIMEOUTS_ENABLED'))
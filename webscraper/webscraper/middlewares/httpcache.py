@@ -0,0 +1,77 @@
+import logging
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+
+from ..httpcache import DiskCache
+
+
+class DiskCacheMiddleware:
+    """Serve unchanged documents from the shared on-disk cache.
+
+    Fresh entries are returned without touching the network.  Stale entries
+    are revalidated with ``If-None-Match``/``If-Modified-Since`` and a ``304``
+    is answered from disk.  Requests rendered by PlaywrightDownloadHandler
+    are cached inside the browser via ``page.route`` instead.
+    """
+
+    def __init__(self, cache, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.cache = cache
+        self.stats = stats
+
+    def _cached_response(self, entry, request):
+        return HtmlResponse(
+            url=request.url,
+            status=entry.status,
+            headers=entry.headers,
+            body=entry.body,
+            encoding='utf-8',
+            request=request,
+            flags=['cached']
+        )
+
+    def process_request(self, request, spider):
+        if request.method != 'GET' or request.meta.get('playwright') or request.meta.get('diskcache_skip'):
+            return None
+        # Key on the headers as they are now; later middlewares (default
+        # headers, user agent) would otherwise change the key on the way back
+        request.meta['diskcache_headers'] = dict(request.headers)
+        entry = self.cache.lookup(request.url, request.headers)
+        if entry is None:
+            return None
+        if entry.fresh:
+            self.logger.debug(f"Serving {request.url} from the HTTP cache")
+            return self._cached_response(entry, request)
+        for name, value in entry.conditional_headers().items():
+            request.headers[name] = value
+        return None
+
+    def process_response(self, request, response, spider):
+        if 'cached' in response.flags or 'diskcache_headers' not in request.meta:
+            return response
+        cache_headers = request.meta['diskcache_headers']
+        if response.status == 304:
+            entry = self.cache.get(request.url, cache_headers)
+            if entry is not None:
+                self.logger.debug(f"{request.url} not modified, serving from the HTTP cache")
+                self.cache.refresh(entry)
+                return self._cached_response(entry, request)
+        self.cache.store(request.url, cache_headers, response.status, response.headers, response.body)
+        return response
+
+    def spider_closed(self, spider):
+        self.logger.info(self.cache.summary())
+        if self.stats is not None:
+            for name, value in self.cache.stats.items():
+                self.stats.set_value(f'diskcache/{name}', value)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('DISKCACHE_ENABLED'):
+            raise NotConfigured
+        cache = DiskCache(settings.get('DISKCACHE_DIR', '.httpcache'), ttl=settings.getint('DISKCACHE_TTL', 3600))
+        middleware = cls(cache, stats=crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
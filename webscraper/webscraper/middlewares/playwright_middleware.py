@@ -1,96 +1,168 @@
+import asyncio
 import logging
+import math
+import time
+from urllib.parse import urlparse
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from scrapy import signals
 from scrapy.http import HtmlResponse
 from scrapy.downloadermiddlewares.useragent import UserAgentMiddleware
-from playwright.sync_api import sync_playwright
-import time
-import threading
+
+from ..blocking import ResourceBlocker
+from ..browser_manager import get_browser_manager
+from ..coalesce import SingleFlight, request_key
+from ..deadline import Deadline
+from ..httpcache import DiskCache
+from ..metrics import get_metrics, write_render_stats
+from ..pool import PagePool
+from ..recycling import RecyclePolicy, recycle_policy
+from ..timeouts import TimeoutBudget, shared_budget
+from ..readiness import Readiness
+
 
 class PlaywrightMiddleware(UserAgentMiddleware):
-    _instance = None
-    _lock = threading.Lock()
-    
-    def __init__(self):
+    """Render requests in a shared Chromium using a pool of reusable pages.
+
+    The pool is sized from CONCURRENT_REQUESTS and capped per domain by
+    CONCURRENT_REQUESTS_PER_DOMAIN, so the middleware handles as many
+    requests at once as Scrapy schedules.  Chromium is shared with the
+    download handler through the process-wide BrowserManager.
+    """
+
+    def __init__(self, max_pages=8, pages_per_domain=4, max_contexts=2, block_profile='no-media', stats=None,
+                 cache=None, endpoint=None, manager=None, recycle=None, timeouts=None,
+                 coalescer=None, metrics=None):
         self.logger = logging.getLogger(__name__)
-        if not hasattr(self, '_browser_initialized'):
-            with self._lock:
-                if not hasattr(self, '_browser_initialized'):
-                    self._setup_browser()
-                    self._browser_initialized = True
-    
-    def _setup_browser(self):
-        """Initialize browser in a thread-safe way"""
-        if not hasattr(self, 'context'):
-            self.playwright = sync_playwright().start()
-            self.browser = self.playwright.chromium.launch(
-                headless=True,
-                args=['--no-sandbox']
-            )
-            self.context = self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        self.blocker = ResourceBlocker(block_profile)
+        self.cache = cache
+        self.stats = stats
+        self.max_pages = max_pages
+        self.pages_per_domain = pages_per_domain
+        self.max_contexts = max_contexts
+        self.manager = manager or get_browser_manager(endpoint)
+        self.recycle = recycle or RecyclePolicy()
+        # Any page counts once the protection text is gone; spiders parse the rest
+        self.readiness = Readiness(selectors=['body'], count_selector=None)
+        self.timeouts = timeouts or TimeoutBudget()
+        # Identical GETs in flight (or repeated within COALESCE_TTL) share one page load
+        self.coalescer = coalescer or SingleFlight()
+        # Per-phase latency histograms, written to the crawl stats by PhaseMetricsExtension
+        self.metrics = metrics or get_metrics()
+        self.browser = None
+        self.pool = None
+        self._setup_lock = None
+
+    async def _setup_browser(self):
+        """Acquire the shared browser and create the page pool once, on first use"""
+        if self._setup_lock is None:
+            self._setup_lock = asyncio.Lock()
+        async with self._setup_lock:
+            if self.pool is not None:
+                return
+            self.browser = await self.manager.acquire()
+            self.pool = PagePool(
+                self.browser,
+                max_contexts=self.max_contexts,
+                pages_per_context=math.ceil(self.max_pages / self.max_contexts),
+                per_domain=self.pages_per_domain,
+                context_setup=self._setup_context,
+                recycle=self.recycle,
+                context_options={
+                    'viewport': {'width': 1920, 'height': 1080},
+                    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+                }
             )
 
-    def _handle_page(self, url):
-        """Handle page navigation and protection bypass using Playwright"""
-        page = None
+    async def _setup_context(self, context):
+        """Install resource blocking and the HTTP cache on a new context"""
+        await self.blocker.attach_async(context)
+        if self.cache is not None:
+            await self.cache.attach_async(context)
+
+    async def _handle_page(self, url, deadline=None):
+        """Handle page navigation and protection bypass; (content, cookies, status) or None"""
+        deadline = deadline or Deadline(None)
+        await self._setup_browser()
         try:
-            with self._lock:
-                if not hasattr(self, 'context'):
-                    self._setup_browser()
-                    
-                page = self.context.new_page()
+            page_start = time.perf_counter()
+            async with self.pool.page(urlparse(url).hostname) as page:
+                self.metrics.observe('context', time.perf_counter() - page_start)
                 self.logger.debug(f"Navigating to {url} with Playwright")
-                
-                # Set shorter timeout for faster initial validation
-                response = page.goto(url, wait_until='domcontentloaded', timeout=3000)
+
+                # Timeout learned for this site, 3s until enough loads are known
+                navigation_start = time.time()
+                try:
+                    with self.metrics.timer('navigation'):
+                        response = await page.goto(url, wait_until='domcontentloaded', timeout=deadline.timeout_ms(
+                            'navigation', self.timeouts.timeout(url, 'navigation', 3000)))
+                except PlaywrightTimeoutError:
+                    # Unless the deadline cut it short, the learned budget was too tight
+                    if not deadline.expired:
+                        self.timeouts.record_timeout(url, 'navigation', time.time() - navigation_start)
+                    raise
                 if response is None:
                     self.logger.error("Failed to get response from page")
-                    return None, None
-                
+                    return None
+                self.timeouts.record(url, 'navigation', time.time() - navigation_start)
+
                 # Quick check for common protection patterns
-                content = page.content()
-                if any(text in content for text in ["Just a moment", "Please wait", "DDoS protection"]):
+                content = await page.content()
+                if self.readiness.is_protected(content):
                     self.logger.debug("Protection detected, waiting for resolution...")
-                    time.sleep(1)  # Reduced wait time for faster response
-                    content = page.content()  # Get updated content
-                
-                cookies = page.context.cookies()
-                return content, cookies
-                
+                    # Resolves as soon as the interstitial is gone instead of sleeping
+                    timeout = deadline.timeout_ms('readiness', self.timeouts.timeout(url, 'ready', 5000, quantile=0.95))
+                    ready_start = time.time()
+                    with self.metrics.timer('readiness'):
+                        ready = await self.readiness.wait_async(page, url, timeout=timeout)
+                    if ready:
+                        self.timeouts.record(url, 'ready', time.time() - ready_start)
+                    elif not deadline.expired:
+                        self.timeouts.record_timeout(url, 'ready', time.time() - ready_start)
+                    content = await page.content()  # Get updated content
+
+                cookies = await page.context.cookies()
+                return content, cookies, response.status
+
         except Exception as e:
             self.logger.error(f"Playwright navigation failed: {str(e)}")
-            return None, None
-        finally:
-            if page:
-                try:
-                    page.close()
-                except:
-                    pass
+            return None
+
+    def _cacheable(self, rendered):
+        """Only clean 200 pages are reused, so retried 403/503s and challenges load the page again"""
+        return rendered is not None and rendered[2] == 200 and not self.readiness.is_protected(rendered[0])
 
-    def process_request(self, request, spider):
-        # Skip if already processed
-        if request.meta.get('playwright_processed'):
+    async def process_request(self, request, spider):
+        # Skip if already processed or left to PlaywrightDownloadHandler
+        if request.meta.get('playwright_processed') or request.meta.get('playwright'):
             return None
 
         self.logger.info(f"Processing request through Playwright: {request.url}")
         try:
-            content, cookies = self._handle_page(request.url)
-            
-            if content is None:
+            # Set by DeadlineMiddleware; bounds every wait on this page
+            deadline = request.meta.get('deadline') or Deadline(None)
+            if request.method == 'GET':
+                rendered = await self.coalescer.run_async(request_key(request.url),
+                                                          lambda: self._handle_page(request.url, deadline),
+                                                          timeout=deadline.remaining(), cacheable=self._cacheable)
+            else:
+                rendered = await self._handle_page(request.url, deadline)
+
+            if rendered is None:
                 self.logger.error("Failed to get content through Playwright")
                 return None
-            
+            content, cookies, status = rendered
+
             # Mark as processed to avoid loops
             request.meta['playwright_processed'] = True
-            
+
             # Convert cookies to header format if needed
             if cookies:
                 cookie_header = '; '.join([f"{c['name']}={c['value']}" for c in cookies])
                 request.headers['Cookie'] = cookie_header
-            
+
             return HtmlResponse(
                 url=request.url,
+                status=status,
                 body=content.encode('utf-8'),
                 encoding='utf-8',
                 request=request
@@ -102,16 +174,51 @@ class PlaywrightMiddleware(UserAgentMiddleware):
     def spider_opened(self, spider):
         spider.logger.info('Playwright middleware initialized for: %s' % spider.name)
 
-    def spider_closed(self, spider):
-        self.logger.info("Closing Playwright browser")
-        if hasattr(self, 'browser'):
-            self.browser.close()
-        if hasattr(self, 'playwright'):
-            self.playwright.stop()
+    async def _close(self):
+        if self.pool is not None:
+            await self.pool.close()
+        if self.browser is not None:
+            self.browser = None
+            await self.manager.release()
+
+    async def spider_closed(self, spider):
+        self.logger.info("Releasing the shared Playwright browser")
+        self.logger.info(self.blocker.summary())
+        if self.stats is not None:
+            components = {
+                'blocked': {'requests': self.blocker.stats['blocked_requests'],
+                            'bytes_estimate': self.blocker.stats['bytes_saved']},
+                'recycle': self.recycle.stats,
+                'readiness': self.readiness.stats,
+                'coalesce': self.coalescer.stats,
+            }
+            if self.cache is not None:
+                components['diskcache'] = self.cache.stats
+            write_render_stats(self.stats, 'middleware', components)
+        self.logger.info(self.recycle.summary())
+        self.logger.info(self.coalescer.summary())
+        self.timeouts.save()
+        await self._close()
 
     @classmethod
     def from_crawler(cls, crawler):
-        middleware = cls()
+        settings = crawler.settings
+        cache = None
+        if settings.getbool('DISKCACHE_ENABLED'):
+            cache = DiskCache(settings.get('DISKCACHE_DIR', '.httpcache'), ttl=settings.getint('DISKCACHE_TTL', 3600))
+        middleware = cls(
+            max_pages=settings.getint('CONCURRENT_REQUESTS'),
+            pages_per_domain=settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'),
+            max_contexts=settings.getint('PLAYWRIGHT_MAX_CONTEXTS', 2),
+            block_profile=settings.get('PLAYWRIGHT_BLOCK_PROFILE', 'no-media'),
+            stats=crawler.stats,
+            cache=cache,
+            endpoint=settings.get('PLAYWRIGHT_BROWSER_ENDPOINT'),
+            recycle=recycle_policy(settings),
+            coalescer=SingleFlight(ttl=settings.getfloat('COALESCE_TTL', 30)),
+            timeouts=shared_budget(settings.get('LEARNED_TIMEOUTS_FILE'),
+                                   multiplier=settings.getfloat('LEARNED_TIMEOUTS_MULTIPLIER', 1.5))
+        )
         crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
         return middleware
@@ -0,0 +1,77 @@
+import logging
+import time
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+from ..deadline import DeadlineExceeded
+from ..ratelimit import AdaptiveRateLimiter, parse_retry_after, shared_limiter
+
+
+class HostRateLimitMiddleware:
+    """Pace requests per host with a token bucket instead of DOWNLOAD_DELAY.
+
+    A fixed delay spaces every request evenly; the bucket lets
+    HOST_RATE_BURST requests through at once and then holds each host to
+    HOST_RATE_LIMIT requests per second.  With HOST_RATE_ADAPTIVE the rate
+    then follows the host's latency and 403/429/503 responses between
+    HOST_RATE_MIN and HOST_RATE_MAX.  The limiter is shared with
+    PlaywrightDownloadHandler, which paces ``meta={'playwright': True}``
+    requests itself, so those are left to it.  The wait never runs past
+    the request's deadline: a request that would wait longer than the time
+    left is dropped with IgnoreRequest.  Place it after RetryMiddleware so it
+    sees throttled responses before they are retried; cache hits from
+    DiskCacheMiddleware never reach it.
+    """
+
+    def __init__(self, limiter, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.limiter = limiter
+        self.stats = stats
+
+    async def process_request(self, request, spider):
+        if request.meta.get('playwright'):
+            return None
+        deadline = request.meta.get('deadline')
+        try:
+            await self.limiter.wait_async(request.url, deadline)
+        except DeadlineExceeded as e:
+            request.meta['dont_retry'] = True
+            self.logger.warning(f"Abandoned {request.url}: {str(e)}")
+            if self.stats is not None:
+                self.stats.inc_value('deadline/exceeded')
+            raise IgnoreRequest(str(e))
+        if deadline is not None and 'download_timeout' in request.meta:
+            # The wait came out of the deadline; the download gets what is left
+            request.meta['download_timeout'] = min(request.meta['download_timeout'], deadline.remaining())
+        request.meta['ratelimit_start'] = time.monotonic()
+        return None
+
+    def process_response(self, request, response, spider):
+        start = request.meta.pop('ratelimit_start', None)
+        if start is not None and isinstance(self.limiter, AdaptiveRateLimiter):
+            self.limiter.record(request.url, response.status, latency=time.monotonic() - start,
+                                retry_after=parse_retry_after(response.headers.get('Retry-After')))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        start = request.meta.pop('ratelimit_start', None)
+        if start is not None and isinstance(self.limiter, AdaptiveRateLimiter):
+            self.limiter.record(request.url, latency=time.monotonic() - start, error=True)
+        return None
+
+    def spider_closed(self, spider):
+        if isinstance(self.limiter, AdaptiveRateLimiter):
+            self.logger.info(self.limiter.summary())
+            if self.stats is not None:
+                for name, value in self.limiter.stats.items():
+                    self.stats.set_value(f'ratelimit/{name}', value)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        limiter = shared_limiter(settings)
+        if limiter is None:
+            raise NotConfigured
+        middleware = cls(limiter, stats=crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
@@ -0,0 +1,65 @@
+import logging
+from scrapy import signals
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from scrapy.exceptions import IgnoreRequest
+
+from ..retries import shared_retry_policy
+
+
+class BudgetedRetryMiddleware(RetryMiddleware):
+    """RetryMiddleware whose retries come out of the crawl-wide RetryPolicy.
+
+    Every response and download error is reported to the policy.  A retry
+    is only scheduled while the budget (RETRY_BUDGET_RATIO of all requests,
+    at least RETRY_BUDGET_MIN) lasts and the host's circuit breaker is
+    closed; RETRY_TIMES still caps the retries of a single request.
+    Requests to a host whose circuit is open (CIRCUIT_BREAKER_FAILURES
+    failures in a row) are dropped for CIRCUIT_BREAKER_RESET seconds.  The
+    budget is shared with PlaywrightDownloadHandler's reloads.  Replaces
+    ``scrapy.downloadermiddlewares.retry.RetryMiddleware``.
+    """
+
+    def __init__(self, settings, policy=None, stats=None):
+        super().__init__(settings)
+        self.logger = logging.getLogger(__name__)
+        self.policy = policy or shared_retry_policy(settings)
+        self.stats = stats
+
+    def process_request(self, request, spider):
+        # PlaywrightDownloadHandler checks the circuit itself before rendering
+        if not request.meta.get('playwright') and not self.policy.allow_request(request.url):
+            raise IgnoreRequest(f"Circuit open for the host of {request.url}")
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get('playwright'):
+            self.policy.record(request.url, response.status not in self.retry_http_codes)
+        return super().process_response(request, response, spider)
+
+    def process_exception(self, request, exception, spider):
+        if not request.meta.get('playwright') and not isinstance(exception, IgnoreRequest):
+            self.policy.record(request.url, False)
+        return super().process_exception(request, exception, spider)
+
+    def _retry(self, request, reason):
+        max_retry_times = request.meta.get('max_retry_times', self.max_retry_times)
+        if request.meta.get('retry_times', 0) >= max_retry_times:
+            # Out of RETRY_TIMES: let RetryMiddleware give up without spending budget
+            return super()._retry(request, reason)
+        if not self.policy.allow_retry(request.url):
+            self.logger.debug(f"Retry budget exhausted, giving up on {request.url} ({reason})")
+            return None
+        return super()._retry(request, reason)
+
+    def spider_closed(self, spider):
+        self.logger.info(self.policy.summary())
+        if self.stats is not None:
+            for name, value in self.policy.stats.items():
+                self.stats.set_value(f'retry_budget/{name}', value)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler.settings, stats=crawler.stats)
+        middleware.crawler = crawler
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
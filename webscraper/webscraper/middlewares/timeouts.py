@@ -0,0 +1,53 @@
+import logging
+import time
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ..timeouts import shared_budget
+
+
+class LearnedTimeoutMiddleware:
+    """Give each request a download timeout learned from its host and page template.
+
+    Sets ``download_timeout`` in the request meta from the p99 of earlier
+    downloads times LEARNED_TIMEOUTS_MULTIPLIER, falling back to
+    DOWNLOAD_TIMEOUT until enough downloads are known, and capped by the
+    time left on the request's deadline (see DeadlineMiddleware).  The
+    histograms are saved to LEARNED_TIMEOUTS_FILE when the spider closes.
+    """
+
+    def __init__(self, budget, default_timeout=90):
+        self.logger = logging.getLogger(__name__)
+        self.budget = budget
+        self.default_timeout = default_timeout
+
+    def process_request(self, request, spider):
+        if 'download_timeout' not in request.meta:
+            request.meta['download_timeout'] = self.budget.timeout(
+                request.url, 'download', self.default_timeout * 1000) / 1000
+        deadline = request.meta.get('deadline')
+        if deadline is not None:
+            request.meta['download_timeout'] = min(request.meta['download_timeout'], deadline.remaining())
+        request.meta['timeouts_start'] = time.monotonic()
+        return None
+
+    def process_response(self, request, response, spider):
+        start = request.meta.pop('timeouts_start', None)
+        if start is not None:
+            self.budget.record(request.url, 'download', time.monotonic() - start)
+        return response
+
+    def spider_closed(self, spider):
+        self.logger.info(self.budget.summary())
+        self.budget.save()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('LEARNED_TIMEOUTS_ENABLED'):
+            raise NotConfigured
+        budget = shared_budget(settings.get('LEARNED_TIMEOUTS_FILE'),
+                               multiplier=settings.getfloat('LEARNED_TIMEOUTS_MULTIPLIER', 1.5))
+        middleware = cls(budget, default_timeout=settings.getint('DOWNLOAD_TIMEOUT', 90))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
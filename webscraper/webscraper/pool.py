@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+
+class PagePool:
+    """Bounded pool of reusable pages spread over a few browser contexts.
+
+    All contexts live in the same browser, so one Chromium process can serve
+    ``max_contexts * pages_per_context`` navigations at the same time.  When
+    ``per_domain`` is set, at most that many pages are checked out for any
+    single domain.  The pool lock only guards bookkeeping (idle pages, context
+    load, domain slots); navigation runs outside of it.  ``context_setup`` is
+    awaited with every new context, e.g. to install request routing.
+
+    With a RecyclePolicy, contexts that served their share of pages (or all
+    contexts, when Chromium grows past the RSS limit) are retired: they get
+    no new pages and are closed once their last page is checked in, so no
+    navigation in flight is interrupted.
+    """
+
+    def __init__(self, browser, max_contexts=2, pages_per_context=8, context_options=None, per_domain=None,
+                 context_setup=None, recycle=None):
+        self.logger = logging.getLogger(__name__)
+        self.browser = browser
+        self.max_contexts = max_contexts
+        self.pages_per_context = pages_per_context
+        self.context_options = context_options or {}
+        self.per_domain = per_domain
+        self.context_setup = context_setup
+        self.recycle = recycle
+        self.size = max_contexts * pages_per_context
+        self._slots = asyncio.Semaphore(self.size)
+        self._lock = asyncio.Lock()
+        self._contexts = {}  # context -> number of pages it owns
+        self._served = {}  # context -> pages checked in since it was created
+        self._retiring = set()  # contexts closed as soon as their pages are checked in
+        self._idle = []  # (context, page) pairs ready for reuse
+        self._domain_slots = {}  # domain -> semaphore capping its pages
+        self._closed = False
+
+    async def _checkout(self):
+        """Reuse an idle page or open one in the least loaded context"""
+        async with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            candidates = [c for c, n in self._contexts.items()
+                          if n < self.pages_per_context and c not in self._retiring]
+            if candidates:
+                context = min(candidates, key=self._contexts.get)
+            else:
+                context = await self.browser.new_context(**self.context_options)
+                if self.context_setup is not None:
+                    await self.context_setup(context)
+                self._contexts[context] = 0
+                self._served[context] = 0
+                self.logger.debug(f"Created browser context {len(self._contexts)}/{self.max_contexts}")
+            self._contexts[context] += 1
+        try:
+            return context, await context.new_page()
+        except Exception:
+            async with self._lock:
+                self._contexts[context] -= 1
+            raise
+
+    def _retire(self, contexts):
+        """Stop handing out pages from ``contexts``; the caller holds the lock"""
+        for context in contexts:
+            if context not in self._retiring:
+                self._retiring.add(context)
+                self.recycle.stats['contexts_recycled'] += 1
+        # Idle pages of retired contexts close with their context
+        idle = []
+        for context, page in self._idle:
+            if context in self._retiring:
+                self._contexts[context] -= 1
+            else:
+                idle.append((context, page))
+        self._idle = idle
+
+    def _check_recycle(self, context):
+        """Count a served page and retire contexts the recycle policy has given up on"""
+        if context not in self._served:
+            return
+        self._served[context] += 1
+        if self.recycle is None:
+            return
+        if self.recycle.memory_exceeded():
+            self.logger.info("Retiring every browser context to release memory")
+            self._retire(list(self._contexts))
+        elif self.recycle.context_expired(self._served[context]):
+            self.logger.debug(f"Retiring a browser context after {self._served[context]} pages")
+            self._retire([context])
+
+    async def _close_drained(self):
+        """Close retired contexts that no longer have pages checked out"""
+        async with self._lock:
+            drained = [c for c in self._retiring if self._contexts.get(c, 0) <= 0]
+            for context in drained:
+                self._retiring.discard(context)
+                self._contexts.pop(context, None)
+                self._served.pop(context, None)
+        for context in drained:
+            try:
+                await context.close()
+            except Exception:
+                pass
+
+    async def _checkin(self, context, page, reusable):
+        """Return a page to the idle list, or close it if it cannot be reused"""
+        async with self._lock:
+            self._check_recycle(context)
+        kept = False
+        if reusable and not self._closed and context not in self._retiring:
+            try:
+                await page.goto('about:blank')
+                async with self._lock:
+                    # The context may have been retired while the page was reset
+                    if context not in self._retiring:
+                        self._idle.append((context, page))
+                        kept = True
+            except Exception:
+                pass
+        if not kept:
+            async with self._lock:
+                if context in self._contexts:
+                    self._contexts[context] -= 1
+            try:
+                await page.close()
+            except Exception:
+                pass
+        await self._close_drained()
+
+    def _domain_slot(self, domain):
+        """Semaphore capping concurrent pages for one domain"""
+        slot = self._domain_slots.get(domain)
+        if slot is None:
+            slot = self._domain_slots[domain] = asyncio.Semaphore(self.per_domain)
+        return slot
+
+    @asynccontextmanager
+    async def page(self, domain=None):
+        """Check out a page for the duration of the ``async with`` block"""
+        if self._closed:
+            raise RuntimeError("Page pool is closed")
+        if domain is not None and self.per_domain:
+            async with self._domain_slot(domain):
+                async with self._page() as page:
+                    yield page
+        else:
+            async with self._page() as page:
+                yield page
+
+    @asynccontextmanager
+    async def _page(self):
+        async with self._slots:
+            context, page = await self._checkout()
+            reusable = False
+            try:
+                yield page
+                reusable = not page.is_closed()
+            finally:
+                await self._checkin(context, page, reusable)
+
+    async def close(self):
+        """Close every context owned by the pool"""
+        self._closed = True
+        async with self._lock:
+            contexts = list(self._contexts)
+            self._idle.clear()
+            self._contexts.clear()
+            self._served.clear()
+            self._retiring.clear()
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
@@ -0,0 +1,282 @@
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# Where a sample's time goes: the first category, in this order, with a frame
+# from a matching file anywhere on the stack.  Playwright comes first so its
+# own protocol JSON counts as browser time.
+CATEGORIES = [
+    ('browser (Playwright/Chromium)', ('playwright/', 'greenlet/')),
+    ('parsing (lxml/HTMLParser)', ('extraction.py', 'lxml/', 'html/parser.py', 'bs4/')),
+    ('JSON', ('json/',)),
+    ('CSV', ('csv.py', 'convert_to_csv.py', 'pandas/')),
+    ('HTTP (requests)', ('requests/', 'urllib3/', 'http/', 'socket.py', 'ssl.py')),
+    ('waiting in the event loop', ('asyncio/', 'selectors.py')),
+]
+
+STDLIB = sysconfig.get_paths()['stdlib']
+
+SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+def add_profile_arguments(parser):
+    """Add the --profile options shared by the command-line entry points"""
+    parser.add_argument('--profile', action='store_true',
+                        help='Sample the Python stacks (and trace the browser) of the slowest URLs')
+    parser.add_argument('--profile-dir', type=str, default='profile',
+                        help='Directory for profile.folded, hotspots.txt and traces (default: profile)')
+    parser.add_argument('--profile-top', type=int, default=5,
+                        help='Keep the profiles of this many slowest URLs (default: 5)')
+    parser.add_argument('--profile-threshold', type=float, default=None,
+                        help='Also keep every URL that took longer than this many seconds')
+
+
+def profiler_from_args(args, trace=True):
+    """A started Profiler if ``--profile`` was given, else None"""
+    if not args.profile:
+        return None
+    return Profiler(args.profile_dir, top=args.profile_top, threshold=args.profile_threshold, trace=trace).start()
+
+
+class Profiler:
+    """Sampling profiler that keeps only the slowest sections, such as URLs, of a run.
+
+    A background thread reads ``sys._current_frames()`` every ``interval``
+    seconds and counts the Python stack of every thread inside a
+    ``section()``, so it needs no instrumentation and costs little.  When
+    the run ends, ``save()`` keeps the ``top`` slowest sections plus any
+    slower than ``threshold`` seconds and writes, to ``output_dir``:
+
+    - ``profile.folded``: folded stacks, one root frame per section, for
+      flamegraph.pl, speedscope or inferno
+    - ``hotspots.txt``: where the time went (browser, parsing, JSON, ...)
+      and the functions with the most own and total time
+    - ``traces/``: the Playwright traces of the kept sections, when the
+      scraper recorded one with ``trace_path()`` (open with
+      ``playwright show-trace``)
+    """
+
+    def __init__(self, output_dir='profile', top=5, threshold=None, interval=0.005, trace=True):
+        self.logger = logging.getLogger(__name__)
+        self.output_dir = output_dir
+        self.top = top
+        self.threshold = threshold
+        self.interval = interval
+        self.trace = trace
+        self.samples = defaultdict(Counter)  # section -> folded stack -> samples
+        self.durations = {}  # section -> seconds
+        self._active = {}  # thread id -> section
+        self._names = {}  # code object -> frame name
+        self._paths = {}  # file name -> short path
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def trace_dir(self):
+        return os.path.join(self.output_dir, 'traces')
+
+    def start(self):
+        if self.trace:
+            os.makedirs(self.trace_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        self.save()
+
+    @contextmanager
+    def section(self, label):
+        """Profile the calling thread as ``label`` for the duration of the block"""
+        start_time = time.perf_counter()
+        try:
+            with self.worker(label):
+                yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            with self._lock:
+                self.durations[label] = self.durations.get(label, 0.0) + seconds
+            self._prune()
+
+    @contextmanager
+    def worker(self, label):
+        """Sample the calling thread as part of ``label`` without timing it again.
+
+        For threads doing work on behalf of a section entered on another
+        thread, e.g. a function run with ``asyncio.to_thread`` inside it.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            previous = self._active.get(ident)
+            self._active[ident] = label
+        try:
+            yield
+        finally:
+            with self._lock:
+                if previous is None:
+                    del self._active[ident]
+                else:
+                    self._active[ident] = previous
+
+    def _prune(self):
+        """Drop the samples and trace of sections that can no longer be among the kept ones"""
+        keep = set(self.selected())
+        with self._lock:
+            keep.update(self._active.values())
+            dropped = [label for label in self.samples if label not in keep]
+            for label in dropped:
+                del self.samples[label]
+        for label in dropped:
+            path = self.trace_path(label)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def trace_path(self, label):
+        """Where the Playwright trace of section ``label`` goes; deleted on save unless the section is kept"""
+        slug = SLUG_RE.sub('_', label).strip('_')[-80:]
+        return os.path.join(self.trace_dir, f"{slug}_{zlib.crc32(label.encode('utf-8')):08x}.zip")
+
+    def _short_path(self, filename):
+        """``playwright/_impl/_page.py`` for installed packages, ``json/encoder.py`` for the standard library"""
+        path = self._paths.get(filename)
+        if path is None:
+            if 'site-packages' in filename:
+                path = filename.rsplit('site-packages', 1)[1].lstrip(os.sep)
+            elif filename.startswith(STDLIB):
+                path = os.path.relpath(filename, STDLIB)
+            elif filename.startswith(os.getcwd()):
+                path = os.path.relpath(filename)
+            else:
+                path = os.path.basename(filename)
+            path = self._paths[filename] = path.replace(os.sep, '/')
+        return path
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = f"{code.co_name} ({self._short_path(code.co_filename)}:{code.co_firstlineno})"
+        return name
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, label in active.items():
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                folded = ';'.join(self._frame_name(code) for code in reversed(stack))
+                with self._lock:
+                    self.samples[label][folded] += 1
+
+    def selected(self):
+        """Labels of the sections to keep: the ``top`` slowest and any above ``threshold``, slowest first"""
+        ranked = sorted(self.durations, key=self.durations.get, reverse=True)
+        keep = set(ranked[:self.top])
+        if self.threshold is not None:
+            keep.update(label for label in ranked if self.durations[label] > self.threshold)
+        return [label for label in ranked if label in keep]
+
+    @staticmethod
+    def _category(folded):
+        locations = [frame.rsplit('(', 1)[-1] for frame in folded.split(';')]
+        for category, markers in CATEGORIES:
+            if any(marker in location for location in locations for marker in markers):
+                return category
+        return 'other Python'
+
+    def hotspots(self, labels, limit=15):
+        """Lines of the hot-spot report for the sections ``labels``"""
+        stacks = Counter()
+        for label in labels:
+            stacks.update(self.samples.get(label, {}))
+        total = sum(stacks.values())
+        lines = [f"Profile of {len(labels)} of {len(self.durations)} sections "
+                 f"({total} samples every {self.interval * 1000:.0f}ms)", "", "Sections:"]
+        lines += [f"  {self.durations[label]:8.2f}s  {label}" for label in labels]
+        if not total:
+            lines.append("No samples; the sections were shorter than the sampling interval")
+            return lines
+
+        categories = Counter()
+        own = Counter()
+        inclusive = Counter()
+        for folded, count in stacks.items():
+            categories[self._category(folded)] += count
+            frames = folded.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        lines += ["", "Where the time went:"]
+        lines += [f"  {count / total:6.1%}  {category}" for category, count in categories.most_common()]
+        lines += ["", "Top functions by own time:"]
+        lines += [f"  {count / total:6.1%}  {frame}" for frame, count in own.most_common(limit)]
+        lines += ["", "Top functions by total time:"]
+        lines += [f"  {count / total:6.1%}  {frame}" for frame, count in inclusive.most_common(limit)]
+        return lines
+
+    def save(self):
+        """Write the folded stacks and hot spots of the kept sections and prune the other traces"""
+        labels = self.selected()
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, 'profile.folded'), 'w', encoding='utf-8') as f:
+            for label in labels:
+                root = label.replace(';', ',').replace(' ', '_')
+                for folded, count in self.samples.get(label, {}).items():
+                    f.write(f"{root};{folded} {count}\n")
+        lines = self.hotspots(labels)
+        with open(os.path.join(self.output_dir, 'hotspots.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        kept = {os.path.basename(self.trace_path(label)) for label in labels}
+        traces = 0
+        if os.path.isdir(self.trace_dir):
+            for name in os.listdir(self.trace_dir):
+                if name in kept:
+                    traces += 1
+                else:
+                    os.remove(os.path.join(self.trace_dir, name))
+        self.logger.info(self.summary())
+        self.logger.info(f"Profile of the {len(labels)} slowest sections saved to {self.output_dir} "
+                         f"({traces} browser traces)")
+        return lines
+
+    def summary(self):
+        """One-line description of where the time of the kept sections went"""
+        stacks = Counter()
+        for label in self.selected():
+            stacks.update(self.samples.get(label, {}))
+        total = sum(stacks.values())
+        if not total:
+            return "Profile: no samples"
+        categories = Counter()
+        for folded, count in stacks.items():
+            categories[self._category(folded)] += count
+        return "Profile: " + ", ".join(f"{category} {count / total:.0%}"
+                                       for category, count in categories.most_common())
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from .deadline import DEADLINE_EXCEEDED, DeadlineExceeded
+
+# Responses that mean the host wants us to slow down; Cloudflare blocks with 403
+THROTTLE_STATUSES = {403, 429, 503}
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    ``reserve()`` always takes a token, letting the balance go negative, and
+    returns how long the caller must wait before using it.  Concurrent callers
+    therefore queue up behind each other instead of all waking at once.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take a token and return the seconds to wait before it is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+
+class HostRateLimiter:
+    """One token bucket per host, shared by every request to that host.
+
+    ``rate`` is the sustained requests per second allowed for each host and
+    ``burst`` how many requests may go out back to back after an idle spell.
+    Use ``wait()`` from synchronous code and ``wait_async()`` from coroutines.
+    """
+
+    def __init__(self, rate=0.5, burst=2):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive, got {rate}")
+        self.logger = logging.getLogger(__name__)
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def reserve(self, url):
+        """Reserve a slot for ``url`` and return the seconds to wait for it"""
+        with self._lock:
+            return self._bucket(urlparse(url).hostname or '').reserve()
+
+    def _reserve_within(self, url, deadline):
+        """Reserve a slot, handing it back if ``deadline`` passes before it comes up"""
+        delay = self.reserve(url)
+        if deadline is not None and delay >= deadline.remaining():
+            with self._lock:
+                self._bucket(urlparse(url).hostname or '').tokens += 1
+            raise DeadlineExceeded(f"{DEADLINE_EXCEEDED}, {url} would wait {delay:.1f}s for its host")
+        return delay
+
+    def wait(self, url, deadline=None):
+        """Block until a request to ``url`` is allowed; raises DeadlineExceeded if ``deadline`` passes first"""
+        delay = self._reserve_within(url, deadline)
+        if delay:
+            self.logger.debug(f"Waiting {delay:.2f}s before requesting {url}")
+            time.sleep(delay)
+
+    async def wait_async(self, url, deadline=None):
+        """Sleep on the event loop until a request to ``url`` is allowed; see wait()"""
+        delay = self._reserve_within(url, deadline)
+        if delay:
+            self.logger.debug(f"Waiting {delay:.2f}s before requesting {url}")
+            await asyncio.sleep(delay)
+
+    def record(self, url, status=None, latency=None, retry_after=None, error=False):
+        """The rate is fixed, so responses do not change it"""
+
+    def record_latency(self, url, latency):
+        """The rate is fixed, so latencies do not change it"""
+
+
+class NoRateLimiter:
+    """Stands in for a limiter when pacing is off (HOST_RATE_LIMIT = 0): never waits"""
+
+    def wait(self, url, deadline=None):
+        pass
+
+    async def wait_async(self, url, deadline=None):
+        pass
+
+    def record(self, url, status=None, latency=None, retry_after=None, error=False):
+        pass
+
+    def record_latency(self, url, latency):
+        pass
+
+    def summary(self):
+        return "Rate limit: off"
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header given in seconds, or None"""
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter(HostRateLimiter):
+    """HostRateLimiter whose per-host rate adapts to how the host responds (AIMD).
+
+    Callers report every response with ``record()``.  A healthy response
+    adds ``increase`` requests per second to the host's rate, up to
+    ``max_rate``.  A 403/429/503, a failed request or a latency spike (more than
+    ``latency_factor`` times the host's moving average) multiplies the rate
+    by ``decrease``, down to ``min_rate``, at most once per request interval
+    so a burst of in-flight failures counts as one.  ``Retry-After`` empties
+    the host's bucket for that long.
+    """
+
+    def __init__(self, rate=0.5, burst=2, min_rate=0.05, max_rate=4.0, increase=0.05, decrease=0.5,
+                 latency_factor=3.0):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency = {}  # host -> (moving average, samples)
+        self.last_decrease = {}
+        self.stats = {'increases': 0, 'decreases': 0}
+
+    def record(self, url, status=None, latency=None, retry_after=None, error=False):
+        """Adjust the host's rate after a response (or failure) from ``url``"""
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            bucket = self._bucket(host)
+            average, samples = self.latency.get(host, (None, 0))
+            spike = latency is not None and samples >= 5 and latency > self.latency_factor * average
+            if error or status in THROTTLE_STATUSES or spike:
+                now = time.monotonic()
+                if now - self.last_decrease.get(host, 0) >= 1 / bucket.rate:
+                    bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                    self.last_decrease[host] = now
+                    self.stats['decreases'] += 1
+                    self.logger.info(f"Slowing {host} to {bucket.rate:.2f} req/s "
+                                     f"(status {status}, latency {latency or 0:.2f}s)")
+                if retry_after:
+                    bucket.tokens = min(bucket.tokens, -retry_after * bucket.rate)
+            elif status is None or status < 500:
+                if bucket.rate < self.max_rate:
+                    bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+                    self.stats['increases'] += 1
+            if latency is not None and not spike:
+                self._add_latency(host, latency)
+
+    def record_latency(self, url, latency):
+        """Add a response time from ``url`` to the host's average without adjusting its rate"""
+        with self._lock:
+            self._add_latency(urlparse(url).hostname or '', latency)
+
+    def _add_latency(self, host, latency):
+        average, samples = self.latency.get(host, (None, 0))
+        average = latency if average is None else 0.8 * average + 0.2 * latency
+        self.latency[host] = (average, samples + 1)
+
+    def current_rate(self, url):
+        """Requests per second currently allowed for the host of ``url``"""
+        with self._lock:
+            return self._bucket(urlparse(url).hostname or '').rate
+
+    def summary(self):
+        """One-line description of the rate reached for each host"""
+        rates = ', '.join(f"{host} {bucket.rate:.2f} req/s" for host, bucket in self.buckets.items())
+        return (f"Adaptive rate: {rates or 'no requests'} "
+                f"({self.stats['increases']} increases, {self.stats['decreases']} decreases)")
+
+
+def rate_limiter(settings):
+    """Limiter configured from the HOST_RATE_* Scrapy settings, or None if HOST_RATE_LIMIT is 0"""
+    rate = settings.getfloat('HOST_RATE_LIMIT', 0)
+    if rate <= 0:
+        return None
+    burst = settings.getint('HOST_RATE_BURST', 2)
+    if not settings.getbool('HOST_RATE_ADAPTIVE', True):
+        return HostRateLimiter(rate, burst=burst)
+    return AdaptiveRateLimiter(rate, burst=burst, min_rate=settings.getfloat('HOST_RATE_MIN', 0.05),
+                               max_rate=settings.getfloat('HOST_RATE_MAX', 4.0))
+
+
+_limiters = {}
+
+
+def shared_limiter(settings):
+    """One limiter per Scrapy settings object, shared by the rate-limit middleware and the download handler"""
+    key = id(settings)
+    if key not in _limiters:
+        _limiters[key] = rate_limiter(settings)
+    return _limiters[key]
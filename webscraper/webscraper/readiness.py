@@ -0,0 +1,102 @@
+import logging
+import statistics
+import time
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+# Text shown by protection interstitials before the real page loads
+PROTECTION_MARKERS = ["Just a moment", "Please wait", "DDoS protection"]
+
+# Markup that means a listing page (or at least its layout) has rendered
+CONTENT_SELECTORS = ['.list-item-container', '.search-results-list', '.container', 'main', '#content', '.content',
+                     'article']
+
+# Evaluated in the page on every poll.  Ready means: no protection text, any
+# content selector present and the number of facilities unchanged for
+# ``stableMs``.  Interstitials are small, so the text check is skipped on
+# pages with many elements instead of serialising a large body every poll.
+READY_PREDICATE = """
+({selectors, markers, countSelector, stableMs}) => {
+    const body = document.body;
+    if (!body) return false;
+    let text = document.title;
+    if (document.getElementsByTagName('*').length < 300) text += ' ' + body.innerText;
+    if (markers.some(marker => text.includes(marker))) return false;
+    if (!selectors.some(selector => document.querySelector(selector))) return false;
+    const count = countSelector ? document.querySelectorAll(countSelector).length : 0;
+    const now = performance.now();
+    const last = window.__scraperReadiness;
+    if (!last || last.count !== count) {
+        window.__scraperReadiness = {count: count, since: now};
+        return stableMs <= 0;
+    }
+    return now - last.since >= stableMs;
+}
+"""
+
+
+class Readiness:
+    """Wait for a page to become usable with a single in-page predicate.
+
+    One ``wait_for_function`` replaces chains of ``wait_for_selector`` and
+    ``networkidle`` waits: it resolves as soon as the protection text is gone,
+    any of ``selectors`` is present and the ``count_selector`` count has been
+    stable for ``stable_ms``.  The time each page took is recorded in
+    ``timings``.
+    """
+
+    def __init__(self, selectors=CONTENT_SELECTORS, count_selector='.list-item-container', stable_ms=300,
+                 markers=PROTECTION_MARKERS, poll_ms=100):
+        self.logger = logging.getLogger(__name__)
+        self.arg = {
+            'selectors': list(selectors),
+            'markers': list(markers),
+            'countSelector': count_selector,
+            'stableMs': stable_ms,
+        }
+        self.markers = list(markers)
+        self.poll_ms = poll_ms
+        self.timings = {}  # url -> seconds until ready
+        self.stats = {'ready': 0, 'timeouts': 0}
+
+    def is_protected(self, content):
+        """True if the HTML still shows a protection interstitial"""
+        return any(text in content for text in self.markers)
+
+    def _record(self, url, start_time, ready):
+        elapsed = time.perf_counter() - start_time
+        if ready:
+            self.stats['ready'] += 1
+            self.timings[url] = elapsed
+            self.logger.debug(f"{url} ready after {elapsed:.2f}s")
+        else:
+            self.stats['timeouts'] += 1
+            self.logger.debug(f"{url} not ready after {elapsed:.2f}s")
+        return ready
+
+    def wait(self, page, url, timeout=10000):
+        """Wait until ``page`` is ready (sync API); False if ``timeout`` ms pass first"""
+        start_time = time.perf_counter()
+        try:
+            page.wait_for_function(READY_PREDICATE, arg=self.arg, polling=self.poll_ms, timeout=timeout)
+            ready = True
+        except PlaywrightTimeoutError:
+            ready = False
+        return self._record(url, start_time, ready)
+
+    async def wait_async(self, page, url, timeout=10000):
+        """Wait until ``page`` is ready (async API); False if ``timeout`` ms pass first"""
+        start_time = time.perf_counter()
+        try:
+            await page.wait_for_function(READY_PREDICATE, arg=self.arg, polling=self.poll_ms, timeout=timeout)
+            ready = True
+        except PlaywrightTimeoutError:
+            ready = False
+        return self._record(url, start_time, ready)
+
+    def summary(self):
+        """One-line description of time-to-ready"""
+        if not self.timings:
+            return f"Readiness: {self.stats['timeouts']} pages never became ready"
+        timings = sorted(self.timings.values())
+        return (f"Readiness: {self.stats['ready']} pages ready in {statistics.median(timings):.2f}s median, "
+                f"{timings[-1]:.2f}s max; {self.stats['timeouts']} timed out")
@@ -0,0 +1,72 @@
+import logging
+import psutil
+
+# Process names of the Chromium builds Playwright launches
+CHROMIUM_NAMES = ('chrome', 'chromium', 'headless_shell')
+
+
+def chromium_rss_mb():
+    """Resident memory of the Chromium processes started by this process, in MB.
+
+    A browser reached through the browser server is not our child and is
+    not counted.
+    """
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            if any(name in child.name().lower() for name in CHROMIUM_NAMES):
+                total += child.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+class RecyclePolicy:
+    """When long runs should replace browser contexts and browsers.
+
+    A context is retired after serving ``max_pages_per_context`` pages.
+    Every ``check_every`` pages the Chromium RSS is sampled; above
+    ``max_rss_mb`` the browser (or, for shared browsers, every context) is
+    recycled.  Either limit is disabled with None.  ``stats`` records the
+    recycle events and the RSS seen.
+    """
+
+    def __init__(self, max_pages_per_context=200, max_rss_mb=None, check_every=25):
+        self.logger = logging.getLogger(__name__)
+        self.max_pages_per_context = max_pages_per_context
+        self.max_rss_mb = max_rss_mb
+        self.check_every = check_every
+        self.stats = {'contexts_recycled': 0, 'browser_restarts': 0, 'rss_mb': 0.0, 'peak_rss_mb': 0.0}
+        self._pages_since_check = 0
+
+    def context_expired(self, pages_served):
+        """True once a context has served its share of pages"""
+        return bool(self.max_pages_per_context) and pages_served >= self.max_pages_per_context
+
+    def memory_exceeded(self):
+        """Count a finished page; every ``check_every`` pages, sample RSS against ``max_rss_mb``"""
+        self._pages_since_check += 1
+        if self._pages_since_check < self.check_every:
+            return False
+        self._pages_since_check = 0
+        rss = chromium_rss_mb()
+        self.stats['rss_mb'] = round(rss, 1)
+        self.stats['peak_rss_mb'] = max(self.stats['peak_rss_mb'], self.stats['rss_mb'])
+        if self.max_rss_mb and rss > self.max_rss_mb:
+            self.logger.info(f"Chromium RSS {rss:.0f} MB exceeds {self.max_rss_mb} MB")
+            return True
+        return False
+
+    def summary(self):
+        """One-line description of the recycle events"""
+        return (f"Recycled {self.stats['contexts_recycled']} contexts and restarted the browser "
+                f"{self.stats['browser_restarts']} times (peak Chromium RSS {self.stats['peak_rss_mb']:.0f} MB)")
+
+
+def recycle_policy(settings):
+    """RecyclePolicy configured from the PLAYWRIGHT_RECYCLE_* Scrapy settings"""
+    return RecyclePolicy(
+        max_pages_per_context=settings.getint('PLAYWRIGHT_RECYCLE_PAGES', 200) or None,
+        max_rss_mb=settings.getint('PLAYWRIGHT_RECYCLE_RSS_MB', 0) or None,
+        check_every=settings.getint('PLAYWRIGHT_RECYCLE_CHECK_EVERY', 25)
+    )
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class CircuitOpen(Exception):
+    """Raised instead of fetching from a host whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops requests to one host after ``failure_threshold`` failures in a row.
+
+    While open, requests are refused for ``reset_timeout`` seconds.  Then one
+    trial request is let through (half-open): success closes the circuit,
+    failure opens it again for twice as long, up to ``max_reset_timeout``.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60, max_reset_timeout=600):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.open_for = reset_timeout
+        self.trial_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.open_for:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        """True if a request may go out now"""
+        state = self.state
+        if state == 'closed':
+            return True
+        # One trial at a time; a trial that never reported back is replaced
+        now = time.monotonic()
+        if state == 'half-open' and (self.trial_at is None or now - self.trial_at >= self.reset_timeout):
+            self.trial_at = now
+            return True
+        return False
+
+    def record(self, ok):
+        """Update the circuit; returns True if this failure opened it"""
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            self.open_for = self.reset_timeout
+            self.trial_at = None
+            return False
+        self.failures += 1
+        if self.trial_at is not None:
+            # The trial request failed: stay away for longer
+            self.trial_at = None
+            self.open_for = min(self.max_reset_timeout, self.open_for * 2)
+            self.opened_at = time.monotonic()
+            return True
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+class RetryPolicy:
+    """One retry budget and a circuit breaker per host, shared by every fetch path.
+
+    Every request or page load reports its outcome with ``record()``.  Each
+    one adds ``ratio`` to the budget and each retry allowed by
+    ``allow_retry()`` spends one, so retries stay near ``ratio`` of all
+    requests however many layers retry.  ``min_retries`` lets small crawls
+    retry before the budget has built up, and the budget never holds more
+    than ``ratio`` of ``window`` requests on top of that, so a long healthy
+    spell cannot pay for a later retry storm.  Hosts failing
+    ``failure_threshold`` times in a row are refused by ``allow_request()``
+    until their circuit breaker lets a trial request through.
+    """
+
+    def __init__(self, ratio=0.1, min_retries=10, failure_threshold=5, reset_timeout=60, window=1000):
+        self.logger = logging.getLogger(__name__)
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.balance = float(min_retries)
+        self.max_balance = min_retries + ratio * window
+        self.breakers = {}
+        self.stats = {'requests': 0, 'failures': 0, 'retries': 0, 'retries_denied': 0, 'circuits_opened': 0,
+                      'short_circuited': 0}
+        self._lock = threading.Lock()
+
+    def _breaker(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def allow_request(self, url):
+        """False if ``url``'s host circuit is open and the request should not be sent"""
+        with self._lock:
+            if self._breaker(urlparse(url).hostname or '').allow():
+                return True
+            self.stats['short_circuited'] += 1
+            return False
+
+    def allow_retry(self, url):
+        """Spend one retry from the budget if there is one and the host circuit allows it"""
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            if self.balance < 1 or not self._breaker(host).allow():
+                self.stats['retries_denied'] += 1
+                self.logger.debug(f"Retry budget denied another attempt at {url}")
+                return False
+            self.balance -= 1
+            self.stats['retries'] += 1
+            return True
+
+    def record(self, url, ok):
+        """Report the outcome of one request or page load from ``url``"""
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            self.stats['requests'] += 1
+            self.balance = min(self.balance + self.ratio, self.max_balance)
+            if not ok:
+                self.stats['failures'] += 1
+            if self._breaker(host).record(ok):
+                self.stats['circuits_opened'] += 1
+                self.logger.warning(f"Circuit opened for {host} after {self._breaker(host).failures} failures")
+
+    def summary(self):
+        """One-line description of retries and open circuits"""
+        open_hosts = [host for host, breaker in self.breakers.items() if breaker.state != 'closed']
+        return (f"Retries: {self.stats['retries']} of {self.stats['requests']} requests "
+                f"({self.stats['retries_denied']} denied by the budget), {self.stats['circuits_opened']} circuits "
+                f"opened, {self.stats['short_circuited']} requests refused; open now: {', '.join(open_hosts) or 'none'}")
+
+
+def retry_policy(settings):
+    """RetryPolicy configured from the RETRY_BUDGET_* and CIRCUIT_BREAKER_* Scrapy settings"""
+    return RetryPolicy(
+        ratio=settings.getfloat('RETRY_BUDGET_RATIO', 0.1),
+        min_retries=settings.getint('RETRY_BUDGET_MIN', 10),
+        failure_threshold=settings.getint('CIRCUIT_BREAKER_FAILURES', 5),
+        reset_timeout=settings.getfloat('CIRCUIT_BREAKER_RESET', 60)
+    )
+
+
+_policies = {}
+
+
+def shared_retry_policy(settings):
+    """One RetryPolicy per Scrapy settings object, shared by the retry middleware and the download handler"""
+    key = id(settings)
+    if key not in _policies:
+        _policies[key] = retry_policy(settings)
+    return _policies[key]
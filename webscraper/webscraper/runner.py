@@ -0,0 +1,276 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import zlib
+from collections import deque
+from urllib.parse import urlparse
+
+from .frontier import CrawlFrontier
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(url, shards, by='host'):
+    """Stable shard index of ``url``: all of a host's URLs together, or spread by URL hash"""
+    key = (urlparse(url).hostname or '') if by == 'host' else url
+    return zlib.crc32(key.encode('utf-8')) % shards
+
+
+def _worker(worker_id, tasks, results, options):
+    """Scrape URLs from ``tasks`` until None arrives, reporting each result on ``results``"""
+    # Imported here so the parent never loads Playwright
+    from .fetcher import TieredFetcher
+    from .ratelimit import AdaptiveRateLimiter
+    from .scraper import WebScraper
+
+    logging.basicConfig(level=options['log_level'],
+                        format=f'%(asctime)s - worker {worker_id} - %(name)s - %(levelname)s - %(message)s')
+    # Every worker may end up with any host, so each gets its share of the per-host rate
+    limiter = AdaptiveRateLimiter(options['rate'] / options['workers'],
+                                  max_rate=options['max_rate'] / options['workers'])
+    if options['browser_only']:
+        scraper = WebScraper(block_profile=options['block_profile'], limiter=limiter, deadline=options['deadline'])
+    else:
+        scraper = TieredFetcher(block_profile=options['block_profile'], limiter=limiter,
+                                deadline=options['deadline'])
+    results.put(('ready', worker_id, None, None, 0.0))
+    try:
+        while True:
+            url = tasks.get()
+            if url is None:
+                break
+            start_time = time.time()
+            try:
+                result = scraper.scrape_url(url)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Scraping {url} failed: {str(e)}")
+                result = None
+            results.put(('result', worker_id, url, result, time.time() - start_time))
+    finally:
+        scraper.close()
+
+
+class ShardedRunner:
+    """Crawl a URL list with ``workers`` processes, each with its own browser.
+
+    URLs are sharded by host (or by URL hash) so each host's pacing and
+    connections stay in one process.  Workers pull their next URL from the
+    parent: their own shard first, then work stolen from the largest
+    remaining shard, so a slow shard is drained by idle workers.  A failed
+    URL is handed to a different worker, up to ``max_attempts`` times, and
+    the URLs of a worker that dies are given to the others.  ``run()``
+    returns the merged results and fills ``report`` with the run summary.
+    """
+
+    def __init__(self, workers=None, shard_by='host', max_attempts=2, frontier=None, block_profile='no-media',
+                 browser_only=False, deadline=30, rate=0.5, max_rate=4.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_by = shard_by
+        self.max_attempts = max_attempts
+        self.frontier = frontier
+        self.options = {
+            'workers': self.workers,
+            'block_profile': block_profile,
+            'browser_only': browser_only,
+            'deadline': deadline,
+            'rate': rate,
+            'max_rate': max_rate,
+            'log_level': logging.getLogger().getEffectiveLevel(),
+        }
+        self.report = {}
+
+    def _next_url(self, worker_id, shards, retries):
+        """Pick the next URL for ``worker_id``: a retry it has not failed, its own shard, else steal"""
+        for url, failed_on in list(retries):
+            if worker_id not in failed_on:
+                retries.remove((url, failed_on))
+                return url, False
+        if shards[worker_id]:
+            return shards[worker_id].popleft(), False
+        victim = max(range(len(shards)), key=lambda i: len(shards[i]))
+        if shards[victim]:
+            # Take from the far end, away from what the owner works on next
+            return shards[victim].pop(), True
+        if retries:
+            # Only workers that already failed these are left
+            url, _ = retries.popleft()
+            return url, False
+        return None, False
+
+    def run(self, urls):
+        """Scrape ``urls`` and return a list with one result per URL that succeeded"""
+        start_time = time.time()
+        urls = list(dict.fromkeys(urls))
+        shards = [deque() for _ in range(self.workers)]
+        for url in urls:
+            shards[shard_for(url, self.workers, self.shard_by)].append(url)
+        retries = deque()  # (url, worker ids it failed on)
+        failed_on = {}
+        attempts = {}
+        in_flight = {}  # worker id -> url
+        idle = []
+        merged = []
+        per_worker = {i: {'urls': 0, 'failed': 0, 'stolen': 0, 'seconds': 0.0} for i in range(self.workers)}
+        failed = []
+
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        tasks = [ctx.Queue() for _ in range(self.workers)]
+        processes = [ctx.Process(target=_worker, args=(i, tasks[i], results, self.options), daemon=True)
+                     for i in range(self.workers)]
+        for process in processes:
+            process.start()
+        alive = set(range(self.workers))
+
+        def dispatch(worker_id):
+            url, stolen = self._next_url(worker_id, shards, retries)
+            if url is None:
+                idle.append(worker_id)
+                return
+            in_flight[worker_id] = url
+            attempts[url] = attempts.get(url, 0) + 1
+            per_worker[worker_id]['stolen'] += stolen
+            tasks[worker_id].put(url)
+
+        def give_up_or_retry(worker_id, url):
+            failed_on.setdefault(url, set()).add(worker_id)
+            if attempts[url] < self.max_attempts:
+                retries.append((url, failed_on[url]))
+            else:
+                failed.append(url)
+                if self.frontier is not None:
+                    self.frontier.finish(url, False)
+
+        def reap():
+            for worker_id in list(alive):
+                if not processes[worker_id].is_alive():
+                    logger.error(f"Worker {worker_id} exited with code {processes[worker_id].exitcode}")
+                    alive.discard(worker_id)
+                    if worker_id in idle:
+                        idle.remove(worker_id)
+                    if worker_id in in_flight:
+                        give_up_or_retry(worker_id, in_flight.pop(worker_id))
+
+        try:
+            while alive and (in_flight or any(shards) or retries or len(idle) < len(alive)):
+                try:
+                    message = results.get(timeout=1)
+                except queue.Empty:
+                    message = None
+                reap()
+                if message is not None and message[1] in alive:
+                    kind, worker_id, url, result, seconds = message
+                    if kind == 'result':
+                        del in_flight[worker_id]
+                        stats = per_worker[worker_id]
+                        stats['urls'] += 1
+                        stats['seconds'] += seconds
+                        if result:
+                            merged.append(result)
+                            if self.frontier is not None:
+                                self.frontier.finish(url, True)
+                        else:
+                            stats['failed'] += 1
+                            give_up_or_retry(worker_id, url)
+                    dispatch(worker_id)
+                # A failed URL may have given idle workers something to do
+                while idle and (retries or any(shards)):
+                    dispatch(idle.pop())
+        finally:
+            for worker_id in alive:
+                tasks[worker_id].put(None)
+            for process in processes:
+                process.join(timeout=60)
+                if process.is_alive():
+                    process.terminate()
+
+        elapsed = time.time() - start_time
+        self.report = {
+            'urls': len(urls),
+            'succeeded': len(merged),
+            'failed': failed,
+            'seconds': round(elapsed, 1),
+            'urls_per_second': round(len(urls) / elapsed, 2) if elapsed else 0.0,
+            'workers': {str(i): dict(stats, seconds=round(stats['seconds'], 1)) for i, stats in per_worker.items()},
+        }
+        return merged
+
+    def summary(self):
+        """One-line description of the run"""
+        stolen = sum(stats['stolen'] for stats in self.report['workers'].values())
+        return (f"Crawled {self.report['succeeded']}/{self.report['urls']} URLs with {self.workers} workers "
+                f"in {self.report['seconds']}s ({self.report['urls_per_second']} URLs/s), "
+                f"{stolen} stolen from slower shards, {len(self.report['failed'])} failed")
+
+
+def save_merged(results, summary, output_json):
+    """Write all results, their facilities and the run summary to one JSON file, atomically"""
+    merged = {
+        'summary': summary,
+        'results': results,
+        'facilities': [facility for result in results for facility in result.get('facilities', [])],
+    }
+    directory = os.path.dirname(os.path.abspath(output_json))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, indent=2)
+    os.replace(tmp_path, output_json)
+
+
+if __name__ == '__main__':
+    import argparse
+    from convert_to_csv import convert_json_to_csv
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Crawl a URL list with one browser per worker process')
+    parser.add_argument('--url', type=str, nargs='*', default=[], help='URLs to scrape (space separated)')
+    parser.add_argument('--url-file', type=str, help='File with one URL per line')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Worker processes, each with its own browser (default: CPU count)')
+    parser.add_argument('--shard-by', choices=['host', 'url'], default='host',
+                        help='Keep each host on one worker, or spread URLs by hash (default: host)')
+    parser.add_argument('--max-attempts', type=int, default=2,
+                        help='Workers that may try a URL before it counts as failed (default: 2)')
+    parser.add_argument('--browser-only', action='store_true',
+                        help='Always render in Chromium instead of trying plain HTTP first')
+    parser.add_argument('--deadline', type=float, default=30,
+                        help='Seconds each URL may take in total, including retries (default: 30)')
+    parser.add_argument('--rate', type=float, default=0.5,
+                        help='Initial requests per second to each host, across all workers (default: 0.5)')
+    parser.add_argument('--frontier', type=str, default='crawl_frontier.sqlite3',
+                        help='SQLite file tracking the status of every URL (default: crawl_frontier.sqlite3)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the URLs an earlier run left pending and retry failed ones')
+    parser.add_argument('--output', type=str, default='crawl_results',
+                        help='Base name of the merged JSON and CSV output (default: crawl_results)')
+    args = parser.parse_args()
+
+    urls = list(args.url)
+    if args.url_file:
+        with open(args.url_file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip())
+    frontier = CrawlFrontier(args.frontier)
+    if args.resume:
+        frontier.retry_failed(args.max_attempts)
+        frontier.add(urls, requeue=False)
+    else:
+        frontier.clear()
+        frontier.add(urls)
+    urls = frontier.pending()
+    if not urls:
+        parser.error('no URLs to crawl; pass --url, --url-file or --resume')
+
+    runner = ShardedRunner(workers=args.workers, shard_by=args.shard_by, max_attempts=args.max_attempts,
+                           frontier=frontier, browser_only=args.browser_only, deadline=args.deadline or None,
+                           rate=args.rate)
+    results = runner.run(urls)
+    save_merged(results, runner.report, f"{args.output}.json")
+    logger.info(runner.summary())
+    logger.info(frontier.summary())
+    frontier.close()
+
+    convert_json_to_csv(f"{args.output}.json", f"{args.output}.csv")
+    logger.info(f"Merged results saved to {args.output}.json and {args.output}.csv")
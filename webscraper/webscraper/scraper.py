@@ -1,9 +1,44 @@
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_playwright
 import logging
 import time
 
-class WebScraper:
-    def __init__(self):
+from .blocking import ResourceBlocker
+from .browser_server import BROWSER_ARGS, connect_browser
+from .coalesce import request_key
+from .components import FetchComponents
+from .deadline import DEADLINE_EXCEEDED, Deadline, DeadlineExceeded
+from .extraction import extract_transloading
+from .readiness import Readiness
+
+# Browser context options with modern Chrome properties
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'bypass_csp': True,
+    'ignore_https_errors': True,
+    'locale': 'en-US',
+    'timezone_id': 'America/New_York',
+    'permissions': ['geolocation'],
+    'extra_http_headers': {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+        'Sec-Fetch-Site': 'none',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-User': '?1',
+        'Sec-Fetch-Dest': 'document',
+        'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"'
+    }
+}
+
+class WebScraper(FetchComponents):
+    def __init__(self, block_profile='no-media', cache=None, state=None, limiter=None, endpoint=None, recycle=None,
+                 timeouts=None, deadline=30, retries=None, coalescer=None, metrics=None, profiler=None,
+                 waterfall=None):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         # Add console handler if not already present
@@ -11,224 +46,203 @@ class WebScraper:
             handler = logging.StreamHandler()
             handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
             self.logger.addHandler(handler)
+        self._init_components(cache=cache, limiter=limiter, recycle=recycle, timeouts=timeouts, deadline=deadline,
+                              retries=retries, coalescer=coalescer, metrics=metrics, waterfall=waterfall)
+        self.blocker = ResourceBlocker(block_profile)
+        self.readiness = Readiness()
+        self.state = state
+        # Browser server to connect to instead of launching Chromium
+        self.endpoint = endpoint
+        # With --profile, each page load is traced so the slowest can be kept
+        self.profiler = profiler
         self._setup_browser()
 
     def _setup_browser(self):
         """Initialize browser with optimized settings"""
         self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-gpu',
-                '--disable-dev-shm-usage',
-                '--disable-setuid-sandbox',
-                '--no-first-run',
-                '--no-zygote',
-                '--deterministic-fetch',
-                '--disable-features=IsolateOrigins',
-                '--disable-site-isolation-trials',
-                '--disable-web-security',
-                '--disable-features=IsolateOrigins,site-per-process',
-                '--enable-features=NetworkService,NetworkServiceInProcess',
-                '--force-color-profile=srgb',
-                '--disable-accelerated-2d-canvas',
-                '--disable-background-networking',
-                '--metrics-recording-only',
-                '--disable-default-apps',
-                '--mute-audio'
-            ]
-        )
-        
-        # Enhanced browser context with modern Chrome properties
-        self.context = self.browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            bypass_csp=True,
-            ignore_https_errors=True,
-            locale='en-US',
-            timezone_id='America/New_York',
-            permissions=['geolocation'],
-            extra_http_headers={
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-User': '?1',
-                'Sec-Fetch-Dest': 'document',
-                'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"Windows"'
-            }
-        )
+        self._launch_browser()
+
+    def _launch_browser(self):
+        """Launch (or connect to) Chromium and open a context"""
+        self.browser = connect_browser(self.playwright.chromium, self.endpoint, headless=True, args=BROWSER_ARGS)
+        self._new_context()
+
+    def _new_context(self):
+        """Enhanced browser context with modern Chrome properties"""
+        self.context = self.browser.new_context(**CONTEXT_OPTIONS)
+        self.blocker.attach(self.context)
+        if self.cache is not None:
+            self.cache.attach(self.context)
+        if self.profiler is not None and self.profiler.trace:
+            self.context.tracing.start(screenshots=True, snapshots=True)
+        self.pages_in_context = 0
+
+    def _recycle(self):
+        """Replace the context or the whole browser once the recycle policy says so"""
+        self.pages_in_context += 1
+        if self.recycle.memory_exceeded():
+            self.logger.info("Restarting the browser to release memory")
+            self.browser.close()
+            self._launch_browser()
+            self.recycle.stats['browser_restarts'] += 1
+        elif self.recycle.context_expired(self.pages_in_context):
+            self.logger.debug(f"Replacing the browser context after {self.pages_in_context} pages")
+            self.context.close()
+            self._new_context()
+            self.recycle.stats['contexts_recycled'] += 1
+
+    def _wait_ready(self, page, url, deadline):
+        """Wait for readiness within the learned budget and learn from how long it took"""
+        ready_start = time.time()
+        with self.metrics.timer('readiness'):
+            ready = self.readiness.wait(page, url, timeout=self._ready_timeout(url, deadline))
+        self._record_ready(url, ready, time.time() - ready_start, deadline)
+        return ready
+
+    def scrape_url(self, url, deadline=None):
+        """Scrape a URL and return the content, or None on failure.
+
+        Every step gets the time left on ``deadline`` (a Deadline; by default
+        ``self.deadline`` seconds from now) and the URL is abandoned once it
+        runs out.  A request for a URL already being scraped waits for that
+        scrape instead of loading the page again.
+        """
+        deadline = deadline or Deadline(self.deadline)
+        # Only clean 200 loads are reused; set by _scrape_url, which returns a result either way
+        loaded = {'clean': False}
+        try:
+            return self.coalescer.run(request_key(url), lambda: self._scrape_url(url, deadline, loaded),
+                                      timeout=deadline.remaining(), cacheable=lambda result: loaded['clean'])
+        except TimeoutError:
+            self.logger.warning(f"Abandoned {url}: {DEADLINE_EXCEEDED} waiting for the same page in flight")
+            return None
 
-    def scrape_url(self, url):
-        """Scrape a URL and return the content"""
+    def _scrape_url(self, url, deadline, loaded=None):
+        """Load and extract one URL; see scrape_url()"""
         page = None
+        timeline = None
         start_time = time.time()
         self.logger.debug(f"Starting scrape of {url}")
+        if not self.retries.allow_request(url):
+            self.logger.warning(f"Skipping {url}: circuit open for its host")
+            return None
+        recorded = False
+        tracing = self.profiler is not None and self.profiler.trace
+        if tracing:
+            self.context.tracing.start_chunk(title=url)
         
         try:
-            page = self.context.new_page()
+            with self.metrics.timer('context'):
+                page = self.context.new_page()
             self.logger.debug(f"Created new page for {url}")
+            if self.waterfall is not None:
+                timeline = self.waterfall.attach(page, url)
             
-            # Optimized initial load with shorter timeout
+            # Initial load with a timeout learned for this site, 2s until known
             self.logger.debug("Attempting page navigation...")
-            response = page.goto(url, wait_until='commit', timeout=2000)
+            # A fresh cached document is served by page.route without reaching the host
+            from_cache = self._from_cache(url, CONTEXT_OPTIONS['extra_http_headers'])
+            if not from_cache:
+                self.limiter.wait(url, deadline)
+            navigation_start = time.time()
+            try:
+                with self.metrics.timer('navigation'):
+                    response = page.goto(url, wait_until='commit', timeout=self._navigation_timeout(url, deadline))
+            except PlaywrightTimeoutError:
+                self._record_timeout(url, 'navigation', time.time() - navigation_start, deadline)
+                raise
             if response is None:
                 self.logger.error("Failed to get response from page")
+                self.retries.record(url, False)
                 return None
+            if not from_cache:
+                self._record_navigation(url, response.status, time.time() - navigation_start)
             
             self.logger.debug(f"Initial page load took {time.time() - start_time:.2f} seconds")
             
-            # Enhanced protection bypass with multiple verification steps
-            def wait_for_real_content():
-                try:
-                    # Wait for Cloudflare challenge to disappear
-                    page.wait_for_selector('body:not(:has-text("Just a moment"))', timeout=10000)
-                    page.wait_for_selector('body:not(:has-text("Please wait"))', timeout=5000)
-                    page.wait_for_selector('body:not(:has-text("DDoS protection"))', timeout=5000)
-                    
-                    # Wait for actual content indicators
-                    content_selectors = [
-                        '.container',
-                        'main',
-                        '#content',
-                        '.content',
-                        'article'
-                    ]
-                    
-                    for selector in content_selectors:
-                        try:
-                            page.wait_for_selector(selector, timeout=2000)
-                            self.logger.debug(f"Found content with selector: {selector}")
-                            return True
-                        except:
-                            continue
-                    
-                    return False
-                except Exception as e:
-                    self.logger.debug(f"Error waiting for content: {str(e)}")
-                    return False
-
-            # Initial page load check
-            content = page.content()
-            if any(text in content for text in ["Just a moment", "Please wait", "DDoS protection"]):
-                self.logger.debug("Protection detected, implementing advanced bypass...")
-                
-                # Multiple retry attempts with progressive backoff
-                max_retries = 3  # Keep max retries at 3 to stay under 30s total runtime
-                for attempt in range(max_retries):
-                    self.logger.debug(f"Bypass attempt {attempt + 1}")
-                    
-                    # Check if protection is still active
-                    content = page.content()
-                    if any(text in content for text in ["Just a moment", "Please wait", "DDoS protection"]):
-                        # Wait for challenge to complete and content to load
-                        if wait_for_real_content():
-                            self.logger.debug("Successfully bypassed protection")
-                            break
-                        
-                        # Progressive backoff delay only if protection is detected
-                        if attempt < max_retries - 1:  # Don't delay on last attempt
-                            delay = min(2 ** attempt, 8)  # Cap delay at 8 seconds
-                            self.logger.debug(f"Waiting {delay} seconds before next attempt...")
-                            time.sleep(delay)
-                            self.logger.debug("Refreshing page...")
-                            page.reload(wait_until='networkidle')
-                    else:
-                        self.logger.debug("No protection detected, continuing...")
-                        break  # Exit retry loop if no protection is detected
-                
-                # Final verification
-                page.wait_for_load_state('networkidle', timeout=5000)
-                content = page.content()
+            # One in-page predicate waits out protection and for the listings to settle
+            ready = self._wait_ready(page, url, deadline)
+            max_retries = 3  # The deadline bounds the total time, whatever is left of it
+            for attempt in range(1, max_retries):
+                if ready or not self.readiness.is_protected(page.content()):
+                    break
+                if not self._allow_reload(url):
+                    # This load's failure is recorded; do not count it again below
+                    recorded = True
+                    break
+                self.logger.debug(f"Protection still active, bypass attempt {attempt + 1}")
+                self.limiter.wait(url, deadline)
+                with self.metrics.timer('navigation'):
+                    response = page.reload(wait_until='commit',
+                                           timeout=self._navigation_timeout(url, deadline, 'reload')) or response
+                ready = self._wait_ready(page, url, deadline)
+            if ready and timeline is not None:
+                timeline.mark_ready()
             
-            # Debug: Log page content
+            # The browser only renders; facilities are parsed from the HTML in Python
+            content = page.content()
+            protected = self.readiness.is_protected(content)
+            if not recorded:
+                self.retries.record(url, not protected)
+            if loaded is not None:
+                loaded['clean'] = response.status == 200 and not protected
+            recorded = True
             self.logger.debug("Page HTML structure:")
-            self.logger.debug(page.content())
+            self.logger.debug(content)
             
-            # Enhanced facility data extraction with exact selectors from page analysis
-            data = page.evaluate("""() => {
-                console.log('Starting facility extraction...');
-                
-                // Get all facility containers
-                const facilityContainers = document.querySelectorAll('.list-item-container');
-                console.log(`Found ${facilityContainers.length} facility containers`);
-                
-                const facilities = Array.from(facilityContainers).map(container => {
-                    // Extract facility name from list-title
-                    const nameElement = container.querySelector('a.list-title');
-                    const name = nameElement ? nameElement.textContent.trim() : '';
-                    console.log('Found facility:', name);
-                    
-                    // Get all attribute texts
-                    const attributeElements = container.querySelectorAll('.list-attribute-text');
-                    const attributes = Array.from(attributeElements).map(el => el.textContent.trim());
-                    
-                    // Find products (contains Bulk, Goods, etc.)
-                    const products = attributes.find(text => 
-                        text.includes('Bulk') || 
-                        text.includes('Goods') || 
-                        text.includes('Liquids') || 
-                        text.includes('Oversized')
-                    );
-                    
-                    // Find railroads (contains CSX, NS, etc.)
-                    const railroads = attributes.find(text => 
-                        text.includes('CSX') || 
-                        text.includes('NS') || 
-                        text.includes('rail')
-                    );
-                    
-                    // Find hazmat capabilities
-                    const hazmat = attributes.find(text => text.includes('HazMat'));
-                    
-                    // Check if facility is verified
-                    const isVerified = container.querySelector('.icon-transload-verified-sm') !== null;
-                    
-                    return {
-                        name,
-                        products: products ? products.split(', ').filter(p => p) : [],
-                        railroads: railroads ? railroads.split(', ').filter(r => r !== 'not served by rail') : [],
-                        hazmat_capable: hazmat ? hazmat.includes('Capable of HazMat') : false,
-                        type: isVerified ? 'verified' : 'unverified'
-                    };
-                });
-                
-                console.log(`Processed ${facilities.length} facilities`);
-                return {
-                    title: document.title,
-                    facilities: facilities
-                };
-            }""")
+            # In incremental mode, skip extraction when the page has not changed
+            if self.state is not None:
+                page_fingerprint, unchanged = self.state.unchanged_result(url, content)
+                if unchanged is not None:
+                    self.logger.debug(f"Page unchanged, skipping extraction for {url}")
+                    return unchanged
             
-            if not data or 'facilities' not in data:
-                self.logger.error("No facilities data found in page")
-                raise ValueError("No facilities data found in page")
+            deadline.check('extraction')
+            with self.metrics.timer('extraction'):
+                data = extract_transloading(content)
 
             self.logger.debug(f"Found {len(data.get('facilities', []))} facilities")
-            return {
+            result = {
                 'url': url,
                 'title': data.get('title', ''),
                 'facilities': data.get('facilities', [])
             }
+            if self.state is not None:
+                result['fingerprint'] = page_fingerprint
+            return result
             
         except Exception as e:
-            self.logger.error(f"Scraping failed: {str(e)}")
+            if not recorded:
+                self.retries.record(url, False)
+            if isinstance(e, DeadlineExceeded) or deadline.expired:
+                # Timeouts capped by the deadline surface as Playwright errors
+                self.logger.warning(f"Abandoned {url}: {DEADLINE_EXCEEDED} after {deadline.elapsed():.1f}s")
+            else:
+                self.logger.error(f"Scraping failed: {str(e)}")
             return None
         finally:
+            if timeline is not None:
+                timeline.finish()
             if page:
                 try:
                     page.close()
                 except:
                     pass
+            if tracing:
+                try:
+                    self.context.tracing.stop_chunk(path=self.profiler.trace_path(url))
+                except Exception as e:
+                    self.logger.debug(f"Saving the trace of {url} failed: {str(e)}")
+            if page:
+                # The page is closed, so nothing is in flight while recycling
+                try:
+                    self._recycle()
+                except Exception as e:
+                    self.logger.error(f"Recycling the browser failed: {str(e)}")
 
     def close(self):
         """Clean up resources"""
+        self._log_summaries(self.blocker, self.recycle, self.coalescer, self.readiness)
         if hasattr(self, 'browser'):
             self.browser.close()
         if hasattr(self, 'playwright'):
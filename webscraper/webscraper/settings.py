@@ -27,22 +27,96 @@ NEWSPIDER_MODULE = "webscraper.spiders"
 ROBOTSTXT_OBEY = False
 
 # Configure basic scraping settings
-DOWNLOAD_DELAY = 2
+# Requests are paced per host by HostRateLimitMiddleware instead of a fixed delay
+DOWNLOAD_DELAY = 0
 CONCURRENT_REQUESTS_PER_DOMAIN = 4
 COOKIES_ENABLED = True
 CONCURRENT_REQUESTS = 8
 
+# Browser contexts shared by the Playwright page pool; pages are spread
+# across them up to CONCURRENT_REQUESTS in total
+PLAYWRIGHT_MAX_CONTEXTS = 2
+
+# Resources aborted in every Playwright context: 'none', 'no-media'
+# (images, media, fonts, map tiles) or 'text-only' (also CSS and analytics)
+PLAYWRIGHT_BLOCK_PROFILE = 'no-media'
+
+# Connect to a long-lived browser server (python -m webscraper.browser_server)
+# instead of launching Chromium; None falls back to $PLAYWRIGHT_BROWSER_ENDPOINT
+PLAYWRIGHT_BROWSER_ENDPOINT = None
+
+# Recycle browser contexts after PLAYWRIGHT_RECYCLE_PAGES pages, and all of
+# them when Chromium's RSS (sampled every PLAYWRIGHT_RECYCLE_CHECK_EVERY pages)
+# exceeds PLAYWRIGHT_RECYCLE_RSS_MB; 0 disables a limit
+PLAYWRIGHT_RECYCLE_PAGES = 200
+PLAYWRIGHT_RECYCLE_RSS_MB = 2048
+PLAYWRIGHT_RECYCLE_CHECK_EVERY = 25
+
+# Token bucket per host: HOST_RATE_LIMIT requests per second to start with,
+# with up to HOST_RATE_BURST sent back to back after an idle spell. With
+# HOST_RATE_ADAPTIVE the rate rises while the host answers quickly and halves
+# on 403/429/503 or latency spikes, staying within HOST_RATE_MIN..HOST_RATE_MAX
+HOST_RATE_LIMIT = 0.5
+HOST_RATE_BURST = 2
+HOST_RATE_ADAPTIVE = True
+HOST_RATE_MIN = 0.05
+HOST_RATE_MAX = 4.0
+
 # Configure middleware
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
-    'scrapy.downloadermiddlewares.retry.RetryMiddleware': 90,
+    'webscraper.middlewares.httpcache.DiskCacheMiddleware': 80,
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+    'webscraper.middlewares.retry.BudgetedRetryMiddleware': 90,
+    # Before the rate limiter, so time queued for the host counts against the deadline
+    'webscraper.middlewares.deadline.DeadlineMiddleware': 92,
+    'webscraper.middlewares.ratelimit.HostRateLimitMiddleware': 95,
+    'webscraper.middlewares.timeouts.LearnedTimeoutMiddleware': 97,
     'webscraper.middlewares.playwright_middleware.PlaywrightMiddleware': 100,
 }
 
-# Configure retry settings
+# Render requests flagged with meta={'playwright': True} in Chromium on the
+# asyncio reactor; everything else uses Scrapy's regular HTTP handler
+DOWNLOAD_HANDLERS = {
+    'http': 'webscraper.handlers.PlaywrightDownloadHandler',
+    'https': 'webscraper.handlers.PlaywrightDownloadHandler',
+}
+
+# On-disk HTTP cache shared with the Playwright paths; entries older than
+# DISKCACHE_TTL seconds are revalidated with ETag/Last-Modified
+DISKCACHE_ENABLED = True
+DISKCACHE_DIR = '.httpcache'
+DISKCACHE_TTL = 3600
+
+# Configure retry settings; 403/429/503 also slow the host down (HOST_RATE_ADAPTIVE)
 RETRY_ENABLED = True
 RETRY_TIMES = 3
 RETRY_HTTP_CODES = [401, 403, 429, 500, 502, 503, 504]
+# Retries across the crawl (including Playwright reloads) are capped at this
+# share of all requests, with RETRY_BUDGET_MIN available from the start
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN = 10
+# Stop requesting a host after this many failures in a row, for this many seconds
+CIRCUIT_BREAKER_FAILURES = 5
+CIRCUIT_BREAKER_RESET = 60
+
+# Learn per-host/page-template timeouts (p99 x multiplier) from earlier runs;
+# DOWNLOAD_TIMEOUT and the built-in Playwright timeouts apply until then
+LEARNED_TIMEOUTS_ENABLED = True
+LEARNED_TIMEOUTS_FILE = 'timeouts.json'
+LEARNED_TIMEOUTS_MULTIPLIER = 1.5
+
+# Identical Playwright requests in flight share one page load; the result is
+# reused for repeats within this many seconds (0 only coalesces in-flight ones)
+COALESCE_TTL = 30
+
+# Seconds each URL may take in total, including retries and browser waits (0 disables)
+URL_DEADLINE = 30
+
+# Time every scraping phase into phases/* stats; with METRICS_PORT set, also
+# serve the histograms at http://127.0.0.1:<port>/metrics (0 disables)
+PHASE_METRICS_ENABLED = True
+METRICS_PORT = 0
 
 # Configure request settings
 DOWNLOAD_TIMEOUT = 90
@@ -94,9 +168,9 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    'webscraper.extensions.PhaseMetricsExtension': 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
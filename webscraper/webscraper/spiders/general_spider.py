@@ -1,6 +1,4 @@
 import scrapy
-import logging
-from ..scraper import WebScraper
 
 
 class GeneralSpiderSpider(scrapy.Spider):
@@ -9,33 +7,28 @@ class GeneralSpiderSpider(scrapy.Spider):
     def __init__(self, url=None, *args, **kwargs):
         super(GeneralSpiderSpider, self).__init__(*args, **kwargs)
         self.start_urls = ["http://example.com"] if not url else [url]
-        self.scraper = WebScraper()
-        self.logger = logging.getLogger(__name__)
     
+    async def start(self):
+        # Scrapy 2.13+ no longer falls back to start_requests() on its own
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         for url in self.start_urls: 
             self.logger.info(f"Starting scrape for URL: {url}")
-            try:
-                # Use our custom scraper
-                data = self.scraper.scrape_url(url)
-                if data:
-                    self.logger.info(f"Successfully scraped {url}")
-                    # Create a fake request/response cycle to maintain Scrapy's flow
-                    yield scrapy.Request(
-                        url=url,
-                        callback=self.parse,
-                        errback=self.errback,
-                        dont_filter=True,
-                        meta={'playwright_data': data}
-                    )
-                else:
-                    self.logger.error(f"Failed to scrape {url}")
-            except Exception as e:
-                self.logger.error(f"Error scraping {url}: {str(e)}")
+            # Rendered once by PlaywrightDownloadHandler, which stores the
+            # extracted data in response.meta['playwright_data']
+            yield scrapy.Request(
+                url=url,
+                callback=self.parse,
+                errback=self.errback,
+                dont_filter=True,
+                meta={'playwright': True}
+            )
     
     def parse(self, response):
         try:
-            # Use the data from our custom scraper
+            # Use the data extracted by the download handler
             data = response.meta.get('playwright_data')
             if data:
                 self.logger.info(f"Processing scraped data from {response.url}")
@@ -47,8 +40,3 @@ class GeneralSpiderSpider(scrapy.Spider):
     
     def errback(self, failure):
         self.logger.error(f"Request failed: {failure.value}")
-    
-    def closed(self, reason):
-        # Clean up resources
-        if hasattr(self, 'scraper'):
-            self.scraper.close()
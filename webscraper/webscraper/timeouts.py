@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import re
+import tempfile
+from urllib.parse import urlparse
+
+# Histogram bucket upper bounds in seconds: 50 ms to ~2 min, 25% apart
+BUCKETS = [round(0.05 * 1.25 ** i, 3) for i in range(36)]
+
+DIGITS_RE = re.compile(r'\d+')
+
+
+def page_template(url):
+    """Group URLs that render the same kind of page, e.g. /transloading/*/*.html"""
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    if not segments:
+        return '/'
+    template = [DIGITS_RE.sub('N', segments[0])]
+    for segment in segments[1:]:
+        extension = os.path.splitext(segment)[1]
+        template.append(f'*{extension}')
+    return '/' + '/'.join(template)
+
+
+class LatencyHistogram:
+    """Bucketed latencies whose counts are halved once ``max_samples`` is reached.
+
+    Halving keeps the histogram rolling: older runs fade out while the
+    shape of recent ones dominates the quantiles.
+    """
+
+    def __init__(self, counts=None, max_samples=1000):
+        self.counts = list(counts) if counts else [0] * (len(BUCKETS) + 1)
+        self.max_samples = max_samples
+
+    @property
+    def total(self):
+        return sum(self.counts)
+
+    def add(self, seconds):
+        index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        self.counts[index] += 1
+        if self.total >= self.max_samples:
+            self.counts = [count // 2 for count in self.counts]
+
+    def quantile(self, q):
+        """Upper bound in seconds of the bucket holding the ``q`` quantile"""
+        threshold = q * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= threshold:
+                return BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1] * 2
+        return None
+
+
+class TimeoutBudget:
+    """Timeouts learned from how long each host and page template usually takes.
+
+    Callers ``record()`` the duration of a phase (``navigation``, ``ready``,
+    ``download``) and ask ``timeout()`` for the next budget: the p99 (or
+    another quantile) times ``multiplier``, clamped to ``min_ms``..``max_ms``.
+    Until ``min_samples`` durations are known the caller's default is used.
+    Waits that run out are reported with ``record_timeout()``: the time spent
+    counts as a sample, so the quantile (and the budget) grows again when a
+    host slows down, and after ``max_timeouts`` in a row the budget is at
+    least the caller's default until a wait succeeds.  With a ``path`` the
+    histograms are loaded from and saved to JSON, so budgets carry over
+    between runs.
+    """
+
+    def __init__(self, path=None, multiplier=1.5, min_samples=20, min_ms=1000, max_ms=120000, max_timeouts=3):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.max_timeouts = max_timeouts
+        self.histograms = {}
+        self.timeouts_in_a_row = {}  # key -> waits that ran out since the last success
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('buckets') == BUCKETS:
+                self.histograms = {key: LatencyHistogram(counts) for key, counts in data['histograms'].items()}
+
+    def _key(self, url, phase):
+        return f"{phase} {urlparse(url).hostname or ''}{page_template(url)}"
+
+    def record(self, url, phase, seconds):
+        """Add one observed duration of ``phase`` for ``url``"""
+        key = self._key(url, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.add(seconds)
+        self.timeouts_in_a_row.pop(key, None)
+
+    def record_timeout(self, url, phase, seconds):
+        """Record that ``phase`` of ``url`` ran out of its budget after ``seconds``"""
+        key = self._key(url, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        # The real duration is at least this long
+        histogram.add(seconds)
+        self.timeouts_in_a_row[key] = self.timeouts_in_a_row.get(key, 0) + 1
+        self.logger.debug(f"{key} timed out after {seconds:.2f}s ({self.timeouts_in_a_row[key]} in a row)")
+
+    def timeout(self, url, phase, default, quantile=0.99):
+        """Budget in milliseconds for ``phase`` of ``url``, or ``default`` until enough is known"""
+        key = self._key(url, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None or histogram.total < self.min_samples:
+            return default
+        learned = histogram.quantile(quantile) * 1000 * self.multiplier
+        if self.timeouts_in_a_row.get(key, 0) >= self.max_timeouts:
+            # The host got slower than the history says: give it the default again
+            learned = max(learned, default)
+        return int(min(self.max_ms, max(self.min_ms, learned)))
+
+    def save(self):
+        """Write the histograms to ``path`` atomically"""
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'buckets': BUCKETS,
+                       'histograms': {key: h.counts for key, h in self.histograms.items()}}, f)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        """One-line description of the learned p99 per phase and page group"""
+        learned = [f"{key} p99 {h.quantile(0.99):.2f}s" for key, h in self.histograms.items()
+                   if h.total >= self.min_samples]
+        return f"Learned timeouts: {', '.join(learned) if learned else 'not enough samples yet'}"
+
+
+_budgets = {}
+
+
+def shared_budget(path=None, multiplier=1.5):
+    """One TimeoutBudget per file in this process, so components do not overwrite each other"""
+    if path not in _budgets:
+        _budgets[path] = TimeoutBudget(path, multiplier=multiplier)
+    return _budgets[path]
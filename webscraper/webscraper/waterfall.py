@@ -0,0 +1,257 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+# Playwright's networkidle fires once no request has been in flight for this long
+NETWORK_IDLE_SECONDS = 0.5
+
+
+def _host(url):
+    return urlsplit(url).hostname or ''
+
+
+def _site(host):
+    """Last two labels of ``host``, enough to tell first-party from third-party"""
+    return '.'.join(host.split('.')[-2:])
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class PageTimeline:
+    """Request timeline of one page load, filled from Playwright's network events.
+
+    Each request is recorded with its URL, resource type, status, size
+    (Content-Length, when the server sends one), start and duration in
+    seconds from the moment the timeline was attached.  Durations come
+    from Playwright's resource timing where the browser reports it.
+    Requests aborted by the ResourceBlocker show up with their failure.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.ready_at = None
+        self.finished_at = None
+        self.requests = []
+        self._epoch = time.time()
+        self._start = time.perf_counter()
+        self._in_flight = {}  # Request -> entry
+        self._page = None
+        self._listeners = []
+
+    def _now(self):
+        return time.perf_counter() - self._start
+
+    def attach(self, page):
+        """Listen to the request events of a sync or async Page until finish()"""
+        self._page = page
+        self._listeners = [('request', self._on_request), ('response', self._on_response),
+                           ('requestfinished', self._on_finished), ('requestfailed', self._on_failed)]
+        for event, listener in self._listeners:
+            page.on(event, listener)
+        return self
+
+    def _on_request(self, request):
+        entry = {'url': request.url, 'type': request.resource_type, 'status': None, 'size': 0,
+                 'start': round(self._now(), 4), 'duration': None, 'failure': None}
+        self._in_flight[request] = entry
+        self.requests.append(entry)
+
+    def _on_response(self, response):
+        entry = self._in_flight.get(response.request)
+        if entry is not None:
+            entry['status'] = response.status
+            try:
+                entry['size'] = int(response.headers.get('content-length', 0))
+            except ValueError:
+                pass
+
+    def _end(self, request, failure=None):
+        entry = self._in_flight.pop(request, None)
+        if entry is None:
+            return
+        duration = self._now() - entry['start']
+        timing = getattr(request, 'timing', None) or {}
+        if timing.get('startTime', -1) > 0 and timing.get('responseEnd', -1) >= 0:
+            # The browser's own clock, unaffected by event dispatch delays
+            entry['start'] = round(max(0.0, timing['startTime'] / 1000 - self._epoch), 4)
+            duration = timing['responseEnd'] / 1000
+        entry['duration'] = round(duration, 4)
+        entry['failure'] = failure
+
+    def _on_finished(self, request):
+        self._end(request)
+
+    def _on_failed(self, request):
+        self._end(request, request.failure or 'failed')
+
+    def mark_ready(self):
+        """Record that the page became usable (readiness resolved) now"""
+        self.ready_at = round(self._now(), 4)
+
+    def finish(self):
+        """Stop listening; requests still in flight are recorded as unfinished"""
+        self.finished_at = round(self._now(), 4)
+        for entry in self._in_flight.values():
+            entry['duration'] = round(self.finished_at - entry['start'], 4)
+            entry['failure'] = 'unfinished'
+        self._in_flight.clear()
+        if self._page is not None:
+            for event, listener in self._listeners:
+                try:
+                    self._page.remove_listener(event, listener)
+                except Exception:
+                    pass
+            self._page = None
+        return self
+
+    def to_dict(self):
+        return {'url': self.url, 'ready': self.ready_at, 'finished': self.finished_at, 'requests': self.requests}
+
+    @classmethod
+    def from_dict(cls, data):
+        timeline = cls(data['url'])
+        timeline.ready_at = data.get('ready')
+        timeline.finished_at = data.get('finished')
+        timeline.requests = data.get('requests', [])
+        return timeline
+
+
+class NetworkWaterfall:
+    """Records the request timeline of every page and reports what holds pages back.
+
+    Attach it to each page before navigating::
+
+        timeline = waterfall.attach(page, url)
+        ...  # goto, then timeline.mark_ready() once readiness resolves
+        timeline.finish()
+
+    ``report()`` aggregates the timelines of the crawl per domain and per
+    resource: time in flight before the page was ready (what a resource
+    cost the page load) and after it (what waiting for networkidle would
+    have added), and how often a domain was the last to go quiet.  Use
+    it to pick the resources to block and the waits that can go.
+    """
+
+    def __init__(self, limit=15):
+        self.logger = logging.getLogger(__name__)
+        self.limit = limit
+        self.timelines = []
+        self._lock = threading.Lock()
+
+    def attach(self, page, url):
+        """Start recording the requests of ``page`` (sync or async API), loading ``url``"""
+        timeline = PageTimeline(url).attach(page)
+        with self._lock:
+            self.timelines.append(timeline)
+        return timeline
+
+    def _aggregate(self):
+        domains = defaultdict(lambda: {'requests': 0, 'failed': 0, 'bytes': 0, 'before': 0.0, 'after': 0.0,
+                                       'last': 0, 'third_party': False})
+        resources = defaultdict(lambda: {'requests': 0, 'type': '', 'durations': [], 'before': 0.0, 'after': 0.0})
+        idle_delays = []
+        with self._lock:
+            timelines = list(self.timelines)
+        for timeline in timelines:
+            # Pages that never became ready were waited on until they were given up
+            ready = timeline.ready_at if timeline.ready_at is not None else timeline.finished_at
+            entries = [entry for entry in timeline.requests if entry.get('duration') is not None]
+            if ready is None or not entries:
+                continue
+            site = _site(_host(timeline.url))
+            last = max(entries, key=lambda entry: entry['start'] + entry['duration'])
+            idle_delays.append(max(0.0, last['start'] + last['duration'] + NETWORK_IDLE_SECONDS - ready))
+            for entry in entries:
+                start, end = entry['start'], entry['start'] + entry['duration']
+                before = max(0.0, min(end, ready) - start)
+                after = max(0.0, end - max(start, ready))
+                host = _host(entry['url'])
+                domain = domains[host]
+                domain['requests'] += 1
+                domain['failed'] += entry.get('failure') is not None
+                domain['bytes'] += entry.get('size') or 0
+                domain['before'] += before
+                domain['after'] += after
+                domain['last'] += entry is last
+                domain['third_party'] = _site(host) != site
+                resource = resources[entry['url'].split('?', 1)[0]]
+                resource['requests'] += 1
+                resource['type'] = entry.get('type', '')
+                resource['durations'].append(entry['duration'])
+                resource['before'] += before
+                resource['after'] += after
+        return len(timelines), domains, resources, idle_delays
+
+    def report(self):
+        """Lines of the top blocking domains and resources report"""
+        pages, domains, resources, idle_delays = self._aggregate()
+        requests = sum(domain['requests'] for domain in domains.values())
+        total_bytes = sum(domain['bytes'] for domain in domains.values())
+        lines = [f"Network waterfall of {pages} pages, {requests} requests ({total_bytes / 1024:.0f} KiB)"]
+        if not requests:
+            lines.append("No requests recorded")
+            return lines
+        lines.append(f"Waiting for network idle after readiness would add p50 {_percentile(idle_delays, 0.5):.2f}s, "
+                     f"p95 {_percentile(idle_delays, 0.95):.2f}s per page")
+
+        lines += ["", "Top blocking domains (seconds in flight before/after the page was ready):",
+                  f"  {'before':>8} {'after':>8} {'requests':>8} {'failed':>6} {'KiB':>8} {'last':>5}  domain"]
+        ranked = sorted(domains.items(), key=lambda item: item[1]['before'] + item[1]['after'], reverse=True)
+        for host, domain in ranked[:self.limit]:
+            party = ' (third-party)' if domain['third_party'] else ''
+            lines.append(f"  {domain['before']:8.2f} {domain['after']:8.2f} {domain['requests']:8d} "
+                         f"{domain['failed']:6d} {domain['bytes'] / 1024:8.0f} {domain['last']:5d}  {host}{party}")
+
+        lines += ["", "Top blocking resources:",
+                  f"  {'before':>8} {'after':>8} {'requests':>8} {'p95':>7}  {'type':<10} resource"]
+        ranked = sorted(resources.items(), key=lambda item: item[1]['before'] + item[1]['after'], reverse=True)
+        for url, resource in ranked[:self.limit]:
+            lines.append(f"  {resource['before']:8.2f} {resource['after']:8.2f} {resource['requests']:8d} "
+                         f"{_percentile(resource['durations'], 0.95):6.2f}s  {resource['type']:<10} {url}")
+        return lines
+
+    def save(self, path):
+        """Write every page's timeline and the report to ``path`` as JSON"""
+        lines = self.report()
+        with self._lock:
+            pages = [timeline.to_dict() for timeline in self.timelines]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': pages, 'report': lines}, f, indent=2)
+        self.logger.info('\n'.join(lines))
+        self.logger.info(f"Network waterfall of {len(pages)} pages saved to {path}")
+        return lines
+
+    @classmethod
+    def load(cls, *paths, limit=15):
+        """A waterfall holding the pages of one or more files written by save()"""
+        waterfall = cls(limit=limit)
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                waterfall.timelines.extend(PageTimeline.from_dict(page) for page in json.load(f)['pages'])
+        return waterfall
+
+    def summary(self):
+        """One-line description of the domains that kept pages waiting the longest"""
+        pages, domains, _, _ = self._aggregate()
+        if not domains:
+            return "Network waterfall: no requests recorded"
+        ranked = sorted(domains.items(), key=lambda item: item[1]['before'] + item[1]['after'], reverse=True)
+        return f"Network waterfall of {pages} pages, slowest domains: " + ", ".join(
+            f"{host} {domain['before'] + domain['after']:.1f}s" for host, domain in ranked[:3])
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Report the top blocking domains and resources of saved waterfalls')
+    parser.add_argument('files', nargs='+', help='Waterfall JSON files written by --waterfall')
+    parser.add_argument('--limit', type=int, default=15, help='Domains and resources to list (default: 15)')
+    args = parser.parse_args()
+    print('\n'.join(NetworkWaterfall.load(*args.files, limit=args.limit).report()))